@@ -7,7 +7,7 @@ from sqlalchemy import pool
 
 from alembic import context
 from core.configs import settings
-from models import user, profile, role, apiary, meliponary, log, maps
+from models import user, profile, role, apiary, meliponary, log, maps, resumo_dashboard
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -37,6 +37,15 @@ target_metadata = settings.DBBaseModel.metadata
 # ... etc.
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    # Coluna geom (PostGIS) e seus índices são mantidos fora do ORM pela migração 3c1f6a9d2b47
+    if reflected and compare_to is None and name and (name == 'geom' or name.endswith(('_geom', '_geog'))):
+        return False
+    if type_ == 'table' and name == 'spatial_ref_sys':
+        return False
+    return True
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -53,6 +62,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -76,7 +86,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_object=include_object
         )
 
         with context.begin_transaction():
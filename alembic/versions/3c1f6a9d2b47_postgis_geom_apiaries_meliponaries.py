@@ -0,0 +1,76 @@
+"""postgis geom apiaries meliponaries
+
+Revision ID: 3c1f6a9d2b47
+Revises: fed0115c9ddd
+Create Date: 2026-10-16 09:12:40.518203
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1f6a9d2b47'
+down_revision: Union[str, None] = 'fed0115c9ddd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABELAS = ('apiaries', 'meliponaries')
+
+logger = logging.getLogger('alembic')
+
+
+def _postgis_disponivel() -> bool:
+    bind = op.get_bind()
+    return bind.execute(sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'postgis'")).first() is not None
+
+
+def upgrade() -> None:
+    # Instalações sem PostGIS seguem usando a verificação de proximidade em Python
+    if not _postgis_disponivel():
+        logger.warning("PostGIS indisponível: colunas geom não criadas; proximidade segue calculada em Python.")
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS postgis")
+    # Converte latitude/longitude (texto) em ponto; valores não numéricos resultam em NULL
+    op.execute("""
+        CREATE OR REPLACE FUNCTION geobee_ponto(lat text, lon text) RETURNS geometry AS $$
+        BEGIN
+            RETURN ST_SetSRID(ST_MakePoint(lon::double precision, lat::double precision), 4326);
+        EXCEPTION WHEN others THEN
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql IMMUTABLE
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION geobee_sincroniza_geom() RETURNS trigger AS $$
+        BEGIN
+            NEW.geom := geobee_ponto(NEW.latitude, NEW.longitude);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for tabela in TABELAS:
+        op.execute(f"ALTER TABLE {tabela} ADD COLUMN geom geometry(Point, 4326)")
+        # Backfill a partir das colunas texto
+        op.execute(f"UPDATE {tabela} SET geom = geobee_ponto(latitude, longitude)")
+        op.execute(f"CREATE INDEX ix_{tabela}_geom ON {tabela} USING gist (geom)")
+        # ST_DWithin em metros usa o cast para geography; índice de expressão correspondente
+        op.execute(f"CREATE INDEX ix_{tabela}_geog ON {tabela} USING gist ((geom::geography))")
+        op.execute(f"""
+            CREATE TRIGGER trg_{tabela}_geom
+            BEFORE INSERT OR UPDATE OF latitude, longitude ON {tabela}
+            FOR EACH ROW EXECUTE FUNCTION geobee_sincroniza_geom()
+        """)
+
+
+def downgrade() -> None:
+    for tabela in TABELAS:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{tabela}_geom ON {tabela}")
+        op.execute(f"DROP INDEX IF EXISTS ix_{tabela}_geog")
+        op.execute(f"DROP INDEX IF EXISTS ix_{tabela}_geom")
+        op.execute(f"ALTER TABLE {tabela} DROP COLUMN IF EXISTS geom")
+    op.execute("DROP FUNCTION IF EXISTS geobee_sincroniza_geom()")
+    op.execute("DROP FUNCTION IF EXISTS geobee_ponto(text, text)")
@@ -0,0 +1,34 @@
+"""bioma e indices do dashboard
+
+Revision ID: 5e9b3f7a1c28
+Revises: a4d8c2e61f35
+Create Date: 2026-10-16 18:02:11.530417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e9b3f7a1c28'
+down_revision: Union[str, None] = 'a4d8c2e61f35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Bioma gravado no cadastro (agregações do dashboard); registros antigos ficam nulos até a reconciliação
+    op.add_column('apiaries', sa.Column('bioma', sa.String(), nullable=True))
+    op.add_column('meliponaries', sa.Column('bioma', sa.String(), nullable=True))
+    # Paginação por chave (userId, id) nos dashboards
+    op.create_index('ix_apiaries_userId_id', 'apiaries', ['userId', 'id'])
+    op.create_index('ix_meliponaries_userId_id', 'meliponaries', ['userId', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_meliponaries_userId_id', table_name='meliponaries')
+    op.drop_index('ix_apiaries_userId_id', table_name='apiaries')
+    op.drop_column('meliponaries', 'bioma')
+    op.drop_column('apiaries', 'bioma')
@@ -0,0 +1,46 @@
+"""catalogo geomaps
+
+Revision ID: 7b2e5d1c4a90
+Revises: 3c1f6a9d2b47
+Create Date: 2026-10-16 14:05:12.731904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2e5d1c4a90'
+down_revision: Union[str, None] = '3c1f6a9d2b47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('geomaps', sa.Column('object_name', sa.String(), nullable=True))
+    op.add_column('geomaps', sa.Column('size_bytes', sa.BigInteger(), nullable=True))
+    op.add_column('geomaps', sa.Column('bbox_min_lon', sa.Float(), nullable=True))
+    op.add_column('geomaps', sa.Column('bbox_min_lat', sa.Float(), nullable=True))
+    op.add_column('geomaps', sa.Column('bbox_max_lon', sa.Float(), nullable=True))
+    op.add_column('geomaps', sa.Column('bbox_max_lat', sa.Float(), nullable=True))
+    op.add_column('geomaps', sa.Column('feature_count', sa.Integer(), nullable=True))
+    op.add_column('geomaps', sa.Column('crs', sa.String(), nullable=True))
+    op.add_column('geomaps', sa.Column('checksum', sa.String(), nullable=True))
+    op.create_index(op.f('ix_geomaps_object_name'), 'geomaps', ['object_name'], unique=False)
+    # Registros existentes: nome do objeto extraído da URL (https://<minio>/<bucket>/<objeto>)
+    op.execute("UPDATE geomaps SET object_name = regexp_replace(file_path, '^https?://[^/]+/[^/]+/', '')")
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_geomaps_object_name'), table_name='geomaps')
+    op.drop_column('geomaps', 'checksum')
+    op.drop_column('geomaps', 'crs')
+    op.drop_column('geomaps', 'feature_count')
+    op.drop_column('geomaps', 'bbox_max_lat')
+    op.drop_column('geomaps', 'bbox_max_lon')
+    op.drop_column('geomaps', 'bbox_min_lat')
+    op.drop_column('geomaps', 'bbox_min_lon')
+    op.drop_column('geomaps', 'size_bytes')
+    op.drop_column('geomaps', 'object_name')
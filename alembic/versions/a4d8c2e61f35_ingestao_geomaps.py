@@ -0,0 +1,30 @@
+"""ingestao geomaps
+
+Revision ID: a4d8c2e61f35
+Revises: 7b2e5d1c4a90
+Create Date: 2026-10-16 16:21:47.094215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d8c2e61f35'
+down_revision: Union[str, None] = '7b2e5d1c4a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('geomaps', sa.Column('ingest_status', sa.String(), nullable=True))
+    op.add_column('geomaps', sa.Column('ingest_progress', sa.Integer(), nullable=True))
+    op.add_column('geomaps', sa.Column('ingest_message', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('geomaps', 'ingest_message')
+    op.drop_column('geomaps', 'ingest_progress')
+    op.drop_column('geomaps', 'ingest_status')
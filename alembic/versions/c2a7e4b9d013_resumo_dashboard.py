@@ -0,0 +1,47 @@
+"""resumo do dashboard
+
+Revision ID: c2a7e4b9d013
+Revises: 5e9b3f7a1c28
+Create Date: 2026-10-16 18:40:27.118904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2a7e4b9d013'
+down_revision: Union[str, None] = '5e9b3f7a1c28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'dashboard_summary',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('tipo', sa.String(), nullable=False),
+        sa.Column('bioma', sa.String(), nullable=False, server_default=''),
+        sa.Column('registros', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('colmeias', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('capacidade', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('user_id', 'tipo', 'bioma')
+    )
+    # Carga inicial; depois disso a tabela é mantida pelos endpoints (reconciliação: python -m utils.resumo_dashboard)
+    for tabela, tipo in (('apiaries', 'apiario'), ('meliponaries', 'meliponario')):
+        op.execute(
+            f"""
+            INSERT INTO dashboard_summary (user_id, tipo, bioma, registros, colmeias, capacidade)
+            SELECT "userId", '{tipo}', COALESCE(bioma, ''), COUNT(*),
+                   COALESCE(SUM(CASE WHEN "quantidadeColmeias" ~ '^[0-9]+$' THEN CAST("quantidadeColmeias" AS INTEGER) END), 0),
+                   COALESCE(SUM(CASE WHEN "capacidadeDeSuporte" ~ '^[0-9]+$' THEN CAST("capacidadeDeSuporte" AS INTEGER) END), 0)
+            FROM {tabela}
+            GROUP BY "userId", COALESCE(bioma, '')
+            """
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('dashboard_summary')
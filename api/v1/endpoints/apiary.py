@@ -2,19 +2,24 @@ import logging
 from typing import List
 
 from fastapi import APIRouter, Depends, status, HTTPException, Response, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import func
+from starlette.concurrency import run_in_threadpool
 
-from core.deps import get_session, get_current_user
+from core.deps import Principal, get_session, get_current_user
 from core.messages import MSG_LIMIT_APIARY, MSG_UPGRADE_OPTIONS, MSG_APIARY_NOT_FOUND, MSG_FORBIDDEN_VIEW_APIARY, \
-    MSG_FORBIDDEN_UPDATE_APIARY, MSG_FORBIDDEN_DELETE_APIARY
-from models import User, Apiary
-from schemas.apiary_schema import ApiaryCreateSchema, ApiarySchema
-from utils import verify_user_exists, process_apicultor, identificar_bioma_por_ponto
+    MSG_FORBIDDEN_UPDATE_APIARY, MSG_FORBIDDEN_DELETE_APIARY, MSG_SUPPORT_CAPACITY_ERROR
+from models import Apiary
+from schemas.apiary_schema import ApiaryCapacityBatchSchema, ApiaryCreateSchema, ApiarySchema
+from utils import verify_user_exists, process_apicultor, identificar_bioma_por_ponto, calcular_raio_voo_apiario, \
+    construir_buffers_existentes, atualizar_superficie_capacidade, localizacao_colmeias, buffer_metrico, catalogo_camadas
+from utils import resumo_dashboard
+from utils.capacidade_lote import fluxo_ndjson, iniciar_blocos, validar_modo, validar_pontos
+from utils.computacao import servico_computacao
 from utils.log_utils import log_action
-from shapely.geometry import Point
-import geopandas as gpd
+from utils.proximidade import existe_no_ponto, listar_no_raio, indexar, desindexar
 
 apiary_router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -22,7 +27,7 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 
 
 @apiary_router.get('/', response_model=List[ApiarySchema])
-async def get_apiaries(session: AsyncSession = Depends(get_session), auth_user: User = Depends(get_current_user)):
+async def get_apiaries(session: AsyncSession = Depends(get_session), auth_user: Principal = Depends(get_current_user)):
     result = await session.execute(select(Apiary).filter(Apiary.userId == auth_user.id))
     return result.scalars().all()
 
@@ -30,7 +35,7 @@ async def get_apiaries(session: AsyncSession = Depends(get_session), auth_user:
 @apiary_router.post('/', response_model=ApiarySchema, status_code=status.HTTP_201_CREATED)
 async def create_apiary(
         apiary: ApiaryCreateSchema,
-        auth_user: User = Depends(get_current_user),
+        auth_user: Principal = Depends(get_current_user),
         session: AsyncSession = Depends(get_session),
         allow_same_point: bool = Query(False, description="Permitir cadastro no mesmo ponto se já existir")
 ):
@@ -65,47 +70,50 @@ async def create_apiary(
                 "upgrade_options": MSG_UPGRADE_OPTIONS
             }
         )
-    # Carrega todos os apiários para construção de buffers e verificação de duplicidade de coordenadas
-    result = await session.execute(select(Apiary))
-    all_apiaries = result.scalars().all()
     # Verifica se já existe apiário na mesma coordenada (condicional)
-    if not allow_same_point:
-        for a in all_apiaries:
-            if float(a.latitude) == float(apiary.latitude) and float(a.longitude) == float(apiary.longitude):
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Já existe um apiário cadastrado nesta coordenada."
-                )
-    # Monta lista de buffers existentes para passar ao process_apicultor
-    crs_geo = "EPSG:4326"
-    crs_metric = "EPSG:31983"
-    buffers_existentes = []
-    for a in all_apiaries:
-        centro = Point(float(a.longitude), float(a.latitude))
-        gdf_centro = gpd.GeoDataFrame(geometry=[centro], crs=crs_geo).to_crs(crs_metric)
-        buffer = gdf_centro.geometry.iloc[0].buffer(1500)
-        buffers_existentes.append({"buffer": buffer, "colmeias": int(a.quantidadeColmeias)})
+    if not allow_same_point and await existe_no_ponto(session, Apiary, _lon, _lat):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Já existe um apiário cadastrado nesta coordenada."
+        )
+    # Apiários cujo buffer pode intersectar o novo (ST_DWithin quando PostGIS estiver habilitado)
+    raio_apiario_km = calcular_raio_voo_apiario()
+    vizinhos = await listar_no_raio(session, Apiary, _lon, _lat, 2 * raio_apiario_km)
+    # Monta lista de buffers existentes para passar ao process_apicultor (reprojeção e buffer em lote)
+    buffers_existentes = construir_buffers_existentes(
+        longitudes=[float(a.longitude) for a in vizinhos],
+        latitudes=[float(a.latitude) for a in vizinhos],
+        raios_km=raio_apiario_km,
+        colmeias=[int(a.quantidadeColmeias) for a in vizinhos]
+    )
 
     # Identifica bioma do ponto e garante aplicação das regras por bioma/cultura
     geojson_biomas_path = 'geojson_files/Brasil.json'
-    bioma = identificar_bioma_por_ponto(_lon, _lat, geojson_biomas_path)
+    bioma = await servico_computacao.executar(identificar_bioma_por_ponto, _lon, _lat, geojson_biomas_path)
     if not bioma:
         logger.warning(f"Bioma não identificado para coordenadas ({_lat}, {_lon})")
         raise HTTPException(status_code=400, detail="coordenada nao mapeada no geojson ou bioma não identificado")
 
+    # Camadas ativas do catálogo cujo bbox cruza o buffer do novo apiário
+    camadas = await catalogo_camadas.camadas_para(session, buffer_metrico(_lon, _lat, raio_apiario_km))
+
     try:
-        suporte = process_apicultor(
+        suporte = await servico_computacao.executar(
+            process_apicultor,
             latitude=str(apiary.latitude),
             longitude=str(apiary.longitude),
             buffers_existentes=buffers_existentes,
             return_area_only=False,
-            bioma=bioma
+            bioma=bioma,
+            geojson_files=camadas
         )
+    except HTTPException as exc:
+        # Erros do cálculo (MinIO, camadas, tempo limite) seguem com o próprio status; nada é gravado
+        logger.error(f"Erro ao calcular capacidade de suporte: {exc.detail}")
+        raise
     except Exception as exc:
         logger.error(f"Erro ao calcular capacidade de suporte: {exc}")
-        if hasattr(exc, 'detail') and exc.detail == "coordenada nao mapeada no geojson":
-            raise HTTPException(status_code=400, detail="coordenada nao mapeada no geojson")
-        raise HTTPException(status_code=400, detail=str(exc))
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=MSG_SUPPORT_CAPACITY_ERROR)
 
     # Subtrai colmeias informadas no questionário (quando aplicável)
     extra_questionario = 0
@@ -115,7 +123,7 @@ async def create_apiary(
         except (TypeError, ValueError):
             extra_questionario = 0
 
-    capacidade_permitida = int(suporte) if suporte is not None else 0
+    capacidade_permitida = int(suporte)
     capacidade_permitida = max(capacidade_permitida - extra_questionario, 0)
     logger.info(f"Capacidade permitida final: {capacidade_permitida}")
     new_apiary = Apiary(
@@ -136,19 +144,51 @@ async def create_apiary(
         distanciaSeguraLavouras=apiary.distanciaSeguraLavouras,
         acessoVeiculos=apiary.acessoVeiculos,
         capacidadeDeSuporte=str(capacidade_permitida),
+        bioma=bioma,
         userId=auth_user.id
     )
     session.add(new_apiary)
+    # Resumo do dashboard ajustado na mesma transação do cadastro
+    await resumo_dashboard.ajustar(session, adicionada=resumo_dashboard.contribuicao(Apiary, new_apiary))
     await session.commit()
     await session.refresh(new_apiary)
+    indexar(Apiary, new_apiary)
+    await run_in_threadpool(atualizar_superficie_capacidade, Apiary, atual=localizacao_colmeias(Apiary, new_apiary))
     response = new_apiary.__dict__.copy()
     logger.info(f"Apiário criado com sucesso para usuário {auth_user.id}")
     return response
 
 
+@apiary_router.post('/capacity:batch')
+async def capacity_batch(
+        lote: ApiaryCapacityBatchSchema,
+        mode: str = Query('exact', description="exact (geometrias das camadas) ou approximate (raster de vegetação)"),
+        auth_user: Principal = Depends(get_current_user),
+        session: AsyncSession = Depends(get_session)
+):
+    """
+    Capacidade de suporte de vários locais candidatos, sem cadastrar apiários.
+    Responde em NDJSON, uma linha por ponto na ordem enviada (campo "indice"; "erro" quando o ponto não pôde ser avaliado).
+    """
+    pontos = [p.model_dump() for p in lote.points]
+    validar_pontos(pontos)
+    validar_modo(mode)
+    raio_apiario_km = calcular_raio_voo_apiario()
+    blocos = await iniciar_blocos(
+        session, Apiary, pontos,
+        raios_km=[raio_apiario_km] * len(pontos),
+        tipo_producao='apicultura',
+        alcance_vizinhos_km=2 * raio_apiario_km,
+        descontos=[p['qtdColmeiasOutrosApiarios'] or 0 for p in pontos],
+        modo=mode
+    )
+    logger.info(f"Avaliação de capacidade em lote de {len(pontos)} pontos para usuário {auth_user.id}")
+    return StreamingResponse(fluxo_ndjson(pontos, blocos), media_type='application/x-ndjson')
+
+
 @apiary_router.get('/{id}', response_model=ApiarySchema)
 async def get_apiary(id: int, session: AsyncSession = Depends(get_session),
-                     auth_user: User = Depends(get_current_user), ):
+                     auth_user: Principal = Depends(get_current_user), ):
     result = await session.execute(select(Apiary).filter(Apiary.id == id))
     apiary = result.scalar()
     if apiary is None:
@@ -160,7 +200,7 @@ async def get_apiary(id: int, session: AsyncSession = Depends(get_session),
 
 @apiary_router.put('/{id}', response_model=ApiarySchema)
 async def update_apiary(id: int, apiary: ApiaryCreateSchema, session: AsyncSession = Depends(get_session),
-                        auth_user: User = Depends(get_current_user), ):
+                        auth_user: Principal = Depends(get_current_user), ):
     await verify_user_exists(auth_user.id, session)
     result = await session.execute(select(Apiary).filter(Apiary.id == id))
     apiary_db = result.scalar()
@@ -168,30 +208,48 @@ async def update_apiary(id: int, apiary: ApiaryCreateSchema, session: AsyncSessi
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=MSG_APIARY_NOT_FOUND)
     if apiary_db.userId != auth_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=MSG_FORBIDDEN_UPDATE_APIARY)
+    coordenada_anterior = (apiary_db.longitude, apiary_db.latitude)
+    anterior = localizacao_colmeias(Apiary, apiary_db)
+    parcela_anterior = resumo_dashboard.contribuicao(Apiary, apiary_db)
     # Protege campos imutáveis
     for key, value in apiary.model_dump().items():
         if key in {"id", "userId"}:
             continue
         setattr(apiary_db, key, value)
+    if coordenada_anterior != (apiary_db.longitude, apiary_db.latitude):
+        # Coordenada alterada: o bioma gravado acompanha a nova posição
+        apiary_db.bioma = await servico_computacao.executar(
+            identificar_bioma_por_ponto, apiary_db.longitude, apiary_db.latitude, 'geojson_files/Brasil.json'
+        )
     async with session.begin():
+        await resumo_dashboard.ajustar(session, parcela_anterior, resumo_dashboard.contribuicao(Apiary, apiary_db))
         await log_action(session, user_id=auth_user.id, action="UPDATE", entity="APIARY", entity_id=apiary_db.id,
                          details=f"Apiário atualizado: {apiary_db.name}")
     await session.refresh(apiary_db)
+    indexar(Apiary, apiary_db)
+    await run_in_threadpool(
+        atualizar_superficie_capacidade, Apiary, anterior, localizacao_colmeias(Apiary, apiary_db)
+    )
     return apiary_db
 
 
 @apiary_router.delete('/{id}', status_code=status.HTTP_204_NO_CONTENT)
 async def delete_apiary(id: int, session: AsyncSession = Depends(get_session),
-                        auth_user: User = Depends(get_current_user)):
+                        auth_user: Principal = Depends(get_current_user)):
     result = await session.execute(select(Apiary).filter(Apiary.id == id))
     apiary = result.scalar_one_or_none()
     if not apiary:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=MSG_APIARY_NOT_FOUND)
     if apiary.userId != auth_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=MSG_FORBIDDEN_DELETE_APIARY)
+    anterior = localizacao_colmeias(Apiary, apiary)
+    parcela_anterior = resumo_dashboard.contribuicao(Apiary, apiary)
     # Executa a exclusão e o log na mesma transação implícita e confirma
     await session.delete(apiary)
     await log_action(session, user_id=auth_user.id, action="DELETE", entity="APIARY", entity_id=apiary.id,
                      details=f"Apiário deletado: {apiary.name}")
+    await resumo_dashboard.ajustar(session, removida=parcela_anterior)
     await session.commit()
+    desindexar(Apiary, id)
+    await run_in_threadpool(atualizar_superficie_capacidade, Apiary, anterior=anterior)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
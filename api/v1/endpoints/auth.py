@@ -1,3 +1,5 @@
+import time
+
 from fastapi import APIRouter, Depends, status, HTTPException, Body
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -7,6 +9,7 @@ from sqlalchemy.future import select
 from core.auth import authenticate, generate_token, create_access_token
 from core.deps import get_session
 from core.messages import MSG_USER_NOT_FOUND, MSG_PASSWORD_RESET_SENT
+from core.metricas import latencia_login
 from models import User
 from utils.log_utils import log_action
 
@@ -15,7 +18,11 @@ auth_router = APIRouter()
 
 @auth_router.post('/login', status_code=status.HTTP_201_CREATED)
 async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_session)):
-    user = await authenticate(form_data.username, form_data.password, db)
+    inicio = time.monotonic()
+    try:
+        user = await authenticate(form_data.username, form_data.password, db)
+    finally:
+        latencia_login.observar(time.monotonic() - inicio)
     if not user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Credenciais inválidas')
     return JSONResponse(content={'access_token': create_access_token(sub=str(user.id)), "token_type": "bearer"}, status_code=status.HTTP_200_OK)
@@ -1,21 +1,19 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
 from core.deps import get_session
-from models.apiary import Apiary
-from models.meliponary import Meliponary
-from schemas.apiary_schema import ApiarySchema
-from schemas.meliponary_schema import MeliponarySchema
+from utils.dashboard import LIMITE_PADRAO, responder
 
 router = APIRouter()
 
 @router.get("/dashboard", status_code=200)
-async def dashboard(session: AsyncSession = Depends(get_session)):
-    apiaries_result = await session.execute(select(Apiary))
-    meliponaries_result = await session.execute(select(Meliponary))
-    apiaries = apiaries_result.scalars().all()
-    meliponaries = meliponaries_result.scalars().all()
-    return {
-        "apiarios": [ApiarySchema.model_validate(a).model_dump() for a in apiaries],
-        "meliponarios": [MeliponarySchema.model_validate(m).model_dump() for m in meliponaries]
-    }
+async def dashboard(
+        session: AsyncSession = Depends(get_session),
+        mode: str = Query('page', description="page (paginado), summary (agregados) ou stream (NDJSON)"),
+        entity: Optional[str] = Query(None, description="apiarios, meliponarios ou ambos separados por vírgula"),
+        fields: Optional[str] = Query(None, description="Colunas separadas por vírgula (padrão: todas)"),
+        limit: int = Query(LIMITE_PADRAO, description="Linhas por entidade em cada página"),
+        cursor: Optional[str] = Query(None, description="next_cursor da página anterior")
+):
+    return await responder(session, None, mode, entity, fields, limit, cursor)
@@ -1,13 +1,17 @@
 from fastapi import APIRouter, Depends, status, HTTPException, Body
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from core.deps import get_session, get_current_user
+from core.cache_principal import cache_principal
+from core import metricas
+from core.deps import Principal, get_session, get_current_user
 from core.messages import (
     MSG_USER_NOT_FOUND, MSG_USER_ALREADY_ACTIVE, MSG_USER_ALREADY_INACTIVE,
     MSG_USER_ACTIVATED, MSG_USER_DEACTIVATED, MSG_LIMITS_UPDATED, MSG_ROLE_ADDED, MSG_ROLE_REMOVED
 )
 from models.user import User
 from schemas.user_schema import UserSchema
+from utils import resumo_dashboard
 from utils.log_utils import log_action
 from datetime import datetime, timedelta
 
@@ -15,7 +19,7 @@ management_router = APIRouter()
 
 # --- Gestão de Usuários ---
 @management_router.patch('/users/{user_id}/activate', status_code=status.HTTP_200_OK)
-async def activate_user(user_id: int, session: AsyncSession = Depends(get_session), auth_user: User = Depends(get_current_user)):
+async def activate_user(user_id: int, session: AsyncSession = Depends(get_session), auth_user: Principal = Depends(get_current_user)):
     result = await session.execute(select(User).filter(User.id == user_id))
     user = result.scalar()
     if not user:
@@ -25,11 +29,12 @@ async def activate_user(user_id: int, session: AsyncSession = Depends(get_sessio
     user.is_active = True
     async with session.begin():
         await log_action(session, user_id=auth_user.id, action="ACTIVATE", entity="USER", entity_id=user.id, details=MSG_USER_ACTIVATED)
+    cache_principal.invalidar(user.id)
     await session.refresh(user)
     return {"detail": MSG_USER_ACTIVATED}
 
 @management_router.patch('/users/{user_id}/deactivate', status_code=status.HTTP_200_OK)
-async def deactivate_user(user_id: int, session: AsyncSession = Depends(get_session), auth_user: User = Depends(get_current_user)):
+async def deactivate_user(user_id: int, session: AsyncSession = Depends(get_session), auth_user: Principal = Depends(get_current_user)):
     result = await session.execute(select(User).filter(User.id == user_id))
     user = result.scalar()
     if not user:
@@ -39,11 +44,12 @@ async def deactivate_user(user_id: int, session: AsyncSession = Depends(get_sess
     user.is_active = False
     async with session.begin():
         await log_action(session, user_id=auth_user.id, action="DEACTIVATE", entity="USER", entity_id=user.id, details=MSG_USER_DEACTIVATED)
+    cache_principal.invalidar(user.id)
     await session.refresh(user)
     return {"detail": MSG_USER_DEACTIVATED}
 
 @management_router.patch('/users/{user_id}/limits', status_code=status.HTTP_200_OK)
-async def update_limits(user_id: int, max_apiaries: int, max_meliponaries: int, session: AsyncSession = Depends(get_session), auth_user: User = Depends(get_current_user)):
+async def update_limits(user_id: int, max_apiaries: int, max_meliponaries: int, session: AsyncSession = Depends(get_session), auth_user: Principal = Depends(get_current_user)):
     result = await session.execute(select(User).filter(User.id == user_id))
     user = result.scalar()
     if not user:
@@ -52,11 +58,12 @@ async def update_limits(user_id: int, max_apiaries: int, max_meliponaries: int,
     user.max_meliponaries = max_meliponaries
     async with session.begin():
         await log_action(session, user_id=auth_user.id, action="UPDATE_LIMITS", entity="USER", entity_id=user.id, details=MSG_LIMITS_UPDATED)
+    cache_principal.invalidar(user.id)
     await session.refresh(user)
     return {"detail": MSG_LIMITS_UPDATED}
 
 @management_router.get('/users/{user_id}/config', status_code=status.HTTP_200_OK)
-async def get_user_config(user_id: int, session: AsyncSession = Depends(get_session), auth_user: User = Depends(get_current_user)):
+async def get_user_config(user_id: int, session: AsyncSession = Depends(get_session), auth_user: Principal = Depends(get_current_user)):
     result = await session.execute(select(User).filter(User.id == user_id))
     user = result.scalar()
     if not user:
@@ -67,6 +74,16 @@ async def get_user_config(user_id: int, session: AsyncSession = Depends(get_sess
         "max_meliponaries": user.max_meliponaries,
     }
 
+@management_router.post('/dashboard/reconcile', status_code=status.HTTP_200_OK)
+async def reconcile_dashboard(session: AsyncSession = Depends(get_session), auth_user: Principal = Depends(get_current_user)):
+    """Reconstrói a tabela de resumo do dashboard a partir dos cadastros."""
+    return await resumo_dashboard.reconciliar(session)
+
+@management_router.get('/metrics', response_class=PlainTextResponse)
+async def metrics(auth_user: Principal = Depends(get_current_user)):
+    """Métricas deste worker no formato texto do Prometheus; o coletor se autentica com um Bearer token."""
+    return metricas.exportar()
+
 # --- Gestão de Pagamentos ---
 @management_router.post('/payments/initiate', status_code=status.HTTP_201_CREATED)
 async def initiate_payment(
@@ -74,7 +91,7 @@ async def initiate_payment(
     amount: float = Body(...),
     provider: str = Body(..., examples=[{"value": "efi"}, {"value": "stripe"}]),
     session: AsyncSession = Depends(get_session),
-    auth_user: User = Depends(get_current_user)
+    auth_user: Principal = Depends(get_current_user)
 ):
     """
     Inicia um pagamento para o usuário informado.
@@ -92,7 +109,7 @@ async def initiate_payment(
         raise HTTPException(status_code=400, detail="Provedor de pagamento não suportado.")
 
 @management_router.get('/payments/status/{payment_id}', status_code=status.HTTP_200_OK)
-async def get_payment_status(payment_id: str, provider: str, auth_user: User = Depends(get_current_user)):
+async def get_payment_status(payment_id: str, provider: str, auth_user: Principal = Depends(get_current_user)):
     """
     Consulta o status de um pagamento em um provedor externo.
     """
@@ -1,15 +1,24 @@
-from typing import List
-from fastapi import APIRouter, Depends, status, HTTPException, Response, UploadFile, File
-from fastapi.responses import JSONResponse
+from typing import List, Optional
+import hashlib
+from fastapi import APIRouter, BackgroundTasks, Depends, Request, status, HTTPException, Response, UploadFile, File
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from minio import Minio
 from minio.error import S3Error
 import os
-import json
 
 from core.deps import get_session
 from models import Maps
+from utils import cache_tiles_mvt, cache_variantes, fonte_camada_indexada, invalidar_camadas, \
+    superficies_capacidade
+from utils.computacao import servico_computacao
+from utils.consulta_camadas import consultar_corpo, interpretar_bbox, zoom_valido
+from utils.flatgeobuf import nome_fgb, nome_fgb_exibicao
+from utils.http_objetos import METADADO_ORIGEM, comprimir, http_date, intervalo, ler_objeto, nao_modificado, nome_gzip
+from utils.ingestao import STATUS_PENDENTE, processar_mapa
+from utils.tiles_mvt import gerar_tile, tile_valido
 
 maps_router = APIRouter()
 
@@ -32,12 +41,14 @@ if not minio_client.bucket_exists(MINIO_BUCKET_NAME):
 
 
 @maps_router.post("/upload/")
-async def upload_geojson(files: List[UploadFile] = File(...), session: AsyncSession = Depends(get_session)):
+async def upload_geojson(background_tasks: BackgroundTasks, files: List[UploadFile] = File(...),
+                         session: AsyncSession = Depends(get_session)):
     file_urls = []
+    new_maps = []
     for file in files:
         file_path = f"{file.filename.lower()}"
         try:
-            minio_client.put_object(
+            resultado = minio_client.put_object(
                 MINIO_BUCKET_NAME,
                 file_path,
                 file.file,
@@ -49,13 +60,25 @@ async def upload_geojson(files: List[UploadFile] = File(...), session: AsyncSess
             file_urls.append(file_url)
 
             # Save file data to the database
-            new_map = Maps(file_path=file_url, name=file.filename)
+            new_map = Maps(
+                file_path=file_url, name=file.filename, object_name=file_path,
+                checksum=resultado.etag, ingest_status=STATUS_PENDENTE, ingest_progress=0
+            )
             session.add(new_map)
+            new_maps.append(new_map)
         except S3Error as e:
             raise HTTPException(status_code=500, detail=f"MinIO error: {str(e)}")
 
     await session.commit()
-    return JSONResponse(content={"file_urls": file_urls})
+    for file in files:
+        invalidar_camadas(file.filename.lower())
+    # Validação, reparo, FlatGeobuf e tiles rodam depois da resposta; andamento fica no registro de geomaps
+    for new_map in new_maps:
+        background_tasks.add_task(processar_mapa, new_map.id)
+    return JSONResponse(content={
+        "file_urls": file_urls,
+        "maps": [{"id": m.id, "ingest_status": m.ingest_status} for m in new_maps]
+    })
 
 @maps_router.get("/")
 async def list_geojson(session: AsyncSession = Depends(get_session)):
@@ -63,17 +86,180 @@ async def list_geojson(session: AsyncSession = Depends(get_session)):
         result = await session.execute(select(Maps))
         maps = result.scalars().all()
 
-    file_urls = [{"id": map.id, "name": map.name, "url": map.file_path} for map in maps]
+    file_urls = [
+        {"id": map.id, "name": map.name, "url": map.file_path, "ingest_status": map.ingest_status}
+        for map in maps
+    ]
     return JSONResponse(content=file_urls)
 
+@maps_router.get("/cache/")
+async def cache_stats():
+    return JSONResponse(content=servico_computacao.estatisticas_cache())
+
+@maps_router.get("/{map_id}/ingest")
+async def ingest_status(map_id: int, session: AsyncSession = Depends(get_session)):
+    map_entry = await session.get(Maps, map_id)
+    if not map_entry:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Map not found")
+    return JSONResponse(content={
+        "id": map_entry.id,
+        "status": map_entry.ingest_status,
+        "progress": map_entry.ingest_progress,
+        "message": map_entry.ingest_message
+    })
+
+@maps_router.get("/tiles/{layer}/{z}/{x}/{y}.mvt")
+async def vector_tile(layer: str, z: int, x: int, y: int, request: Request):
+    """Vector tile (MVT) da camada de vegetação (nome do objeto no bucket) ou de biomas (`biomas`)."""
+    if not tile_valido(z, x, y):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Tile inválido')
+    fonte = await run_in_threadpool(fonte_camada_indexada, layer)
+    if fonte is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Camada não encontrada')
+    caminho, versao = fonte
+    headers = {'ETag': f'"{versao}-{z}-{x}-{y}"', 'Cache-Control': 'no-cache'}
+    if nao_modificado(request.headers, headers['ETag'], None):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    dados = await run_in_threadpool(cache_tiles_mvt.ler, layer, versao, z, x, y)
+    if dados is None:
+        dados = await servico_computacao.executar(gerar_tile, caminho, layer, z, x, y)
+        await run_in_threadpool(cache_tiles_mvt.gravar, layer, versao, z, x, y, dados)
+    if not dados:
+        return Response(status_code=status.HTTP_204_NO_CONTENT, headers=headers)
+    return Response(content=dados, media_type='application/vnd.mapbox-vector-tile', headers=headers)
+
+@maps_router.get("/capacity/{tipo}/{z}/{x}/{y}.png")
+async def capacity_tile(tipo: str, z: int, x: int, y: int, request: Request):
+    """Tile PNG da capacidade de suporte remanescente (`apicultura` ou `meliponicultura`)."""
+    if not tile_valido(z, x, y):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Tile inválido')
+    superficie = superficies_capacidade.get(tipo)
+    if superficie is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Superfície não encontrada')
+    if not await run_in_threadpool(superficie.disponivel):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Superfície de capacidade não gerada. Execute python -m utils.superficie_capacidade."
+        )
+    # A versão muda a cada alteração de ocupação, então o ETag acompanha as atualizações incrementais
+    headers = {'ETag': f'"{superficie.versao()}-{z}-{x}-{y}"', 'Cache-Control': 'no-cache'}
+    if nao_modificado(request.headers, headers['ETag'], None):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    dados = await run_in_threadpool(superficie.tile_png, z, x, y)
+    if not dados:
+        return Response(status_code=status.HTTP_204_NO_CONTENT, headers=headers)
+    return Response(content=dados, media_type='image/png', headers=headers)
+
+async def _gzip_pre_comprimido(filename: str, etag_origem: str):
+    """Estado do objeto .gz da camada, se ele existir e tiver sido gerado a partir da versão atual."""
+    try:
+        estado = await run_in_threadpool(minio_client.stat_object, MINIO_BUCKET_NAME, nome_gzip(filename))
+    except S3Error:
+        return None
+    if estado.metadata.get(f'x-amz-meta-{METADADO_ORIGEM}') != etag_origem:
+        return None
+    return estado
+
+async def _consulta_camada(filename: str, request: Request, bbox: Optional[str], classes: Optional[str],
+                           tolerance: Optional[float], zoom: Optional[int]) -> Response:
+    """Feições da camada no bbox/classes pedidos, simplificadas pela tolerância (graus) ou pelo zoom."""
+    try:
+        limites = interpretar_bbox(bbox) if bbox else None
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f'bbox inválido: {str(e)}')
+    if zoom is not None and not zoom_valido(zoom):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='zoom inválido')
+    if tolerance is not None and tolerance < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='tolerance deve ser positiva')
+    if tolerance is not None and limites is None:
+        # Sem bbox a tolerância livre simplificaria a camada inteira a cada requisição; para isso existe zoom
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='tolerance exige bbox; use zoom')
+    lista_classes = sorted({c.strip() for c in classes.split(',') if c.strip()}) if classes else None
+    fonte = await run_in_threadpool(fonte_camada_indexada, filename)
+    if fonte is None:
+        return JSONResponse(content={"error": f"Camada {filename} não encontrada"}, status_code=404)
+    caminho, versao = fonte
+
+    parametros = f'{limites}|{lista_classes}|{tolerance}|{zoom}'
+    gzip = 'gzip' in request.headers.get('accept-encoding', '').lower()
+    sufixo = '-gzip' if gzip else ''
+    headers = {
+        'Vary': 'Accept-Encoding',
+        'Cache-Control': 'no-cache',
+        'ETag': f'"{versao}-{hashlib.sha1(parametros.encode()).hexdigest()[:16]}{sufixo}"',
+    }
+    if nao_modificado(request.headers, headers['ETag'], None):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    origem, tolerancia = caminho, tolerance
+    if zoom is not None and tolerance is None:
+        # Variante da camada inteira simplificada para o zoom, gerada uma vez por versão
+        origem = await run_in_threadpool(cache_variantes.caminho, filename, versao, zoom)
+        await cache_variantes.garantir(caminho, origem, zoom)
+    # Codificação e gzip no mesmo processo da consulta, fora do event loop
+    corpo = await servico_computacao.executar(consultar_corpo, origem, limites, lista_classes, tolerancia, gzip)
+    if gzip:
+        headers['Content-Encoding'] = 'gzip'
+    return Response(content=corpo, media_type='application/json', headers=headers)
+
 @maps_router.get("/content/{filename}")
-async def geojson_content(filename: str):
+async def geojson_content(filename: str, request: Request, bbox: Optional[str] = None, classes: Optional[str] = None,
+                          tolerance: Optional[float] = None, zoom: Optional[int] = None):
+    """
+    Sem parâmetros: o objeto original, em fluxo (gzip, ETag/304 e Range).
+    Com bbox (min_lon,min_lat,max_lon,max_lat), classes (separadas por vírgula), tolerance (graus, exige bbox)
+    ou zoom: só as feições que intersectam o bbox, simplificadas; as variantes por zoom ficam em cache.
+    """
+    if bbox or classes or tolerance is not None or zoom is not None:
+        return await _consulta_camada(filename, request, bbox, classes, tolerance, zoom)
     try:
-        response = minio_client.get_object(MINIO_BUCKET_NAME, filename)
-        content = json.load(response)
-        return JSONResponse(content=content)
+        estado = await run_in_threadpool(minio_client.stat_object, MINIO_BUCKET_NAME, filename)
     except S3Error as e:
         return JSONResponse(content={"error": f"MinIO error: {str(e)}"}, status_code=404)
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'Vary': 'Accept-Encoding',
+        'Cache-Control': 'no-cache',
+        'Last-Modified': http_date(estado.last_modified),
+    }
+    range_header = request.headers.get('range')
+    # Range vale sobre os bytes originais; gzip só quando não há Range
+    if not range_header and 'gzip' in request.headers.get('accept-encoding', '').lower():
+        headers.update({'ETag': f'"{estado.etag}-gzip"', 'Content-Encoding': 'gzip'})
+        if nao_modificado(request.headers, headers['ETag'], estado.last_modified):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        pre_comprimido = await _gzip_pre_comprimido(filename, estado.etag)
+        if pre_comprimido is not None:
+            headers['Content-Length'] = str(pre_comprimido.size)
+            corpo = ler_objeto(minio_client, MINIO_BUCKET_NAME, nome_gzip(filename))
+        else:
+            corpo = comprimir(ler_objeto(minio_client, MINIO_BUCKET_NAME, filename))
+        return StreamingResponse(corpo, media_type='application/json', headers=headers)
+
+    headers['ETag'] = f'"{estado.etag}"'
+    if nao_modificado(request.headers, headers['ETag'], estado.last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    # If-Range com outra versão: ignora o Range e devolve o objeto inteiro
+    if_range = request.headers.get('if-range')
+    if if_range and if_range != headers['ETag']:
+        range_header = None
+    try:
+        faixa = intervalo(range_header, estado.size)
+    except ValueError:
+        return Response(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={'Content-Range': f'bytes */{estado.size}'}
+        )
+    if faixa is None:
+        headers['Content-Length'] = str(estado.size)
+        corpo = ler_objeto(minio_client, MINIO_BUCKET_NAME, filename)
+        return StreamingResponse(corpo, media_type='application/json', headers=headers)
+    inicio, fim = faixa
+    headers.update({'Content-Range': f'bytes {inicio}-{fim}/{estado.size}', 'Content-Length': str(fim - inicio + 1)})
+    corpo = ler_objeto(minio_client, MINIO_BUCKET_NAME, filename, offset=inicio, length=fim - inicio + 1)
+    return StreamingResponse(
+        corpo, status_code=status.HTTP_206_PARTIAL_CONTENT, media_type='application/json', headers=headers
+    )
 
 @maps_router.delete("/{map_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_geojson(map_id: int, session: AsyncSession = Depends(get_session)):
@@ -88,11 +274,15 @@ async def delete_geojson(map_id: int, session: AsyncSession = Depends(get_sessio
         file_path = map_entry.file_path.split(f"https://{MINIO_URL}/{MINIO_BUCKET_NAME}/")[1]
         try:
             minio_client.remove_object(MINIO_BUCKET_NAME, file_path)
+            minio_client.remove_object(MINIO_BUCKET_NAME, nome_fgb(file_path))
+            minio_client.remove_object(MINIO_BUCKET_NAME, nome_fgb_exibicao(file_path))
+            minio_client.remove_object(MINIO_BUCKET_NAME, nome_gzip(file_path))
         except S3Error as e:
             raise HTTPException(status_code=500, detail=f"MinIO error: {str(e)}")
 
         # Delete the map entry from the database
         await session.delete(map_entry)
         await session.commit()
+    invalidar_camadas(file_path)
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
@@ -1,17 +1,22 @@
 import logging
 from typing import List
 from fastapi import APIRouter, Depends, status, HTTPException, Response, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import func
-from shapely.geometry import Point
-from core.deps import get_session, get_current_user
+from starlette.concurrency import run_in_threadpool
+from core.deps import Principal, get_session, get_current_user
 from core.messages import MSG_LIMIT_MELIPONARY, MSG_UPGRADE_OPTIONS, MSG_MELIPONARY_NOT_FOUND, MSG_FORBIDDEN_VIEW_MELIPONARY, MSG_FORBIDDEN_UPDATE_MELIPONARY
-from models import User
 from models.meliponary import Meliponary
-from schemas.meliponary_schema import MeliponaryCreateSchema, MeliponarySchema
-from utils import verify_user_exists, calcular_raio_voo_meliponario, identificar_bioma_por_ponto, process_meliponicultor
+from schemas.meliponary_schema import MeliponaryCapacityBatchSchema, MeliponaryCreateSchema, MeliponarySchema
+from utils import verify_user_exists, calcular_raio_voo_meliponario, identificar_bioma_por_ponto, process_meliponicultor, \
+    construir_buffers_existentes, atualizar_superficie_capacidade, localizacao_colmeias, RAIO_MAXIMO_MELIPONARIO_KM, buffer_metrico, catalogo_camadas
+from utils import resumo_dashboard
+from utils.capacidade_lote import fluxo_ndjson, iniciar_blocos, validar_modo, validar_pontos
+from utils.computacao import servico_computacao
 from utils.log_utils import log_action
+from utils.proximidade import existe_no_ponto, listar_no_raio, indexar, desindexar
 
 meliponary_router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -21,7 +26,7 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 @meliponary_router.post('', response_model=MeliponarySchema, status_code=status.HTTP_201_CREATED)
 async def create_meliponary(
         meliponary: MeliponaryCreateSchema,
-        auth_user: User = Depends(get_current_user),
+        auth_user: Principal = Depends(get_current_user),
         session: AsyncSession = Depends(get_session),
         allow_same_point: bool = Query(False, description="Permitir cadastro no mesmo ponto se já existir")
 ):
@@ -62,49 +67,47 @@ async def create_meliponary(
                 "upgrade_options": MSG_UPGRADE_OPTIONS
             }
         )
-    # Carrega todos os meliponários após a validação de limite (usados para buffers de interseção)
-    result_all = await session.execute(select(Meliponary))
-    all_meliponaries = result_all.scalars().all()
     # Verificação de coordenada duplicada (opcional)
-    if not allow_same_point:
-        for m in all_meliponaries:
-            if float(m.latitude) == float(meliponary.latitude) and float(m.longitude) == float(meliponary.longitude):
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Já existe um meliponário cadastrado nesta coordenada.")
+    if not allow_same_point and await existe_no_ponto(session, Meliponary, _lon, _lat):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Já existe um meliponário cadastrado nesta coordenada.")
     # Identifica bioma do ponto
     geojson_biomas_path = 'geojson_files/Brasil.json'
     longitude = float(meliponary.longitude)
     latitude = float(meliponary.latitude)
-    bioma = identificar_bioma_por_ponto(longitude, latitude, geojson_biomas_path)
+    bioma = await servico_computacao.executar(identificar_bioma_por_ponto, longitude, latitude, geojson_biomas_path)
     if not bioma:
         logger.warning(f"Bioma não identificado para coordenadas ({latitude}, {longitude})")
         raise HTTPException(status_code=400, detail="coordenada nao mapeada no geojson ou bioma não identificado")
     # Calcula raio de voo
     raio_km = calcular_raio_voo_meliponario(meliponary.especieAbelha)
-    # Monta lista de buffers existentes para passar ao process_meliponicultor
-    import geopandas as gpd
-    crs_geo = "EPSG:4326"
-    crs_metric = "EPSG:31983"
-    buffers_existentes = []
-    for m in all_meliponaries:
+    # Meliponários cujo buffer pode intersectar o novo: distância até raio novo + maior raio de espécie
+    vizinhos = await listar_no_raio(session, Meliponary, longitude, latitude, raio_km + RAIO_MAXIMO_MELIPONARIO_KM)
+    # Monta lista de buffers existentes para passar ao process_meliponicultor (raio por espécie, em lote)
+    raios_existentes = []
+    for m in vizinhos:
         try:
-            r_km_existente = calcular_raio_voo_meliponario(m.especieAbelha) or raio_km
+            raios_existentes.append(calcular_raio_voo_meliponario(m.especieAbelha) or raio_km)
         except Exception:
-            r_km_existente = raio_km
-        centro = Point(float(m.longitude), float(m.latitude))
-        gdf_centro = gpd.GeoDataFrame(geometry=[centro], crs=crs_geo).to_crs(crs_metric)
-        buffer = gdf_centro.geometry.iloc[0].buffer(r_km_existente * 1000)
-        buffers_existentes.append({"buffer": buffer, "colmeias": int(m.quantidadeColmeias)})
+            raios_existentes.append(raio_km)
+    buffers_existentes = construir_buffers_existentes(
+        longitudes=[float(m.longitude) for m in vizinhos],
+        latitudes=[float(m.latitude) for m in vizinhos],
+        raios_km=raios_existentes,
+        colmeias=[int(m.quantidadeColmeias) for m in vizinhos]
+    )
+    # Camadas ativas do catálogo cujo bbox cruza o buffer do novo meliponário
+    camadas = await catalogo_camadas.camadas_para(session, buffer_metrico(longitude, latitude, raio_km))
     # Calcula capacidade de suporte e área usando a função padronizada
-    resultado = process_meliponicultor(
+    resultado = await servico_computacao.executar(
+        process_meliponicultor,
         latitude=str(meliponary.latitude),
         longitude=str(meliponary.longitude),
         especie=meliponary.especieAbelha,
         raio_km=raio_km,
         buffers_existentes=buffers_existentes,
-        return_area_only=False
+        return_area_only=False,
+        geojson_files=camadas
     )
-    if resultado is None:
-        raise HTTPException(status_code=400, detail="Erro ao calcular capacidade de suporte do meliponário.")
     logger.info(f"Capacidade permitida final: {resultado['capacidade_final']}")
     # Salva meliponário com a capacidade calculada
     new_meliponary = Meliponary(
@@ -124,11 +127,16 @@ async def create_meliponary(
         distanciaMinimaConstrucoes=meliponary.distanciaMinimaConstrucoes,
         distanciaSeguraLavouras=meliponary.distanciaSeguraLavouras,
         capacidadeDeSuporte=str(resultado['capacidade_final']),
+        bioma=bioma,
         userId=auth_user.id
     )
     session.add(new_meliponary)
+    # Resumo do dashboard ajustado na mesma transação do cadastro
+    await resumo_dashboard.ajustar(session, adicionada=resumo_dashboard.contribuicao(Meliponary, new_meliponary))
     await session.commit()
     await session.refresh(new_meliponary)
+    indexar(Meliponary, new_meliponary)
+    await run_in_threadpool(atualizar_superficie_capacidade, Meliponary, atual=localizacao_colmeias(Meliponary, new_meliponary))
     response = new_meliponary.__dict__.copy()
     # Adiciona os detalhes do cálculo na resposta
     response["calculo_meliponario"] = {
@@ -143,15 +151,41 @@ async def create_meliponary(
     return response
 
 
+@meliponary_router.post('/capacity:batch')
+async def capacity_batch(
+        lote: MeliponaryCapacityBatchSchema,
+        mode: str = Query('exact', description="exact (geometrias das camadas) ou approximate (raster de vegetação)"),
+        auth_user: Principal = Depends(get_current_user),
+        session: AsyncSession = Depends(get_session)
+):
+    """
+    Capacidade de suporte de vários locais candidatos (espécie por ponto), sem cadastrar meliponários.
+    Responde em NDJSON, uma linha por ponto na ordem enviada (campo "indice"; "erro" quando o ponto não pôde ser avaliado).
+    """
+    pontos = [p.model_dump() for p in lote.points]
+    validar_pontos(pontos)
+    validar_modo(mode)
+    blocos = await iniciar_blocos(
+        session, Meliponary, pontos,
+        raios_km=[calcular_raio_voo_meliponario(p['especieAbelha']) for p in pontos],
+        tipo_producao='meliponicultura',
+        # Vizinho mais distante que ainda pode cruzar: raio do candidato + maior raio de espécie
+        alcance_vizinhos_km=max(calcular_raio_voo_meliponario(p['especieAbelha']) for p in pontos) + RAIO_MAXIMO_MELIPONARIO_KM,
+        modo=mode
+    )
+    logger.info(f"Avaliação de capacidade em lote de {len(pontos)} pontos para usuário {auth_user.id}")
+    return StreamingResponse(fluxo_ndjson(pontos, blocos), media_type='application/x-ndjson')
+
+
 @meliponary_router.get('', response_model=List[MeliponarySchema])
-async def get_meliponaries(session: AsyncSession = Depends(get_session), auth_user: User = Depends(get_current_user)):
+async def get_meliponaries(session: AsyncSession = Depends(get_session), auth_user: Principal = Depends(get_current_user)):
     result = await session.execute(select(Meliponary).filter(Meliponary.userId == auth_user.id))
     return result.scalars().all()
 
 
 @meliponary_router.get('/{id}', response_model=MeliponarySchema)
 async def get_meliponary(id: int, session: AsyncSession = Depends(get_session),
-                         auth_user: User = Depends(get_current_user), ):
+                         auth_user: Principal = Depends(get_current_user), ):
     result = await session.execute(select(Meliponary).filter(Meliponary.id == id))
     meliponary = result.scalar()
     if meliponary is None:
@@ -163,7 +197,7 @@ async def get_meliponary(id: int, session: AsyncSession = Depends(get_session),
 
 @meliponary_router.put('/{id}', response_model=MeliponarySchema)
 async def update_meliponary(id: int, meliponary: MeliponaryCreateSchema, session: AsyncSession = Depends(get_session),
-                            auth_user: User = Depends(get_current_user), ):
+                            auth_user: Principal = Depends(get_current_user), ):
     await verify_user_exists(auth_user.id, session)
     result = await session.execute(select(Meliponary).filter(Meliponary.id == id))
     meliponary_db = result.scalar()
@@ -172,19 +206,32 @@ async def update_meliponary(id: int, meliponary: MeliponaryCreateSchema, session
     # Só permite atualizar se o usuário for o dono
     if meliponary_db.userId != auth_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=MSG_FORBIDDEN_UPDATE_MELIPONARY)
+    coordenada_anterior = (meliponary_db.longitude, meliponary_db.latitude)
+    anterior = localizacao_colmeias(Meliponary, meliponary_db)
+    parcela_anterior = resumo_dashboard.contribuicao(Meliponary, meliponary_db)
     # Atualiza os campos manualmente, protegendo campos imutáveis
     for key, value in meliponary.model_dump().items():
         if key in {"id", "userId"}:
             continue
         setattr(meliponary_db, key, value)
+    if coordenada_anterior != (meliponary_db.longitude, meliponary_db.latitude):
+        # Coordenada alterada: o bioma gravado acompanha a nova posição
+        meliponary_db.bioma = await servico_computacao.executar(
+            identificar_bioma_por_ponto, meliponary_db.longitude, meliponary_db.latitude, 'geojson_files/Brasil.json'
+        )
+    await resumo_dashboard.ajustar(session, parcela_anterior, resumo_dashboard.contribuicao(Meliponary, meliponary_db))
     await session.commit()
     await session.refresh(meliponary_db)
+    indexar(Meliponary, meliponary_db)
+    await run_in_threadpool(
+        atualizar_superficie_capacidade, Meliponary, anterior, localizacao_colmeias(Meliponary, meliponary_db)
+    )
     return meliponary_db
 
 
 @meliponary_router.delete('/{id}', status_code=status.HTTP_204_NO_CONTENT)
 async def delete_meliponary(id: int, session: AsyncSession = Depends(get_session),
-                            auth_user: User = Depends(get_current_user), ):
+                            auth_user: Principal = Depends(get_current_user), ):
     result = await session.execute(select(Meliponary).filter(Meliponary.id == id))
     meliponary = result.scalar_one_or_none()
     if meliponary is None:
@@ -193,9 +240,14 @@ async def delete_meliponary(id: int, session: AsyncSession = Depends(get_session
     if meliponary.userId != auth_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="Você não tem permissão para deletar este meliponário.")
+    anterior = localizacao_colmeias(Meliponary, meliponary)
+    parcela_anterior = resumo_dashboard.contribuicao(Meliponary, meliponary)
     # Executa a exclusão e o log na mesma transação implícita e confirma
     await session.delete(meliponary)
     await log_action(session, user_id=auth_user.id, action="DELETE", entity="MELIPONARY", entity_id=meliponary.id,
                      details=f"Meliponário deletado: {meliponary.name}")
+    await resumo_dashboard.ajustar(session, removida=parcela_anterior)
     await session.commit()
+    desindexar(Meliponary, id)
+    await run_in_threadpool(atualizar_superficie_capacidade, Meliponary, anterior=anterior)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,19 +1,19 @@
-from fastapi import APIRouter, Depends, status, HTTPException, Body
+from typing import Optional
+
+from fastapi import APIRouter, Depends, status, HTTPException, Body, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
-from core.deps import get_session, get_current_user
+from core.cache_principal import cache_principal
+from core.deps import Principal, get_session, get_current_user
 from core.messages import (
     MSG_USER_NOT_FOUND, MSG_USER_ALREADY_ACTIVE, MSG_USER_ALREADY_INACTIVE,
     MSG_USER_ACTIVATED, MSG_USER_DEACTIVATED, MSG_LIMITS_UPDATED, MSG_ROLE_ADDED, MSG_ROLE_REMOVED
 )
-from core.security import generate_password_hash
+from core.security import servico_senhas
 from models import User
-from models.apiary import Apiary
-from models.meliponary import Meliponary
-from schemas.apiary_schema import ApiarySchema
-from schemas.meliponary_schema import MeliponarySchema
 from schemas.user_schema import UserSchema, CreateUserSchema
+from utils.dashboard import LIMITE_PADRAO, responder
 from utils.log_utils import log_action
 
 user_router = APIRouter()
@@ -40,12 +40,13 @@ async def create_user(
 ):
     await verify_cpf_exists(user.cpf, session)
     await verify_email_exists(user.email, session)
+    password_hash = await servico_senhas.gerar_hash(user.password)
     new_user = User(
         fullName=user.fullName,
         email=user.email,
         cpf=user.cpf,
         phone=user.phone,
-        password=generate_password_hash(user.password),
+        password=password_hash,
     )
     # Adiciona perfis ao usuário
     if hasattr(user, 'profile_ids') and user.profile_ids:
@@ -57,7 +58,7 @@ async def create_user(
     return new_user
 
 @user_router.get('/me', response_model=UserSchema)
-async def get_logged_in_user(current_user: User = Depends(get_current_user)):
+async def get_logged_in_user(current_user: Principal = Depends(get_current_user)):
     return {
         "id": current_user.id,
         "fullName": current_user.fullName,
@@ -71,7 +72,7 @@ async def get_logged_in_user(current_user: User = Depends(get_current_user)):
     }
 
 @user_router.patch('/{user_id}/activate', status_code=status.HTTP_200_OK)
-async def activate_user(user_id: int, session: AsyncSession = Depends(get_session), auth_user: User = Depends(get_current_user)):
+async def activate_user(user_id: int, session: AsyncSession = Depends(get_session), auth_user: Principal = Depends(get_current_user)):
     result = await session.execute(select(User).filter(User.id == user_id))
     user = result.scalar()
     if not user:
@@ -81,11 +82,12 @@ async def activate_user(user_id: int, session: AsyncSession = Depends(get_sessio
     user.is_active = True
     async with session.begin():
         await log_action(session, user_id=auth_user.id, action="ACTIVATE", entity="USER", entity_id=user.id, details=MSG_USER_ACTIVATED)
+    cache_principal.invalidar(user.id)
     await session.refresh(user)
     return {"detail": MSG_USER_ACTIVATED}
 
 @user_router.patch('/{user_id}/deactivate', status_code=status.HTTP_200_OK)
-async def deactivate_user(user_id: int, session: AsyncSession = Depends(get_session), auth_user: User = Depends(get_current_user)):
+async def deactivate_user(user_id: int, session: AsyncSession = Depends(get_session), auth_user: Principal = Depends(get_current_user)):
     result = await session.execute(select(User).filter(User.id == user_id))
     user = result.scalar()
     if not user:
@@ -95,11 +97,12 @@ async def deactivate_user(user_id: int, session: AsyncSession = Depends(get_sess
     user.is_active = False
     async with session.begin():
         await log_action(session, user_id=auth_user.id, action="DEACTIVATE", entity="USER", entity_id=user.id, details=MSG_USER_DEACTIVATED)
+    cache_principal.invalidar(user.id)
     await session.refresh(user)
     return {"detail": MSG_USER_DEACTIVATED}
 
 @user_router.patch('/{user_id}/limits', status_code=status.HTTP_200_OK)
-async def update_limits(user_id: int, max_apiaries: int, max_meliponaries: int, session: AsyncSession = Depends(get_session), auth_user: User = Depends(get_current_user)):
+async def update_limits(user_id: int, max_apiaries: int, max_meliponaries: int, session: AsyncSession = Depends(get_session), auth_user: Principal = Depends(get_current_user)):
     result = await session.execute(select(User).filter(User.id == user_id))
     user = result.scalar()
     if not user:
@@ -108,11 +111,12 @@ async def update_limits(user_id: int, max_apiaries: int, max_meliponaries: int,
     user.max_meliponaries = max_meliponaries
     async with session.begin():
         await log_action(session, user_id=auth_user.id, action="UPDATE_LIMITS", entity="USER", entity_id=user.id, details=MSG_LIMITS_UPDATED)
+    cache_principal.invalidar(user.id)
     await session.refresh(user)
     return {"detail": MSG_LIMITS_UPDATED}
 
 @user_router.patch('/{user_id}/roles/add', status_code=status.HTTP_200_OK)
-async def add_role(user_id: int, roles: dict = Body(...), session: AsyncSession = Depends(get_session), auth_user: User = Depends(get_current_user)):
+async def add_role(user_id: int, roles: dict = Body(...), session: AsyncSession = Depends(get_session), auth_user: Principal = Depends(get_current_user)):
     result = await session.execute(select(User).filter(User.id == user_id))
     user = result.scalar()
     if not user:
@@ -125,11 +129,12 @@ async def add_role(user_id: int, roles: dict = Body(...), session: AsyncSession
             added.append(role)
     async with session.begin():
         await log_action(session, user_id=auth_user.id, action="ADD_ROLE", entity="USER", entity_id=user.id, details=f"{MSG_ROLE_ADDED} {', '.join(added)}")
+    cache_principal.invalidar(user.id)
     await session.refresh(user)
     return {"detail": f"{MSG_ROLE_ADDED} {', '.join(added)}"}
 
 @user_router.patch('/{user_id}/roles/remove', status_code=status.HTTP_200_OK)
-async def remove_role(user_id: int, roles: dict = Body(...), session: AsyncSession = Depends(get_session), auth_user: User = Depends(get_current_user)):
+async def remove_role(user_id: int, roles: dict = Body(...), session: AsyncSession = Depends(get_session), auth_user: Principal = Depends(get_current_user)):
     result = await session.execute(select(User).filter(User.id == user_id))
     user = result.scalar()
     if not user:
@@ -138,11 +143,12 @@ async def remove_role(user_id: int, roles: dict = Body(...), session: AsyncSessi
     user.roles = [r for r in user.roles if r.role not in to_remove]
     async with session.begin():
         await log_action(session, user_id=auth_user.id, action="REMOVE_ROLE", entity="USER", entity_id=user.id, details=f"{MSG_ROLE_REMOVED} {', '.join(to_remove)}")
+    cache_principal.invalidar(user.id)
     await session.refresh(user)
     return {"detail": f"{MSG_ROLE_REMOVED} {', '.join(to_remove)}"}
 
 @user_router.get('/{user_id}/config', status_code=status.HTTP_200_OK)
-async def get_user_config(user_id: int, session: AsyncSession = Depends(get_session), auth_user: User = Depends(get_current_user)):
+async def get_user_config(user_id: int, session: AsyncSession = Depends(get_session), auth_user: Principal = Depends(get_current_user)):
     result = await session.execute(select(User).filter(User.id == user_id))
     user = result.scalar()
     if not user:
@@ -156,12 +162,13 @@ async def get_user_config(user_id: int, session: AsyncSession = Depends(get_sess
     }
 
 @user_router.get('/dashboard', status_code=200)
-async def dashboard(session: AsyncSession = Depends(get_session), auth_user: User = Depends(get_current_user)):
-    apiaries_result = await session.execute(select(Apiary).filter(Apiary.userId == auth_user.id))
-    meliponaries_result = await session.execute(select(Meliponary).filter(Meliponary.userId == auth_user.id))
-    apiaries = apiaries_result.scalars().all()
-    meliponaries = meliponaries_result.scalars().all()
-    return {
-        "apiarios": [ApiarySchema.model_validate(a).model_dump() for a in apiaries],
-        "meliponarios": [MeliponarySchema.model_validate(m).model_dump() for m in meliponaries]
-    }
+async def dashboard(
+        session: AsyncSession = Depends(get_session),
+        auth_user: Principal = Depends(get_current_user),
+        mode: str = Query('page', description="page (paginado), summary (agregados) ou stream (NDJSON)"),
+        entity: Optional[str] = Query(None, description="apiarios, meliponarios ou ambos separados por vírgula"),
+        fields: Optional[str] = Query(None, description="Colunas separadas por vírgula (padrão: todas)"),
+        limit: int = Query(LIMITE_PADRAO, description="Linhas por entidade em cada página"),
+        cursor: Optional[str] = Query(None, description="next_cursor da página anterior")
+):
+    return await responder(session, auth_user.id, mode, entity, fields, limit, cursor)
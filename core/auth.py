@@ -10,7 +10,7 @@ from jose import jwt
 
 from models.user import User
 from core.configs import settings
-from core.security import verify_password
+from core.security import servico_senhas
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
@@ -18,11 +18,11 @@ async def authenticate(email: str, password: str, db: AsyncSession) -> Optional[
     async with db as session:
         query = select(User).filter(User.email == email)
         result = await session.execute(query)
-        user: User = result.scalars().unique().one_or_none()
+        user: User = result.scalars().one_or_none()
 
         if not user:
             return None
-        if not verify_password(password, user.password):
+        if not await servico_senhas.verificar(password, user.password):
             return None
         return user
 
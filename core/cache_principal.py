@@ -0,0 +1,139 @@
+"""
+Cache em processo dos usuários autenticados (get_current_user).
+
+Evita a consulta ao banco em toda requisição só para transformar o `sub` do JWT no
+usuário: a entrada vale por `ttl_s` e o cache guarda no máximo `max_itens` usuários
+(descartando os usados há mais tempo). O que fica em cache é um Principal imutável
+(cópia dos campos de User e dos perfis), nunca o objeto ORM: requisições concorrentes
+compartilham a entrada sem poder alterá-la nem depender de uma sessão já fechada.
+
+Os endpoints que alteram is_active, limites ou perfis chamam `invalidar(user_id)` depois
+do commit. Além de descartar a entrada local, a invalidação regrava `arquivo_geracao`;
+os demais workers do mesmo host veem o mtime mudar na próxima leitura e esvaziam o
+próprio cache. O arquivo fica no disco local: com mais de uma réplica (hosts distintos)
+a mudança chega às outras réplicas só quando o TTL expira. O deploy atual é uma
+réplica (k8s replicas: 1, uvicorn sem --workers).
+"""
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple, Optional, Tuple
+
+from core.configs import settings
+from core.metricas import registrar_medidor
+from models.user import User
+
+
+class PerfilPrincipal(NamedTuple):
+    id: int
+    name: str
+
+
+class Principal(NamedTuple):
+    """Usuário autenticado, somente leitura (mesmos nomes de campo de User)."""
+    id: int
+    fullName: str
+    cpf: str
+    email: str
+    phone: str
+    is_active: bool
+    max_apiaries: int
+    max_meliponaries: int
+    createdAt: datetime
+    updatedAt: Optional[datetime]
+    profiles: Tuple[PerfilPrincipal, ...]
+
+
+def principal_de(user: User) -> Principal:
+    """Copia o usuário (com perfis já carregados) para um Principal."""
+    return Principal(
+        id=user.id, fullName=user.fullName, cpf=user.cpf, email=user.email, phone=user.phone,
+        is_active=user.is_active, max_apiaries=user.max_apiaries, max_meliponaries=user.max_meliponaries,
+        createdAt=user.createdAt, updatedAt=user.updatedAt,
+        profiles=tuple(PerfilPrincipal(p.id, p.name) for p in user.profiles)
+    )
+
+
+class CachePrincipal:
+    """LRU com TTL de usuários por id, esvaziado quando o marcador de geração em disco muda."""
+
+    def __init__(self, arquivo_geracao: str, ttl_s: float = 30.0, max_itens: int = 10000):
+        self._arquivo_geracao = arquivo_geracao
+        self._ttl_s = ttl_s
+        self._max_itens = max_itens
+        self._itens: "OrderedDict[int, Tuple[Principal, float]]" = OrderedDict()
+        # Incrementada a cada invalidação (local ou vista no marcador): uma leitura do banco iniciada antes dela não é guardada
+        self._geracao = 0
+        self._marcador_visto = self._ler_marcador()
+        self.acertos = 0
+        self.faltas = 0
+
+    def _ler_marcador(self) -> int:
+        try:
+            return os.stat(self._arquivo_geracao).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _conferir_marcador(self) -> None:
+        marcador = self._ler_marcador()
+        if marcador != self._marcador_visto:
+            self._marcador_visto = marcador
+            self._geracao += 1
+            self._itens.clear()
+
+    @property
+    def geracao(self) -> int:
+        self._conferir_marcador()
+        return self._geracao
+
+    def obter(self, user_id: int) -> Optional[Principal]:
+        self._conferir_marcador()
+        item = self._itens.get(user_id)
+        if item is None or time.monotonic() - item[1] >= self._ttl_s:
+            if item is not None:
+                del self._itens[user_id]
+            self.faltas += 1
+            return None
+        self._itens.move_to_end(user_id)
+        self.acertos += 1
+        return item[0]
+
+    def guardar(self, principal: Principal, geracao: int) -> None:
+        """Guarda o usuário lido do banco, a menos que alguma invalidação tenha ocorrido desde `geracao`."""
+        self._conferir_marcador()
+        if self._ttl_s <= 0 or self._max_itens <= 0 or geracao != self._geracao:
+            return
+        self._itens[principal.id] = (principal, time.monotonic())
+        self._itens.move_to_end(principal.id)
+        while len(self._itens) > self._max_itens:
+            self._itens.popitem(last=False)
+
+    def _marcar_alteracao(self) -> None:
+        temporario = f'{self._arquivo_geracao}.{uuid.uuid4().hex}.tmp'
+        with open(temporario, 'w') as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(temporario, self._arquivo_geracao)
+        self._marcador_visto = self._ler_marcador()
+
+    def invalidar(self, user_id: int) -> None:
+        self._geracao += 1
+        self._itens.pop(user_id, None)
+        self._marcar_alteracao()
+
+    def limpar(self) -> None:
+        self._geracao += 1
+        self._itens.clear()
+        self._marcar_alteracao()
+
+
+cache_principal = CachePrincipal(
+    settings.PRINCIPAL_CACHE_GENERATION_FILE,
+    ttl_s=settings.PRINCIPAL_CACHE_TTL_S,
+    max_itens=settings.PRINCIPAL_CACHE_MAX
+)
+registrar_medidor('cache_usuarios_acertos_total', 'Usuários autenticados servidos pelo cache.',
+                  lambda: cache_principal.acertos, tipo='counter')
+registrar_medidor('cache_usuarios_faltas_total', 'Usuários autenticados lidos do banco.',
+                  lambda: cache_principal.faltas, tipo='counter')
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from typing import ClassVar
 
 from dotenv import load_dotenv
@@ -24,6 +25,32 @@ class Settings(BaseSettings):
     # 60 minutos * 24 horas * 7 dias => 1 semana
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7
 
+    # Consultas de proximidade via ST_DWithin (requer a migração PostGIS aplicada)
+    POSTGIS_ENABLED: bool = os.getenv("POSTGIS_ENABLED", "false").strip().lower() in ("true", "1", "yes")
+
+    # Processos do pool de cálculos geométricos (0 = executa numa thread) e tempo limite por tarefa
+    COMPUTE_WORKERS: int = int(os.getenv("COMPUTE_WORKERS", "2"))
+    COMPUTE_TIMEOUT_S: float = float(os.getenv("COMPUTE_TIMEOUT_S", "60"))
+    # Processos do pool que gera as variantes simplificadas por zoom de /maps/content (0 = numa thread)
+    VARIANT_WORKERS: int = int(os.getenv("VARIANT_WORKERS", "1"))
+    # Tempo limite da ingestão de uma camada enviada (validação, reparo, FlatGeobuf e tiles)
+    INGEST_TIMEOUT_S: float = float(os.getenv("INGEST_TIMEOUT_S", "1800"))
+    # Avaliação de capacidade em lote: máximo de pontos por requisição e pontos por tarefa do pool
+    CAPACITY_BATCH_MAX_POINTS: int = int(os.getenv("CAPACITY_BATCH_MAX_POINTS", "500"))
+    CAPACITY_BATCH_BLOCK_SIZE: int = int(os.getenv("CAPACITY_BATCH_BLOCK_SIZE", "50"))
+    # Cache em processo dos usuários autenticados: validade (0 = desligado) e número máximo de entradas
+    PRINCIPAL_CACHE_TTL_S: float = float(os.getenv("PRINCIPAL_CACHE_TTL_S", "30"))
+    PRINCIPAL_CACHE_MAX: int = int(os.getenv("PRINCIPAL_CACHE_MAX", "10000"))
+    # Marcador regravado a cada invalidação, para os workers do mesmo host descartarem seus caches
+    PRINCIPAL_CACHE_GENERATION_FILE: str = os.getenv(
+        "PRINCIPAL_CACHE_GENERATION_FILE", os.path.join(tempfile.gettempdir(), 'cache_principal.geracao')
+    )
+    # Threads do pool de bcrypt (login e cadastro) e chamadas que podem esperar na fila antes do 503
+    PASSWORD_WORKERS: int = int(os.getenv("PASSWORD_WORKERS", "4"))
+    PASSWORD_QUEUE_MAX: int = int(os.getenv("PASSWORD_QUEUE_MAX", "32"))
+    # Intervalo do monitor de travamento do event loop (0 = desligado)
+    EVENT_LOOP_MONITOR_INTERVAL_S: float = float(os.getenv("EVENT_LOOP_MONITOR_INTERVAL_S", "0.5"))
+
     class Config:
         case_sensitive = True
 
@@ -4,11 +4,14 @@ from jose import jwt, JWTError
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
 from pydantic import BaseModel
 
 from core.database import Session
 from core.auth import oauth2_scheme
+from core.cache_principal import Principal, cache_principal, principal_de
 from core.configs import settings
+from core.messages import MSG_USER_INACTIVE
 from models.user import User
 
 class TokenData(BaseModel):
@@ -24,7 +27,7 @@ async def get_session() -> Generator:
         await session.close()
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_session)) -> User:
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_session)) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Não foi possível validar as credenciais",
@@ -40,12 +43,21 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     except JWTError:
         raise credentials_exception
 
-    async with db as session:
-        query = select(User).filter(User.id == int(token_data.username))
-        result = await session.execute(query)
-        user: User = result.scalars().unique().one_or_none()
-
-        if user is None:
+    user_id = int(token_data.username)
+    user = cache_principal.obter(user_id)
+    if user is None:
+        geracao = cache_principal.geracao
+        async with db as session:
+            # Só as colunas de users e os perfis (select-in); apiários e meliponários não são carregados
+            query = select(User).options(selectinload(User.profiles)).filter(User.id == user_id)
+            result = await session.execute(query)
+            usuario = result.scalars().one_or_none()
+
+        if usuario is None:
             raise credentials_exception
-        return user
+        user = principal_de(usuario)
+        cache_principal.guardar(user, geracao)
 
+    if not user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=MSG_USER_INACTIVE)
+    return user
@@ -22,6 +22,7 @@ MSG_USER_NOT_FOUND = "Usuário não encontrado."
 MSG_PASSWORD_RESET_SENT = "Se o e-mail informado estiver cadastrado, você receberá as instruções para redefinir sua senha."
 MSG_USER_ALREADY_ACTIVE = "Usuário já está ativo."
 MSG_USER_ALREADY_INACTIVE = "Usuário já está inativo."
+MSG_USER_INACTIVE = "Usuário inativo."
 MSG_USER_ACTIVATED = "Usuário ativado com sucesso."
 MSG_USER_DEACTIVATED = "Usuário desativado com sucesso."
 MSG_LIMITS_UPDATED = "Limites atualizados com sucesso."
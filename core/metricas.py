@@ -0,0 +1,81 @@
+"""
+Métricas do processo no formato texto do Prometheus (GET /management/metrics).
+
+Histogramas acumulados em memória (um worker = uma série) e medidores registrados
+pelos serviços que querem expor um valor instantâneo (fila do pool de senhas,
+acertos do cache de usuários). O monitor do event loop dorme `intervalo_s` e mede
+o atraso ao acordar: o excesso é o tempo em que o loop ficou travado por código
+síncrono.
+"""
+import asyncio
+import logging
+import time
+from typing import Callable, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histograma:
+    """Histograma cumulativo no modelo do Prometheus (buckets `le`, soma e contagem)."""
+
+    def __init__(self, nome: str, ajuda: str, buckets: Sequence[float] = BUCKETS_SEGUNDOS):
+        self.nome = nome
+        self.ajuda = ajuda
+        self._buckets = tuple(sorted(buckets))
+        self._contagens = [0] * len(self._buckets)
+        self.soma = 0.0
+        self.total = 0
+        self.maximo = 0.0
+
+    def observar(self, valor: float) -> None:
+        for i, limite in enumerate(self._buckets):
+            if valor <= limite:
+                self._contagens[i] += 1
+        self.soma += valor
+        self.total += 1
+        self.maximo = max(self.maximo, valor)
+
+    def linhas(self) -> List[str]:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        for limite, contagem in zip(self._buckets, self._contagens):
+            linhas.append(f'{self.nome}_bucket{{le="{limite}"}} {contagem}')
+        linhas.append(f'{self.nome}_bucket{{le="+Inf"}} {self.total}')
+        linhas.append(f"{self.nome}_sum {self.soma}")
+        linhas.append(f"{self.nome}_count {self.total}")
+        return linhas
+
+
+latencia_login = Histograma('login_duracao_segundos', 'Duração do POST /auth/login, incluindo a verificação bcrypt.')
+travamento_loop = Histograma(
+    'event_loop_travamento_segundos', 'Atraso do event loop em acordar do monitor (tempo travado por código síncrono).'
+)
+
+# (nome, ajuda, tipo, função que lê o valor)
+_medidores: List[Tuple[str, str, str, Callable[[], float]]] = []
+
+
+def registrar_medidor(nome: str, ajuda: str, leitura: Callable[[], float], tipo: str = 'gauge') -> None:
+    _medidores.append((nome, ajuda, tipo, leitura))
+
+
+async def monitorar_event_loop(intervalo_s: float) -> None:
+    """Tarefa de fundo: registra em travamento_loop o atraso de cada despertar."""
+    while True:
+        inicio = time.monotonic()
+        await asyncio.sleep(intervalo_s)
+        atraso = time.monotonic() - inicio - intervalo_s
+        travamento_loop.observar(max(atraso, 0.0))
+        if atraso > 1.0:
+            logger.warning(f"Event loop travado por {atraso:.2f}s")
+
+
+def exportar() -> str:
+    linhas = latencia_login.linhas() + travamento_loop.linhas()
+    linhas += ["# HELP event_loop_travamento_maximo_segundos Maior atraso observado do event loop.",
+               "# TYPE event_loop_travamento_maximo_segundos gauge",
+               f"event_loop_travamento_maximo_segundos {travamento_loop.maximo}"]
+    for nome, ajuda, tipo, leitura in _medidores:
+        linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} {tipo}", f"{nome} {leitura()}"]
+    return '\n'.join(linhas) + '\n'
@@ -1,5 +1,17 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
 
+from core.configs import settings
+from core.metricas import registrar_medidor
+
+logger = logging.getLogger(__name__)
+
 CRIPTO = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 """
@@ -16,4 +28,67 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     A senha será salva no banco de dados como um hash.
 """
 def generate_password_hash(password: str) -> str:
-    return CRIPTO.hash(password)
\ No newline at end of file
+    return CRIPTO.hash(password)
+
+
+class ServicoSenhas:
+    """
+    bcrypt (~200 ms de CPU por chamada) num pool de threads próprio, fora do event loop.
+    O bcrypt libera o GIL, então `workers` threads verificam em paralelo. Além das que
+    estão rodando, no máximo `fila_max` chamadas esperam na fila; acima disso a
+    requisição recebe 503 em vez de acumular logins que já vão estourar o timeout do cliente.
+    `pendentes` só diminui quando a chamada sai do pool (callback do future): uma requisição
+    cancelada enquanto espera não libera a vaga de um bcrypt que ainda vai rodar.
+    """
+
+    def __init__(self, workers: int, fila_max: int):
+        self._workers = max(workers, 1)
+        self._fila_max = max(fila_max, 0)
+        self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='bcrypt')
+        self.pendentes = 0
+        self.rejeitadas = 0
+        self._lock = threading.Lock()
+
+    def encerrar(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _concluida(self, _: Future) -> None:
+        with self._lock:
+            self.pendentes -= 1
+
+    async def _executar(self, func: Callable, *args) -> Any:
+        with self._lock:
+            cheia = self.pendentes >= self._workers + self._fila_max
+            if cheia:
+                self.rejeitadas += 1
+            else:
+                self.pendentes += 1
+        if cheia:
+            logger.warning(f"Fila de verificação de senhas cheia ({self.pendentes} pendentes); requisição recusada")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Servidor ocupado. Tente novamente em instantes.",
+                headers={"Retry-After": "1"}
+            )
+        try:
+            futuro = self._pool.submit(func, *args)
+        except BaseException:
+            with self._lock:
+                self.pendentes -= 1
+            raise
+        futuro.add_done_callback(self._concluida)
+        return await asyncio.wrap_future(futuro)
+
+    async def verificar(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._executar(verify_password, plain_password, hashed_password)
+
+    async def gerar_hash(self, password: str) -> str:
+        return await self._executar(generate_password_hash, password)
+
+
+servico_senhas = ServicoSenhas(settings.PASSWORD_WORKERS, settings.PASSWORD_QUEUE_MAX)
+registrar_medidor('senhas_pendentes', 'Verificações/hashes bcrypt em execução ou na fila.', lambda: servico_senhas.pendentes)
+registrar_medidor(
+    'senhas_rejeitadas_total', 'Requisições recusadas com 503 pela fila de senhas cheia.',
+    lambda: servico_senhas.rejeitadas, tipo='counter'
+)
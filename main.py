@@ -1,3 +1,5 @@
+import asyncio
+
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -8,6 +10,13 @@ from api.v1.endpoints.maps import maps_router
 from api.v1.endpoints.users import user_router
 from api.v1.endpoints.dashboard import router as dashboard_router
 from api.v1.endpoints.management import management_router
+from core.configs import settings
+from core.database import Session
+from core.metricas import monitorar_event_loop
+from core.security import servico_senhas
+from models import Apiary, Meliponary
+from utils.computacao import servico_computacao, servico_variantes
+from utils.proximidade import aquecer_indices
 
 load_dotenv()  # Load environment variables from .env file
 app = FastAPI()
@@ -31,6 +40,40 @@ app.include_router(maps_router, prefix="/api/v1/maps", tags=["Gestão de Mapas"]
 app.include_router(dashboard_router, prefix="/api/v1", tags=["Dashboard"])
 app.include_router(management_router, prefix='/api/v1/management', tags=['Gestão da Aplicação'])
 
+
+@app.on_event("startup")
+async def aquecer_indice_colmeias():
+    # Sem PostGIS, as consultas de proximidade usam o índice em memória aquecido a partir do banco
+    if not settings.POSTGIS_ENABLED:
+        async with Session() as session:
+            await aquecer_indices(session, [Apiary, Meliponary])
+
+
+@app.on_event("startup")
+async def iniciar_pool_computacao():
+    # Cálculos geométricos CPU-bound rodam em processos separados, fora do event loop
+    servico_computacao.iniciar()
+    servico_variantes.iniciar()
+
+
+@app.on_event("startup")
+async def iniciar_monitor_event_loop():
+    # Mede quanto tempo o loop fica travado por código síncrono (exportado em /management/metrics)
+    if settings.EVENT_LOOP_MONITOR_INTERVAL_S > 0:
+        app.state.monitor_event_loop = asyncio.create_task(monitorar_event_loop(settings.EVENT_LOOP_MONITOR_INTERVAL_S))
+
+
+@app.on_event("shutdown")
+async def encerrar_pool_computacao():
+    servico_computacao.encerrar()
+    servico_variantes.encerrar()
+
+
+@app.on_event("shutdown")
+async def encerrar_pool_senhas():
+    servico_senhas.encerrar()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, log_level='info', reload=True)
@@ -27,6 +27,7 @@ class Apiary(settings.DBBaseModel):
     distanciaSeguraLavouras = Column(Boolean, nullable=False)
     acessoVeiculos = Column(Boolean, nullable=False)
     capacidadeDeSuporte = Column(String, nullable=True)
+    bioma = Column(String, nullable=True)
 
     userId = Column(Integer, ForeignKey('users.id'), nullable=False)
     createdAt = Column(DateTime, default=datetime.utcnow, nullable=False)
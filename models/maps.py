@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, Float
 
 from core.configs import settings
 
@@ -14,3 +14,17 @@ class Maps(settings.DBBaseModel):
     active = Column(Boolean, default=True)
     createdAt = Column(DateTime, default=datetime.utcnow, nullable=False)
     updatedAt = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=True)
+    # Metadados de catálogo (preenchidos no upload)
+    object_name = Column(String, nullable=True, index=True)
+    size_bytes = Column(BigInteger, nullable=True)
+    bbox_min_lon = Column(Float, nullable=True)
+    bbox_min_lat = Column(Float, nullable=True)
+    bbox_max_lon = Column(Float, nullable=True)
+    bbox_max_lat = Column(Float, nullable=True)
+    feature_count = Column(Integer, nullable=True)
+    crs = Column(String, nullable=True)
+    checksum = Column(String, nullable=True)
+    # Ingestão em segundo plano (utils.ingestao): pendente, processando, concluido ou erro
+    ingest_status = Column(String, nullable=True)
+    ingest_progress = Column(Integer, nullable=True)
+    ingest_message = Column(String, nullable=True)
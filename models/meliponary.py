@@ -23,6 +23,7 @@ class Meliponary(settings.DBBaseModel):
     distanciaMinimaConstrucoes = Column(Boolean, nullable=False)
     distanciaSeguraLavouras = Column(Boolean, nullable=False)
     capacidadeDeSuporte = Column(String, nullable=True)
+    bioma = Column(String, nullable=True)
 
     userId = Column(Integer, ForeignKey('users.id'), nullable=False)
     createdAt = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, ForeignKey
+
+from core.configs import settings
+
+# Bioma não identificado (registros antigos sem bioma); a chave primária não aceita nulo
+BIOMA_DESCONHECIDO = ''
+
+
+class ResumoDashboard(settings.DBBaseModel):
+    """Totais por usuário, tipo (apiario/meliponario) e bioma, mantidos pelos endpoints de cadastro."""
+    __tablename__ = 'dashboard_summary'
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    tipo = Column(String, primary_key=True)
+    bioma = Column(String, primary_key=True, default=BIOMA_DESCONHECIDO)
+    registros = Column(Integer, nullable=False, default=0)
+    colmeias = Column(Integer, nullable=False, default=0)
+    capacidade = Column(Integer, nullable=False, default=0)
@@ -31,20 +31,23 @@ class User(settings.DBBaseModel):
         'Profile',
         secondary=user_profiles,
         back_populates='users',
-        lazy='joined'
+        lazy='selectin'
     )
 
+    # Coleções pesadas: nunca carregadas junto com o usuário (autenticação roda em toda requisição);
+    # quem precisar delas usa selectinload(User.apiaries) / selectinload(User.meliponaries) na consulta
+
     apiaries = relationship(
         "Apiary",
         back_populates="owner",
         cascade="all,delete-orphan",
         uselist=True,
-        lazy="joined"
+        lazy="select"
     )
     meliponaries = relationship(
         "Meliponary",
         back_populates="owner",
         cascade="all,delete-orphan",
         uselist=True,
-        lazy="joined"
+        lazy="select"
     )
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel as SCBaseModel
 from datetime import datetime
 
@@ -43,9 +43,22 @@ class ApiarySchema(SCBaseModel):
     distanciaSeguraLavouras: bool
     acessoVeiculos: bool
     capacidadeDeSuporte: Optional[str]
+    bioma: Optional[str] = None
     userId: int
     createdAt: datetime
     updatedAt: Optional[datetime]
 
     class Config:
         from_attributes = True
+
+
+
+class ApiaryCapacityPointSchema(SCBaseModel):
+    latitude: float
+    longitude: float
+    ref: Optional[str] = None
+    qtdColmeiasOutrosApiarios: Optional[int] = None
+
+
+class ApiaryCapacityBatchSchema(SCBaseModel):
+    points: List[ApiaryCapacityPointSchema]
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel as SCBaseModel, Field
 from datetime import datetime
 
@@ -41,9 +41,21 @@ class MeliponarySchema(SCBaseModel):
     distanciaMinimaConstrucoes: bool
     distanciaSeguraLavouras: bool
     capacidadeDeSuporte: Optional[str]
+    bioma: Optional[str] = None
     userId: int
     createdAt: datetime
     updatedAt: Optional[datetime]
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class MeliponaryCapacityPointSchema(SCBaseModel):
+    latitude: float
+    longitude: float
+    especieAbelha: str = Field(..., min_length=1, description="O campo Espécie de abelha é obrigatório")
+    ref: Optional[str] = None
+
+
+class MeliponaryCapacityBatchSchema(SCBaseModel):
+    points: List[MeliponaryCapacityPointSchema]
@@ -0,0 +1,31 @@
+import base64
+
+import pytest
+from fastapi import HTTPException
+
+from utils.dashboard import codificar_cursor, decodificar_cursor
+
+
+def test_cursor_ida_e_volta():
+    posicoes = {'apiarios': 120, 'meliponarios': 0}
+    cursor = codificar_cursor(posicoes)
+    assert '+' not in cursor and '/' not in cursor
+    assert decodificar_cursor(cursor) == posicoes
+
+
+@pytest.mark.parametrize('cursor', [None, ''])
+def test_cursor_vazio_comeca_do_inicio(cursor):
+    assert decodificar_cursor(cursor) == {}
+
+
+@pytest.mark.parametrize('cursor', [
+    'nao-e-base64!',
+    base64.urlsafe_b64encode(b'{"apiarios": ').decode(),        # JSON truncado
+    base64.urlsafe_b64encode(b'[1, 2]').decode(),               # não é objeto
+    base64.urlsafe_b64encode(b'{"apiarios": "x"}').decode(),    # posição não numérica
+    base64.urlsafe_b64encode(b'\xff\xfe').decode(),             # não é UTF-8
+])
+def test_cursor_invalido_responde_400(cursor):
+    with pytest.raises(HTTPException) as erro:
+        decodificar_cursor(cursor)
+    assert erro.value.status_code == 400
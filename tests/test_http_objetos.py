@@ -0,0 +1,33 @@
+import gzip
+
+import pytest
+
+from utils.http_objetos import comprimir, intervalo
+
+
+@pytest.mark.parametrize('cabecalho, esperado', [
+    ('bytes=0-99', (0, 99)),
+    ('bytes=100-', (100, 999)),
+    ('bytes=-100', (900, 999)),
+    ('bytes=-5000', (0, 999)),          # sufixo maior que o objeto: o objeto inteiro
+    ('bytes=900-5000', (900, 999)),     # fim além do objeto é truncado
+    (' bytes=5-5 ', (5, 5)),
+])
+def test_intervalo_valido(cabecalho, esperado):
+    assert intervalo(cabecalho, 1000) == esperado
+
+
+@pytest.mark.parametrize('cabecalho', [None, '', 'bytes=-', 'bytes=0-1,5-9', 'items=0-9', 'bytes=a-b'])
+def test_intervalo_nao_aplicavel(cabecalho):
+    assert intervalo(cabecalho, 1000) is None
+
+
+@pytest.mark.parametrize('cabecalho', ['bytes=1000-', 'bytes=1500-2000', 'bytes=50-10', 'bytes=-0'])
+def test_intervalo_insatisfazivel(cabecalho):
+    with pytest.raises(ValueError):
+        intervalo(cabecalho, 1000)
+
+
+def test_comprimir_em_fluxo():
+    blocos = [b'{"type": "FeatureCollection", ', b'"features": []}'] * 50
+    assert gzip.decompress(b''.join(comprimir(iter(blocos)))) == b''.join(blocos)
@@ -0,0 +1,36 @@
+import pytest
+
+from core.metricas import Histograma
+
+
+@pytest.fixture
+def histograma():
+    h = Histograma('latencia_segundos', 'Latência de teste.', buckets=(1.0, 0.1, 0.5))
+    for valor in (0.05, 0.1, 0.3, 0.7, 2.0):
+        h.observar(valor)
+    return h
+
+
+def test_buckets_cumulativos(histograma):
+    assert histograma.total == 5
+    assert histograma.soma == pytest.approx(3.15)
+    assert histograma.maximo == 2.0
+    # buckets fora de ordem são ordenados; o limite é inclusivo (0.1 cai em le="0.1")
+    assert histograma.linhas()[2:5] == [
+        'latencia_segundos_bucket{le="0.1"} 2',
+        'latencia_segundos_bucket{le="0.5"} 3',
+        'latencia_segundos_bucket{le="1.0"} 4',
+    ]
+
+
+def test_formato_prometheus(histograma):
+    linhas = histograma.linhas()
+    assert linhas[:2] == ['# HELP latencia_segundos Latência de teste.', '# TYPE latencia_segundos histogram']
+    assert linhas[5] == 'latencia_segundos_bucket{le="+Inf"} 5'
+    assert linhas[6].startswith('latencia_segundos_sum ') and float(linhas[6].split()[1]) == pytest.approx(3.15)
+    assert linhas[7:] == ['latencia_segundos_count 5']
+
+
+def test_histograma_vazio():
+    h = Histograma('vazio', 'Sem observações.', buckets=(1.0,))
+    assert h.linhas()[2:] == ['vazio_bucket{le="1.0"} 0', 'vazio_bucket{le="+Inf"} 0', 'vazio_sum 0.0', 'vazio_count 0']
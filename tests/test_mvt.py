@@ -0,0 +1,127 @@
+import struct
+
+import shapely
+
+from utils.mvt import codificar_camada
+
+
+def _varint(dados: bytes, pos: int):
+    valor, deslocamento = 0, 0
+    while True:
+        byte = dados[pos]
+        valor |= (byte & 0x7F) << deslocamento
+        pos += 1
+        if not byte & 0x80:
+            return valor, pos
+        deslocamento += 7
+
+
+def _campos(dados: bytes):
+    """Pares (número do campo, valor) de uma mensagem protobuf (varint, 64 bits e length-delimited)."""
+    pos, campos = 0, []
+    while pos < len(dados):
+        chave, pos = _varint(dados, pos)
+        numero, tipo = chave >> 3, chave & 0x7
+        if tipo == 0:
+            valor, pos = _varint(dados, pos)
+        elif tipo == 1:
+            valor, pos = dados[pos:pos + 8], pos + 8
+        elif tipo == 2:
+            tamanho, pos = _varint(dados, pos)
+            valor, pos = dados[pos:pos + tamanho], pos + tamanho
+        else:
+            raise AssertionError(f'tipo de campo inesperado: {tipo}')
+        campos.append((numero, valor))
+    return campos
+
+
+def _empacotados(dados: bytes):
+    pos, valores = 0, []
+    while pos < len(dados):
+        valor, pos = _varint(dados, pos)
+        valores.append(valor)
+    return valores
+
+
+def _dezigzag(valor: int) -> int:
+    return (valor >> 1) ^ -(valor & 1)
+
+
+def _valor(dados: bytes):
+    (numero, valor), = _campos(dados)
+    return {1: lambda v: v.decode(), 3: lambda v: struct.unpack('<d', v)[0],
+            6: _dezigzag, 7: bool}[numero](valor)
+
+
+def _aneis_decodificados(comandos):
+    """Anéis (coordenadas absolutas) a partir dos comandos MoveTo/LineTo/ClosePath."""
+    x = y = pos = 0
+    aneis, atual = [], []
+    while pos < len(comandos):
+        identificador, quantidade = comandos[pos] & 0x7, comandos[pos] >> 3
+        pos += 1
+        if identificador == 7:
+            aneis.append(atual)
+            atual = []
+            continue
+        for _ in range(quantidade):
+            x += _dezigzag(comandos[pos])
+            y += _dezigzag(comandos[pos + 1])
+            pos += 2
+            atual.append((x, y))
+    return aneis, atual
+
+
+def _decodificar(tile: bytes) -> dict:
+    (numero, camada), = _campos(tile)
+    assert numero == 3
+    campos = _campos(camada)
+    chaves = [v.decode() for n, v in campos if n == 3]
+    valores = [_valor(v) for n, v in campos if n == 4]
+    feicoes = []
+    for bruto in (v for n, v in campos if n == 2):
+        feicao = dict(_campos(bruto))
+        tags = _empacotados(feicao.get(2, b''))
+        feicoes.append({
+            'tipo': feicao[3],
+            'comandos': _empacotados(feicao[4]),
+            'propriedades': {chaves[k]: valores[v] for k, v in zip(tags[::2], tags[1::2])},
+        })
+    return {
+        'versao': dict(campos)[15], 'nome': dict(campos)[1].decode(), 'extent': dict(campos)[5], 'feicoes': feicoes
+    }
+
+
+def _area_tile(anel) -> float:
+    """Área com sinal na fórmula da especificação (y para baixo): positiva para anéis exteriores."""
+    return sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(anel, anel[1:] + anel[:1])) / 2
+
+
+def test_poligono_com_furo_e_propriedades():
+    poligono = shapely.Polygon([(10, 10), (110, 10), (110, 110), (10, 110)], [[(40, 40), (40, 60), (60, 60), (60, 40)]])
+    tile = _decodificar(codificar_camada(
+        'vegetacao', [poligono], [{'CLASSE': 'ARBOREO', 'n': -3, 'area': 1.5, 'ativa': True, 'vazia': None}]
+    ))
+    assert (tile['versao'], tile['nome'], tile['extent']) == (2, 'vegetacao', 4096)
+    (feicao,) = tile['feicoes']
+    assert feicao['tipo'] == 3
+    assert feicao['propriedades'] == {'CLASSE': 'ARBOREO', 'n': -3, 'area': 1.5, 'ativa': True}
+    (exterior, interior), resto = _aneis_decodificados(feicao['comandos'])
+    assert resto == []
+    assert set(exterior) == {(10, 10), (110, 10), (110, 110), (10, 110)}
+    assert set(interior) == {(40, 40), (40, 60), (60, 60), (60, 40)}
+    assert _area_tile(exterior) > 0 > _area_tile(interior)
+
+
+def test_ponto_e_linha():
+    tile = _decodificar(codificar_camada(
+        'biomas', [shapely.Point(5, 7), shapely.LineString([(0, 0), (10, 0), (10, 10)])], [{}, {}]
+    ))
+    ponto, linha = tile['feicoes']
+    assert ponto['tipo'] == 1 and _aneis_decodificados(ponto['comandos'])[1] == [(5, 7)]
+    assert linha['tipo'] == 2 and _aneis_decodificados(linha['comandos'])[1] == [(0, 0), (10, 0), (10, 10)]
+
+
+def test_geometrias_que_degeneram_no_arredondamento_sao_descartadas():
+    minusculo = shapely.box(10.1, 10.1, 10.3, 10.3)
+    assert codificar_camada('vegetacao', [minusculo, None, shapely.Polygon()], [{}, {}, {}]) == b''
@@ -0,0 +1,50 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from utils.raster_vegetacao import ARQUIVO_METADADOS, RasterVegetacao, _arquivo_sat, _gravar_sat
+
+TAMANHO_CELULA = 30.0
+X0, Y0 = 1000.0, 2000.0
+
+
+@pytest.fixture
+def grade(tmp_path):
+    """Cobertura aleatória de uma classe gravada como tabela acumulada, e o raster que a lê."""
+    cobertura = (np.random.default_rng(7).random((120, 150)) < 0.4).astype(np.uint8)
+    _gravar_sat(cobertura, _arquivo_sat(str(tmp_path), 'ARBOREO'))
+    with open(os.path.join(tmp_path, ARQUIVO_METADADOS), 'w') as f:
+        json.dump({
+            'x0': X0, 'y0': Y0, 'tamanho_celula_m': TAMANHO_CELULA,
+            'linhas': cobertura.shape[0], 'colunas': cobertura.shape[1], 'classes': ['ARBOREO']
+        }, f)
+    return cobertura, RasterVegetacao(str(tmp_path))
+
+
+def _celulas_forca_bruta(cobertura: np.ndarray, x: float, y: float, raio_m: float) -> int:
+    """Células marcadas cujo centro está dentro do círculo, testando uma a uma."""
+    linhas, colunas = np.indices(cobertura.shape)
+    cx = X0 + (colunas + 0.5) * TAMANHO_CELULA
+    cy = Y0 + (linhas + 0.5) * TAMANHO_CELULA
+    return int(cobertura[(cx - x) ** 2 + (cy - y) ** 2 <= raio_m ** 2].sum())
+
+
+@pytest.mark.parametrize('x, y, raio_m', [
+    (3250.0, 3800.0, 1500.0),   # círculo inteiro dentro da grade
+    (1000.0, 2000.0, 1500.0),   # centro no canto: só um quarto do círculo na grade
+    (5450.0, 5540.0, 1200.0),   # canto oposto
+    (3015.0, 3615.0, 45.0),     # raio de poucas células, centro na borda de uma célula
+    (2000.0, 1000.0, 500.0),    # fora da grade
+])
+def test_soma_no_circulo_igual_a_forca_bruta(grade, x, y, raio_m):
+    cobertura, raster = grade
+    assert raster._celulas_no_circulo(raster.sats['ARBOREO'], x, y, raio_m) == _celulas_forca_bruta(cobertura, x, y, raio_m)
+
+
+def test_areas_por_classe_em_hectares(grade):
+    cobertura, raster = grade
+    areas = raster.areas_por_classe_metrico(3250.0, 3800.0, 1.0, ['ARBOREO', 'HERBACEO'])
+    esperado = _celulas_forca_bruta(cobertura, 3250.0, 3800.0, 1000.0) * TAMANHO_CELULA ** 2 / 10000.0
+    assert areas == {'ARBOREO': pytest.approx(esperado)}
@@ -0,0 +1,20 @@
+import pytest
+
+from utils.resumo_dashboard import _inteiro
+
+
+@pytest.mark.parametrize('valor, esperado', [
+    ('12', 12),
+    ('007', 7),
+    (7, 7),
+    (None, 0),
+    ('', 0),
+    ('1.5', 0),
+    ('-3', 0),
+    (' 4', 0),
+    ('abc', 0),
+    ('١٢', 0),      # dígitos arábico-índicos: isdigit() aceita, o '^[0-9]+$' do SQL não
+    ('²', 0),
+])
+def test_inteiro_segue_o_criterio_do_sql(valor, esperado):
+    assert _inteiro(valor) == esperado
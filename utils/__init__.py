@@ -1,16 +1,35 @@
-import json
+import logging
 import os
 from typing import Optional, List
 from fastapi import status, HTTPException
 from minio import Minio
 from minio.error import S3Error
-from shapely.geometry import Point, shape
+from shapely.geometry import Point
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 import geopandas as gpd
+import numpy as np
 import pandas as pd
+from core.configs import settings
+from core.messages import MSG_SUPPORT_CAPACITY_ERROR
 from models import User
 from models.apiary import Apiary
+from utils.bioma import CAMINHO_BIOMAS_PADRAO, obter_bioma_resolver
+from utils.cache_areas import CacheAreas
+from utils.cache_minio import CacheCamadasMinio
+from utils.distancias import mascara_no_raio, somar_colmeias_mascaradas
+from utils.catalogo import CatalogoCamadas
+from utils.consulta_camadas import CacheVariantes
+from utils.flatgeobuf import areas_por_classe as areas_por_classe_fgb, areas_por_classe_lote as areas_por_classe_lote_fgb, \
+    nome_fgb, nome_fgb_exibicao
+from utils.geometria import buffer_metrico, construir_buffers_existentes, somar_colmeias_intersectando
+from utils.indice_colmeias import indice_apiarios
+from utils.proximidade import existe_no_raio, somar_colmeias_no_raio
+from utils.raster_vegetacao import obter_raster
+from utils.superficie_capacidade import Localizacao, SuperficieCapacidade
+from utils.tiles_mvt import CacheTilesMVT
+from utils.tiles_vegetacao import VegetacaoTiles
+from utils.vegetacao_store import VegetacaoStore
 
 # MinIO configuration
 MINIO_URL = os.getenv('MINIO_URL')
@@ -30,6 +49,32 @@ minio_client = Minio(
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 GEOJSON_CACHE_DIR = os.path.join(PROJECT_ROOT, 'geojson_files_cache')
 os.makedirs(GEOJSON_CACHE_DIR, exist_ok=True)
+# Intervalo mínimo entre revalidações (ETag) de uma camada e limite de disco do cache de camadas
+GEOJSON_CACHE_REVALIDAR_S = float(os.getenv('GEOJSON_CACHE_REVALIDAR_S', '60'))
+GEOJSON_CACHE_MAX_MB = int(os.getenv('GEOJSON_CACHE_MAX_MB', '2048'))
+# Marcador regravado a cada mudança no conjunto de camadas (upload/remoção), visto por todos os workers
+ARQUIVO_GERACAO_CAMADAS = os.path.join(GEOJSON_CACHE_DIR, '.geracao_camadas')
+cache_camadas = CacheCamadasMinio(
+    minio_client, MINIO_BUCKET_NAME, os.path.join(GEOJSON_CACHE_DIR, 'camadas'),
+    intervalo_revalidacao_s=GEOJSON_CACHE_REVALIDAR_S,
+    max_bytes=GEOJSON_CACHE_MAX_MB * 1024 * 1024,
+    arquivo_geracao=ARQUIVO_GERACAO_CAMADAS
+)
+# Tabelas de soma acumulada geradas por `python -m utils.raster_vegetacao`
+RASTER_VEGETACAO_DIR = os.path.join(GEOJSON_CACHE_DIR, 'raster')
+# Tiles métricos das camadas gerados por `python -m utils.tiles_vegetacao`
+TILES_VEGETACAO_DIR = os.path.join(GEOJSON_CACHE_DIR, 'tiles')
+VEGETACAO_TILES_LRU = int(os.getenv('VEGETACAO_TILES_LRU', '256'))
+CACHE_AREAS_MAX_ITENS = int(os.getenv('CACHE_AREAS_MAX_ITENS', '4096'))
+CACHE_AREAS_TTL_S = float(os.getenv('CACHE_AREAS_TTL_S', '600'))
+CATALOGO_TTL_S = float(os.getenv('CATALOGO_TTL_S', '300'))
+# Vector tiles (MVT) gerados sob demanda para /maps/tiles
+TILES_MVT_DIR = os.path.join(GEOJSON_CACHE_DIR, 'mvt')
+CAMADA_BIOMAS = 'biomas'
+# Variantes simplificadas por zoom para /maps/content
+VARIANTES_DIR = os.path.join(GEOJSON_CACHE_DIR, 'simplificadas')
+# Superfícies de capacidade remanescente geradas por `python -m utils.superficie_capacidade`
+SUPERFICIE_CAPACIDADE_DIR = os.path.join(GEOJSON_CACHE_DIR, 'superficie')
 
 VEGETACAO_APICULTOR = ['ARBOREO', 'ARBUSTIVO', 'HERBACEO']
 VEGETACAO_MELIPONARIO = ['ARBOREO', 'ARBUSTIVO']  # Ajuste conforme regra do negócio
@@ -44,29 +89,101 @@ def calcular_raio_voo_meliponario(especie=None):
         return 1.2
 
 
+# Maior raio de voo entre as espécies de calcular_raio_voo_meliponario (km)
+RAIO_MAXIMO_MELIPONARIO_KM = 2.5
+
+
 def calcular_raio_voo_apiario():
     return 1.5
 
 
-def calcular_capacidade_suporte_apicultura(area_ha: float, bioma: str, tipo_cultura: str = None) -> int:
-    print(f"[LOG] Calculando capacidade de suporte para área: {area_ha} ha, bioma: {bioma}, tipo de cultura: {tipo_cultura}")
+def obter_raster_vegetacao():
+    """Raster de utils.raster_vegetacao; HTTP 503 enquanto `python -m utils.raster_vegetacao` não tiver sido executado."""
+    try:
+        return obter_raster(RASTER_VEGETACAO_DIR)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Raster de vegetação não gerado. Execute python -m utils.raster_vegetacao."
+        )
+
+
+# Área de vegetação (ha) por colmeia de Apis no fator 1 e colmeias de meliponíneos por hectare (256 árvores)
+AREA_POR_COLMEIA_HA = 7.07
+COLMEIAS_POR_HA_MELIPONICULTURA = 2.5
+
+
+def fator_capacidade_apicultura(bioma: str, tipo_cultura: str = None) -> int:
+    """Multiplicador da capacidade de apicultura por bioma/cultura (regras de calcular_capacidade_suporte_apicultura)."""
     if bioma in ['Amazônia', 'Mata Atlântica']:
-        return int(area_ha / 7.07)
+        return 1
     elif bioma in ['Cerrado', 'Pantanal']:
-        return int((area_ha / 7.07) * 2)
+        return 2
     elif bioma in ['Agreste', 'Semiárido']:
-        return int((area_ha / 7.07) * 4)
+        return 4
     elif tipo_cultura in ['Eucalipto', 'Girassol', 'Canola', 'Floríferas']:
-        return int((area_ha / 7.07) * 4)
+        return 4
     elif tipo_cultura == 'Acácia Mangium':
-        return int((area_ha / 7.07) * 8)
+        return 8
     else:
-        return int(area_ha / 7.07)
+        return 1
+
+
+def calcular_capacidade_suporte_apicultura(area_ha: float, bioma: str, tipo_cultura: str = None) -> int:
+    print(f"[LOG] Calculando capacidade de suporte para área: {area_ha} ha, bioma: {bioma}, tipo de cultura: {tipo_cultura}")
+    return int((area_ha / AREA_POR_COLMEIA_HA) * fator_capacidade_apicultura(bioma, tipo_cultura))
 
 
 def calcular_capacidade_suporte_meliponicultura(area_ha: float) -> int:
     # 256 árvores = 2,5 colmeias/hectare
-    return int(area_ha * 2.5)
+    return int(area_ha * COLMEIAS_POR_HA_MELIPONICULTURA)
+
+
+def _capacidade_apicultura_lote(areas_ha: np.ndarray, biomas: np.ndarray) -> np.ndarray:
+    """calcular_capacidade_suporte_apicultura vetorizada (sem tipo de cultura), para a superfície de capacidade."""
+    fatores = np.array([fator_capacidade_apicultura(bioma) for bioma in biomas], dtype=float)
+    return np.floor((np.asarray(areas_ha, dtype=float) / AREA_POR_COLMEIA_HA) * fatores)
+
+
+def _capacidade_meliponicultura_lote(areas_ha: np.ndarray, biomas: np.ndarray) -> np.ndarray:
+    """calcular_capacidade_suporte_meliponicultura vetorizada, para a superfície de capacidade."""
+    return np.floor(np.asarray(areas_ha, dtype=float) * COLMEIAS_POR_HA_MELIPONICULTURA)
+
+
+# Tipo de produção -> (classes de vegetação, raio de voo da célula em km, capacidade vetorizada)
+TIPOS_SUPERFICIE = {
+    'apicultura': (VEGETACAO_APICULTOR, calcular_raio_voo_apiario(), _capacidade_apicultura_lote),
+    'meliponicultura': (VEGETACAO_MELIPONARIO, calcular_raio_voo_meliponario(), _capacidade_meliponicultura_lote),
+}
+superficies_capacidade = {
+    tipo: SuperficieCapacidade(os.path.join(SUPERFICIE_CAPACIDADE_DIR, tipo)) for tipo in TIPOS_SUPERFICIE
+}
+
+
+def localizacao_colmeias(model, registro) -> Optional[Localizacao]:
+    """Coordenada, colmeias e raio de voo de um apiário/meliponário (None se os campos não forem numéricos)."""
+    if hasattr(model, 'especieAbelha'):
+        raio_km = calcular_raio_voo_meliponario(registro.especieAbelha)
+    else:
+        raio_km = calcular_raio_voo_apiario()
+    try:
+        return Localizacao(float(registro.longitude), float(registro.latitude), int(registro.quantidadeColmeias), raio_km)
+    except (TypeError, ValueError):
+        return None
+
+
+def atualizar_superficie_capacidade(model, anterior: Optional[Localizacao] = None,
+                                    atual: Optional[Localizacao] = None) -> None:
+    """Reflete na superfície do tipo do modelo a criação (atual), edição (ambos) ou exclusão (anterior) de um registro."""
+    tipo = 'meliponicultura' if hasattr(model, 'especieAbelha') else 'apicultura'
+    try:
+        superficies_capacidade[tipo].aplicar(
+            removidos=[anterior] if anterior is not None else [],
+            adicionados=[atual] if atual is not None else []
+        )
+    except Exception as e:
+        # A superfície é derivada: uma falha aqui não desfaz o cadastro; o job a reconstrói
+        logging.getLogger(__name__).error(f"Erro ao atualizar superfície de capacidade ({tipo}): {e}")
 
 
 def list_geojson_files_from_minio() -> List[str]:
@@ -80,26 +197,133 @@ def list_geojson_files_from_minio() -> List[str]:
 
 
 def get_geojson_file_cached(filename):
-    local_path = os.path.join(GEOJSON_CACHE_DIR, os.path.basename(filename))
-    if not os.path.exists(local_path):
-        response = None
-        try:
-            response = minio_client.get_object(MINIO_BUCKET_NAME, filename)
-            data = response.read()
-            with open(local_path, 'wb') as f:
-                f.write(data)
-        except S3Error as e:
-            raise HTTPException(status_code=500, detail=f"MinIO error ao obter {filename}: {str(e)}")
-        finally:
-            try:
-                if response is not None:
-                    response.close()
-                    if hasattr(response, 'release_conn'):
-                        response.release_conn()
-            except Exception:
-                # Evita propagar erro de limpeza de recurso
-                pass
-    return local_path
+    """Caminho local da versão atual da camada (cache em disco versionado por ETag, ver utils.cache_minio)."""
+    return cache_camadas.obter(filename)
+
+
+cache_tiles_mvt = CacheTilesMVT(TILES_MVT_DIR)
+cache_variantes = CacheVariantes(VARIANTES_DIR)
+
+
+def fonte_camada_indexada(camada: str) -> Optional[tuple]:
+    """
+    Arquivo indexado de origem e versão da camada (vector tiles e consultas por bbox): o GeoJSON de biomas ou, para as camadas do bucket,
+    o FlatGeobuf de exibição publicado na ingestão, com todas as feições e atributos (o GeoJSON original enquanto ele não existir).
+    Nunca o .fgb limpo dos cálculos, que só tem CLASSE e as classes consultadas. None se a camada não existir.
+    """
+    if camada == CAMADA_BIOMAS:
+        return CAMINHO_BIOMAS_PADRAO, str(os.stat(CAMINHO_BIOMAS_PADRAO).st_mtime_ns)
+    caminho = cache_camadas.obter_opcional(nome_fgb_exibicao(camada)) or cache_camadas.obter_opcional(camada)
+    if caminho is None:
+        return None
+    # O arquivo local é versionado pelo ETag (<etag><ext>), que serve de versão dos derivados
+    return caminho, os.path.basename(caminho)
+
+
+# Camadas de vegetação residentes no worker, já em CRS métrico e particionadas por CLASSE
+vegetacao_store = VegetacaoStore(
+    get_geojson_file_cached,
+    classes=set(VEGETACAO_APICULTOR) | set(VEGETACAO_MELIPONARIO)
+)
+# Camadas já cortadas em tiles são lidas sob demanda em vez de ficarem residentes
+vegetacao_tiles = VegetacaoTiles(TILES_VEGETACAO_DIR, max_tiles=VEGETACAO_TILES_LRU)
+
+
+def _fontes_camadas(geojson_files: List[str]) -> tuple:
+    """Separa as camadas por forma de leitura: (com tiles em disco, {nome: FlatGeobuf local}, residentes no store)."""
+    ladrilhadas = [nome for nome in geojson_files if vegetacao_tiles.disponivel(nome)]
+    binarias = {}
+    for nome in geojson_files:
+        if nome not in ladrilhadas:
+            caminho = cache_camadas.obter_opcional(nome_fgb(nome))
+            if caminho is not None:
+                binarias[nome] = caminho
+    residentes = [nome for nome in geojson_files if nome not in ladrilhadas and nome not in binarias]
+    return ladrilhadas, binarias, residentes
+
+
+def areas_vegetacao_no_buffer(geojson_files: List[str], classes: List[str], buffer_m) -> dict:
+    """
+    Área (ha) por classe de vegetação dentro do buffer (CRS métrico), somando as camadas.
+    Ordem de preferência por camada: tiles em disco (só os que tocam o buffer), FlatGeobuf no bucket
+    (janela do buffer via R-tree) e, por último, o store residente.
+    """
+    ladrilhadas, binarias, residentes = _fontes_camadas(geojson_files)
+    areas = vegetacao_tiles.areas_por_classe(ladrilhadas, classes, buffer_m)
+    parciais = [
+        areas_por_classe_fgb(binarias.values(), classes, buffer_m),
+        vegetacao_store.areas_por_classe(residentes, classes, buffer_m),
+    ]
+    for parcial in parciais:
+        for classe, area in parcial.items():
+            areas[classe] = areas.get(classe, 0.0) + area
+    return areas
+
+
+def areas_vegetacao_no_buffer_lote(geojson_files: List[str], classes: List[str], buffers_m) -> List[dict]:
+    """areas_vegetacao_no_buffer de vários buffers, com cada fonte consultada uma vez para o conjunto."""
+    ladrilhadas, binarias, residentes = _fontes_camadas(geojson_files)
+    areas = vegetacao_tiles.areas_por_classe_lote(ladrilhadas, classes, buffers_m)
+    parciais = [
+        areas_por_classe_lote_fgb(binarias.values(), classes, buffers_m),
+        vegetacao_store.areas_por_classe_lote(residentes, classes, buffers_m),
+    ]
+    for parcial in parciais:
+        for destino, areas_buffer in zip(areas, parcial):
+            for classe, area in areas_buffer.items():
+                destino[classe] = destino.get(classe, 0.0) + area
+    return areas
+
+
+# Resultados de áreas por ponto; a geração em disco é compartilhada entre workers
+cache_areas = CacheAreas(
+    ARQUIVO_GERACAO_CAMADAS,
+    max_itens=CACHE_AREAS_MAX_ITENS,
+    ttl_s=CACHE_AREAS_TTL_S
+)
+
+
+def areas_vegetacao_no_raio(longitude: float, latitude: float, raio_km: float, classes: List[str],
+                            geojson_files: List[str], buffer_m) -> dict:
+    """areas_vegetacao_no_buffer com o resultado em cache (coordenada arredondada, raio, classes e versão das camadas)."""
+    versao = cache_areas.versao(geojson_files)
+    areas = cache_areas.obter(longitude, latitude, raio_km, classes, versao)
+    if areas is None:
+        areas = areas_vegetacao_no_buffer(geojson_files, classes, buffer_m)
+        cache_areas.guardar(longitude, latitude, raio_km, classes, versao, areas)
+    return areas
+
+
+def areas_vegetacao_no_raio_lote(longitudes, latitudes, raios_km, classes: List[str], geojson_files: List[str],
+                                 buffers_m) -> List[dict]:
+    """areas_vegetacao_no_raio de vários pontos: os que não estão em cache são calculados juntos, num único lote."""
+    versao = cache_areas.versao(geojson_files)
+    areas = [cache_areas.obter(lon, lat, raio, classes, versao) for lon, lat, raio in zip(longitudes, latitudes, raios_km)]
+    faltantes = [i for i, a in enumerate(areas) if a is None]
+    if faltantes:
+        calculadas = areas_vegetacao_no_buffer_lote(geojson_files, classes, np.asarray(buffers_m, dtype=object)[faltantes])
+        for i, areas_ponto in zip(faltantes, calculadas):
+            areas[i] = areas_ponto
+            cache_areas.guardar(longitudes[i], latitudes[i], raios_km[i], classes, versao, areas_ponto)
+    return areas
+
+
+# Camadas ativas (tabela geomaps) com bbox, para não listar o bucket a cada cálculo
+catalogo_camadas = CatalogoCamadas(ARQUIVO_GERACAO_CAMADAS, ttl_s=CATALOGO_TTL_S)
+
+
+def invalidar_camadas(nome: Optional[str] = None) -> None:
+    """Chamada quando o conjunto de camadas muda (upload/remoção de mapa): descarta resultados e dados em memória."""
+    cache_areas.marcar_alteracao()
+    catalogo_camadas.invalidar()
+    if nome is not None:
+        cache_camadas.esquecer(nome)
+        cache_camadas.esquecer(nome_fgb(nome))
+        cache_camadas.esquecer(nome_fgb_exibicao(nome))
+        vegetacao_store.descarregar(nome)
+        cache_tiles_mvt.invalidar(nome)
+        cache_variantes.invalidar(nome)
+    vegetacao_tiles.invalidar(nome)
 
 
 async def verify_user_exists(user_id: int, session: AsyncSession):
@@ -109,45 +333,6 @@ async def verify_user_exists(user_id: int, session: AsyncSession):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Usuário não existe no sistema')
 
 
-def calcular_area_buffer(longitude: float, latitude: float, raio_km: float = 1.5, geojson_files: list = None):
-    """
-    Se geojson_files não for fornecido, retorna o polígono do buffer reprojetado de volta para EPSG:4326.
-    Caso contrário, retorna a soma das áreas (ha) das classes de vegetação dentro do buffer.
-    """
-    crs_metric = "EPSG:31983"
-    crs_geo = "EPSG:4326"
-    centro = Point(float(longitude), float(latitude))
-    # Constrói buffer em CRS métrico
-    gdf_centro = gpd.GeoDataFrame(geometry=[centro], crs=crs_geo).to_crs(crs_metric)
-    buffer_m = gdf_centro.geometry.iloc[0].buffer(raio_km * 1000)
-    if not geojson_files:
-        # Reprojeta o buffer de volta para GEO para compatibilidade com usos existentes
-        buffer_geo = gpd.GeoSeries([buffer_m], crs=crs_metric).to_crs(crs_geo).iloc[0]
-        return buffer_geo
-    # Quando arquivos são fornecidos, calcula a área de interseção (ha)
-    soma_areas = 0.0
-    for filename in geojson_files:
-        with open(filename, 'r') as f:
-            geojson_data = json.load(f)
-        for layer in geojson_data['features']:
-            geom = shape(layer['geometry'])
-            if not geom.is_valid:
-                geom = geom.buffer(0)
-            # Reprojeta geometria para métrico antes de intersectar com buffer_m
-            try:
-                gdf_geom = gpd.GeoSeries([geom], crs=crs_geo).to_crs(crs_metric).iloc[0]
-            except Exception:
-                # Se houver falha de CRS no layer específico, ignora este feature
-                continue
-            if gdf_geom.is_valid and gdf_geom.intersects(buffer_m):
-                intersecao = gdf_geom.intersection(buffer_m)
-                if not intersecao.is_empty:
-                    nome_camada = layer.get('properties', {}).get('CLASSE')
-                    if nome_camada in VEGETACAO_APICULTOR:
-                        soma_areas += intersecao.area / 10000.0
-    return round(float(soma_areas), 2)
-
-
 def area_vegetacao_dentro_buffer(longitude: float, latitude: float, raio_km: float = 1.5, geojson_files: list = None):
     crs_metric = "EPSG:31983"
     crs_geo = "EPSG:4326"
@@ -157,17 +342,8 @@ def area_vegetacao_dentro_buffer(longitude: float, latitude: float, raio_km: flo
         centro = Point(float(longitude), float(latitude))
         gdf_centro = gpd.GeoDataFrame(geometry=[centro], crs=crs_geo).to_crs(crs_metric)
         buffer_m = gdf_centro.geometry.iloc[0].buffer(raio_km * 1000)
-        gdf_todas = concat_geojsons([get_geojson_file_cached(f) for f in geojson_files], crs_geo, crs_metric)
-        gdf_vegetacao = gdf_todas[gdf_todas['CLASSE'].isin(VEGETACAO_APICULTOR)].copy()
-        gdf_vegetacao = gdf_vegetacao[gdf_vegetacao.intersects(buffer_m)].copy()
-        if gdf_vegetacao.empty:
-            return 0.0
-        gdf_vegetacao['intersecao'] = gdf_vegetacao.geometry.intersection(buffer_m)
-        gdf_vegetacao = gdf_vegetacao[~gdf_vegetacao['intersecao'].is_empty]
-        if gdf_vegetacao.empty:
-            return 0.0
-        gdf_vegetacao['area_intersecao_ha'] = gdf_vegetacao['intersecao'].area / 10000.0
-        return round(float(gdf_vegetacao['area_intersecao_ha'].sum()), 2)
+        areas = areas_vegetacao_no_buffer(geojson_files, VEGETACAO_APICULTOR, buffer_m)
+        return round(float(sum(areas.values())), 2)
     except Exception:
         return 0.0
 
@@ -181,17 +357,8 @@ def area_vegetacao_dentro_buffer_apiario(longitude: float, latitude: float, raio
         centro = Point(float(longitude), float(latitude))
         gdf_centro = gpd.GeoDataFrame(geometry=[centro], crs=crs_geo).to_crs(crs_metric)
         buffer_m = gdf_centro.geometry.iloc[0].buffer(raio_km * 1000)
-        gdf_todas = concat_geojsons([get_geojson_file_cached(f) for f in geojson_files], crs_geo, crs_metric)
-        gdf_vegetacao = gdf_todas[gdf_todas['CLASSE'].isin(VEGETACAO_APICULTOR)].copy()
-        gdf_vegetacao = gdf_vegetacao[gdf_vegetacao.intersects(buffer_m)].copy()
-        if gdf_vegetacao.empty:
-            return 0.0
-        gdf_vegetacao['intersecao'] = gdf_vegetacao.geometry.intersection(buffer_m)
-        gdf_vegetacao = gdf_vegetacao[~gdf_vegetacao['intersecao'].is_empty]
-        if gdf_vegetacao.empty:
-            return 0.0
-        gdf_vegetacao['area_intersecao_ha'] = gdf_vegetacao['intersecao'].area / 10000.0
-        return round(float(gdf_vegetacao['area_intersecao_ha'].sum()), 2)
+        areas = areas_vegetacao_no_buffer(geojson_files, VEGETACAO_APICULTOR, buffer_m)
+        return round(float(sum(areas.values())), 2)
     except Exception:
         return 0.0
 
@@ -213,21 +380,13 @@ def area_vegetacao_dentro_buffer_meliponario(longitude: float, latitude: float,
         centro = Point(float(longitude), float(latitude))
         gdf_centro = gpd.GeoDataFrame(geometry=[centro], crs=crs_geo).to_crs(crs_metric)
         buffer_m = gdf_centro.geometry.iloc[0].buffer(raio_km * 1000)
-        gdf_todas = concat_geojsons([get_geojson_file_cached(f) for f in geojson_files], crs_geo, crs_metric)
-        gdf_vegetacao = gdf_todas[gdf_todas['CLASSE'].isin(VEGETACAO_MELIPONARIO)].copy()
-        gdf_vegetacao = gdf_vegetacao[gdf_vegetacao.intersects(buffer_m)].copy()
-        if gdf_vegetacao.empty:
+        areas = areas_vegetacao_no_buffer(geojson_files, VEGETACAO_MELIPONARIO, buffer_m)
+        if not areas:
             logger.info("Nenhuma classe de vegetação adequada encontrada dentro do buffer.")
             return 0.0
-        gdf_vegetacao['intersecao'] = gdf_vegetacao.geometry.intersection(buffer_m)
-        gdf_vegetacao = gdf_vegetacao[~gdf_vegetacao['intersecao'].is_empty]
-        if gdf_vegetacao.empty:
-            logger.info("Nenhuma interseção de vegetação adequada encontrada após recorte do buffer.")
-            return 0.0
-        gdf_vegetacao['area_intersecao_ha'] = gdf_vegetacao['intersecao'].area / 10000.0
-        soma_areas = float(gdf_vegetacao['area_intersecao_ha'].sum())
-        for _, row in gdf_vegetacao.iterrows():
-            logger.debug(f"Classe: {row.get('CLASSE')}, Área adicionada: {row['area_intersecao_ha']:.4f} ha")
+        soma_areas = float(sum(areas.values()))
+        for classe, area in areas.items():
+            logger.debug(f"Classe: {classe}, Área adicionada: {area:.4f} ha")
         logger.info(f"Área total de vegetação adequada encontrada: {soma_areas:.2f} ha")
         return round(soma_areas, 2)
     except Exception as e:
@@ -287,14 +446,9 @@ def buscar_apiarios_no_raio(latitude, longitude, raio=1.5):
     return []
 
 
-def process_apicultor(latitude: str, longitude: str, buffers_existentes: Optional[list] = None, return_area_only: bool = False, bioma: str = None, tipo_cultura: str = None, tipo_producao: str = 'apicultura'):
+def process_apicultor(latitude: str, longitude: str, buffers_existentes: Optional[list] = None, return_area_only: bool = False, bioma: str = None, tipo_cultura: str = None, tipo_producao: str = 'apicultura', geojson_files: Optional[List[str]] = None):
     try:
-        crs_metric = "EPSG:31983"
-        crs_geo = "EPSG:4326"
-
-        centro = Point(float(longitude), float(latitude))
-        gdf_centro = gpd.GeoDataFrame(geometry=[centro], crs=crs_geo).to_crs(crs_metric)
-        buffer_novo = gdf_centro.geometry.iloc[0].buffer(1500)  # 1.5km em metros
+        buffer_novo = buffer_metrico(longitude, latitude, calcular_raio_voo_apiario())  # 1.5km
 
         # Verifica se já existe apiário na mesma coordenada
         if existe_apiario_mesma_coordenada(latitude, longitude):
@@ -303,26 +457,17 @@ def process_apicultor(latitude: str, longitude: str, buffers_existentes: Optiona
         # Colmeias existentes no raio: usar buffers_existentes, se fornecido; caso contrário, fallback mock
         colmeias_intersecao = 0
         if buffers_existentes:
-            for buf in buffers_existentes:
-                if buf['buffer'].intersects(buffer_novo):
-                    try:
-                        colmeias_intersecao += int(buf['colmeias'])
-                    except Exception:
-                        continue
+            colmeias_intersecao = somar_colmeias_intersectando(buffers_existentes, buffer_novo)
         else:
             apiarios_intersecao = buscar_apiarios_no_raio(latitude, longitude, raio=1.5)
             colmeias_intersecao = sum([a.quantidadeColmeias for a in apiarios_intersecao])
 
-        geojson_files = list_geojson_files_from_minio()
-        gdf_todas = concat_geojsons([get_geojson_file_cached(f) for f in geojson_files], crs_geo, crs_metric)
+        # Camadas do catálogo já filtradas pelo bbox (passadas pelo endpoint); sem elas, todas as ativas e ingeridas
+        if geojson_files is None:
+            geojson_files = catalogo_camadas.nomes_sincrono()
 
-        # Filtra vegetações e interseções
-        gdf_vegetacao = gdf_todas[gdf_todas['CLASSE'].isin(VEGETACAO_APICULTOR)].copy()
-        gdf_vegetacao = gdf_vegetacao[gdf_vegetacao.intersects(buffer_novo)].copy()
-        gdf_vegetacao['intersecao'] = gdf_vegetacao.geometry.intersection(buffer_novo)
-        gdf_vegetacao = gdf_vegetacao[~gdf_vegetacao['intersecao'].is_empty]
-        gdf_vegetacao['area_intersecao_ha'] = gdf_vegetacao['intersecao'].area / 10000.0
-        areas = gdf_vegetacao.groupby('CLASSE')['area_intersecao_ha'].sum().to_dict()
+        # Áreas por classe: tiles/camadas candidatos via STRtree e interseção exata apenas nos candidatos
+        areas = areas_vegetacao_no_raio(longitude, latitude, calcular_raio_voo_apiario(), VEGETACAO_APICULTOR, geojson_files, buffer_novo)
         soma_areas = sum([areas.get(tipo, 0) for tipo in VEGETACAO_APICULTOR])
         print(f"[LOG] Soma total das áreas dentro do buffer: {soma_areas:.2f} ha")
         print(f"[LOG] Áreas por vegetação no recorte de 1.5km: ARBOREO={areas.get('ARBOREO', 0):.2f} ha, ARBUSTIVO={areas.get('ARBUSTIVO', 0):.2f} ha, HERBACEO={areas.get('HERBACEO', 0):.2f} ha")
@@ -340,9 +485,12 @@ def process_apicultor(latitude: str, longitude: str, buffers_existentes: Optiona
             capacidade_final = 0
         print(f"[LOG] Capacidade de suporte final: {capacidade_final}")
         return capacidade_final if not return_area_only else area_total
+    except HTTPException:
+        raise
     except Exception as e:
+        # Falha no cálculo não pode virar capacidade 0 gravada no cadastro
         print(f"[ERRO] {e}")
-        return None
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=MSG_SUPPORT_CAPACITY_ERROR)
 
 
 def identificar_bioma_por_ponto(longitude: float, latitude: float, geojson_biomas_path: str) -> Optional[str]:
@@ -351,48 +499,42 @@ def identificar_bioma_por_ponto(longitude: float, latitude: float, geojson_bioma
     Retorna o nome do bioma ou None se não encontrar.
     """
     try:
-        import geopandas as gpd
-        from shapely.geometry import Point, shape
-        gdf = gpd.read_file(geojson_biomas_path)
-        ponto = Point(longitude, latitude)
-        for _, row in gdf.iterrows():
-            if shape(row['geometry']).contains(ponto):
-                nom_bioma = row.get('nom_bioma') or row.get('NOM_BIOMA') or row.get('name')
-                return nom_bioma
-        print("Bioma não encontrado para as coordenadas fornecidas.")
-        return None
+        nom_bioma = obter_bioma_resolver(geojson_biomas_path).identificar(float(longitude), float(latitude))
+        if nom_bioma is None:
+            print("Bioma não encontrado para as coordenadas fornecidas.")
+        return nom_bioma
     except Exception as e:
         print(f"Erro ao identificar bioma: {e}")
         return None
 
 
+def identificar_biomas_lote(longitudes, latitudes, geojson_biomas_path: str = CAMINHO_BIOMAS_PADRAO) -> List[Optional[str]]:
+    """
+    Versão vetorizada de identificar_bioma_por_ponto: recebe arrays de longitude/latitude
+    e retorna a lista de biomas (None para pontos fora dos polígonos).
+    """
+    return obter_bioma_resolver(geojson_biomas_path).identificar_lote(longitudes, latitudes).tolist()
+
+
 async def verificar_sobreposicao_apiario(longitude: float, latitude: float, raio_km: float, session: AsyncSession) -> bool:
     """
     Verifica se já existe apiário/meliponário na mesma coordenada ou dentro do raio (em km).
     Retorna True se houver sobreposição, False caso contrário.
     """
-    import math
     try:
-        def haversine_km(lat1, lon1, lat2, lon2):
-            R = 6371.0088  # Raio médio da Terra em km
-            phi1, phi2 = math.radians(lat1), math.radians(lat2)
-            dphi = math.radians(lat2 - lat1)
-            dlambda = math.radians(lon2 - lon1)
-            a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
-            c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-            return R * c
-
-        result = await session.execute(select(Apiary))
-        apiarios = result.scalars().all()
-        for apiario in apiarios:
-            lon_api, lat_api = float(apiario.longitude), float(apiario.latitude)
-            # Mesma coordenada exata
-            if float(longitude) == lon_api and float(latitude) == lat_api:
-                return True
-            # Distância geodésica
-            if haversine_km(float(latitude), float(longitude), lat_api, lon_api) <= float(raio_km):
-                return True
-        return False
+        if settings.POSTGIS_ENABLED:
+            return await existe_no_raio(session, Apiary, longitude, latitude, raio_km)
+        if indice_apiarios.pronto:
+            return bool(indice_apiarios.consultar_raio(longitude, latitude, raio_km))
+
+        result = await session.execute(select(Apiary.latitude, Apiary.longitude))
+        coordenadas = result.all()
+        if not coordenadas:
+            return False
+        latitudes = [float(lat) for lat, _ in coordenadas]
+        longitudes = [float(lon) for _, lon in coordenadas]
+        # Distância geodésica (a mesma coordenada exata resulta em distância zero)
+        return bool(mascara_no_raio(float(latitude), float(longitude), latitudes, longitudes, raio_km).any())
     except Exception as e:
         import logging
         logging.getLogger(__name__).error(f"Erro ao verificar sobreposição de apiário: {e}")
@@ -403,58 +545,48 @@ async def calcular_capacidade_suporte_com_interseccao(area_ha: float, bioma: str
     """
     Calcula capacidade de suporte conforme bioma/cultura e subtrai colmeias existentes no raio.
     """
-    import math
     if tipo_cultura == 'MELIPONICULTOR':
         capacidade = calcular_capacidade_suporte_meliponicultura(area_ha)
     else:
         capacidade = calcular_capacidade_suporte_apicultura(area_ha, bioma, tipo_cultura)
 
-    def haversine_km(lat1, lon1, lat2, lon2):
-        R = 6371.0088
-        phi1, phi2 = math.radians(lat1), math.radians(lat2)
-        dphi = math.radians(lat2 - lat1)
-        dlambda = math.radians(lon2 - lon1)
-        a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        return R * c
-
     # Busca apiários/meliponários no raio
-    result = await session.execute(select(Apiary))
-    apiarios = result.scalars().all()
-    colmeias_intersecao = 0
-    for apiario in apiarios:
-        lon_api, lat_api = float(apiario.longitude), float(apiario.latitude)
-        if haversine_km(float(latitude), float(longitude), lat_api, lon_api) <= float(raio_km):
-            colmeias_intersecao += apiario.quantidadeColmeias
+    if settings.POSTGIS_ENABLED:
+        colmeias_intersecao = await somar_colmeias_no_raio(session, Apiary, longitude, latitude, raio_km)
+        return max(capacidade - colmeias_intersecao, 0)
+    if indice_apiarios.pronto:
+        vizinhos = indice_apiarios.consultar_raio(longitude, latitude, raio_km)
+        colmeias_intersecao = sum(int(a.quantidadeColmeias) for a in vizinhos)
+        return max(capacidade - colmeias_intersecao, 0)
+    result = await session.execute(select(Apiary.latitude, Apiary.longitude, Apiary.quantidadeColmeias))
+    linhas = result.all()
+    colmeias_intersecao = somar_colmeias_mascaradas(
+        float(latitude), float(longitude),
+        [float(lat) for lat, _, _ in linhas],
+        [float(lon) for _, lon, _ in linhas],
+        [int(qtd) for _, _, qtd in linhas],
+        raio_km
+    )
     return max(capacidade - colmeias_intersecao, 0)
 
 
-def process_meliponicultor(latitude: str, longitude: str, especie: str, buffers_existentes: Optional[list] = None, return_area_only: bool = False, raio_km: float = None):
+def process_meliponicultor(latitude: str, longitude: str, especie: str, buffers_existentes: Optional[list] = None, return_area_only: bool = False, raio_km: float = None, geojson_files: Optional[List[str]] = None):
     """
     Processa o cálculo de área de vegetação e capacidade de suporte para meliponário, usando buffer dinâmico conforme espécie e classes específicas.
     Retorna um dicionário detalhado com áreas, capacidade calculada e capacidade final.
     """
     import logging
     logger = logging.getLogger(__name__)
-    crs_metric = "EPSG:31983"
-    crs_geo = "EPSG:4326"
     try:
         if raio_km is not None:
             raio_buffer = raio_km
         else:
             raio_buffer = calcular_raio_voo_meliponario(especie)
-        centro = Point(float(longitude), float(latitude))
-        gdf_centro = gpd.GeoDataFrame(geometry=[centro], crs=crs_geo).to_crs(crs_metric)
-        buffer_novo = gdf_centro.geometry.iloc[0].buffer(raio_buffer * 1000)
-        geojson_files = list_geojson_files_from_minio()
-        gdf_todas = concat_geojsons([get_geojson_file_cached(f) for f in geojson_files], crs_geo, crs_metric)
-        # Filtra vegetações e interseções
-        gdf_vegetacao = gdf_todas[gdf_todas['CLASSE'].isin(VEGETACAO_MELIPONARIO)].copy()
-        gdf_vegetacao = gdf_vegetacao[gdf_vegetacao.intersects(buffer_novo)].copy()
-        gdf_vegetacao['intersecao'] = gdf_vegetacao.geometry.intersection(buffer_novo)
-        gdf_vegetacao = gdf_vegetacao[~gdf_vegetacao['intersecao'].is_empty]
-        gdf_vegetacao['area_intersecao_ha'] = gdf_vegetacao['intersecao'].area / 10000.0
-        areas = gdf_vegetacao.groupby('CLASSE')['area_intersecao_ha'].sum().to_dict()
+        buffer_novo = buffer_metrico(longitude, latitude, raio_buffer)
+        if geojson_files is None:
+            geojson_files = catalogo_camadas.nomes_sincrono()
+        # Áreas por classe: tiles/camadas candidatos via STRtree e interseção exata apenas nos candidatos
+        areas = areas_vegetacao_no_raio(longitude, latitude, raio_buffer, VEGETACAO_MELIPONARIO, geojson_files, buffer_novo)
         soma_areas = sum([areas.get(tipo, 0) for tipo in VEGETACAO_MELIPONARIO])
         logger.info(f"[MELIPONARIO] Soma total das áreas dentro do buffer: {soma_areas:.2f} ha")
         logger.info(f"[MELIPONARIO] Áreas por vegetação no recorte de {raio_buffer}km: ARBOREO={areas.get('ARBOREO', 0):.2f} ha, ARBUSTIVO={areas.get('ARBUSTIVO', 0):.2f} ha")
@@ -463,11 +595,7 @@ def process_meliponicultor(latitude: str, longitude: str, especie: str, buffers_
         capacidade = calcular_capacidade_suporte_meliponicultura(area_total)
         logger.info(f"[MELIPONARIO] Capacidade de suporte calculada: {capacidade}")
         # Subtrai colmeias existentes no raio (se buffers_existentes fornecido)
-        colmeias_intersecao = 0
-        if buffers_existentes:
-            for buf in buffers_existentes:
-                if buf['buffer'].intersects(buffer_novo):
-                    colmeias_intersecao += buf['colmeias']
+        colmeias_intersecao = somar_colmeias_intersectando(buffers_existentes, buffer_novo)
         capacidade_final = capacidade - colmeias_intersecao
         if capacidade_final < 0:
             capacidade_final = 0
@@ -480,6 +608,8 @@ def process_meliponicultor(latitude: str, longitude: str, especie: str, buffers_
             "raio_buffer": raio_buffer,
             "colmeias_existentes": colmeias_intersecao
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"[MELIPONARIO] Erro no processamento: {e}")
-        return None
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=MSG_SUPPORT_CAPACITY_ERROR)
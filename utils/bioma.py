@@ -0,0 +1,90 @@
+"""
+Identificação de bioma por ponto a partir do GeoJSON de biomas do Brasil.
+
+Os polígonos são lidos e preparados uma única vez por processo e indexados
+com STRtree; a consulta faz o filtro por bbox no índice e o teste exato de
+ponto-em-polígono apenas nos candidatos.
+"""
+import logging
+import threading
+from typing import Dict, Optional, Sequence
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+logger = logging.getLogger(__name__)
+
+CAMINHO_BIOMAS_PADRAO = 'geojson_files/Brasil.json'
+
+
+class BiomaResolver:
+    """
+    Resolve o bioma de coordenadas (EPSG:4326). A carga do arquivo é preguiçosa e ocorre uma única vez.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._poligonos: Optional[np.ndarray] = None
+        self._nomes: Optional[np.ndarray] = None
+        self._arvore: Optional[shapely.STRtree] = None
+        self._lock = threading.Lock()
+
+    def _carregar(self) -> None:
+        with self._lock:
+            if self._arvore is not None:
+                return
+            gdf = gpd.read_file(self.caminho)
+            if gdf.crs is not None and gdf.crs.to_string() != "EPSG:4326":
+                gdf = gdf.to_crs("EPSG:4326")
+            for coluna in ('nom_bioma', 'NOM_BIOMA', 'name'):
+                if coluna in gdf.columns:
+                    nomes = gdf[coluna].to_numpy(dtype=object)
+                    break
+            else:
+                nomes = np.full(len(gdf), None, dtype=object)
+            poligonos = np.asarray(gdf.geometry.values, dtype=object)
+            shapely.prepare(poligonos)
+            self._poligonos = poligonos
+            self._nomes = nomes
+            self._arvore = shapely.STRtree(poligonos)
+            logger.info(f"Biomas carregados de {self.caminho}: {len(poligonos)} polígonos")
+
+    def identificar_lote(self, longitudes: Sequence[float], latitudes: Sequence[float]) -> np.ndarray:
+        """
+        Retorna um array (dtype object) com o nome do bioma de cada ponto, ou None quando fora dos polígonos.
+        Em caso de sobreposição prevalece o primeiro polígono do arquivo.
+        """
+        self._carregar()
+        x = np.asarray(longitudes, dtype=float)
+        y = np.asarray(latitudes, dtype=float)
+        resultado = np.full(len(x), None, dtype=object)
+        if len(x) == 0:
+            return resultado
+        entradas, candidatos = self._arvore.query(shapely.points(x, y))
+        dentro = shapely.contains_xy(self._poligonos[candidatos], x[entradas], y[entradas])
+        entradas, candidatos = entradas[dentro], candidatos[dentro]
+        if len(entradas) == 0:
+            return resultado
+        ordem = np.lexsort((candidatos, entradas))
+        entradas, candidatos = entradas[ordem], candidatos[ordem]
+        unicos, primeiros = np.unique(entradas, return_index=True)
+        resultado[unicos] = self._nomes[candidatos[primeiros]]
+        return resultado
+
+    def identificar(self, longitude: float, latitude: float) -> Optional[str]:
+        return self.identificar_lote([longitude], [latitude])[0]
+
+
+_resolvers: Dict[str, BiomaResolver] = {}
+_resolvers_lock = threading.Lock()
+
+
+def obter_bioma_resolver(caminho: str = CAMINHO_BIOMAS_PADRAO) -> BiomaResolver:
+    """Resolver compartilhado no processo para o arquivo de biomas informado."""
+    with _resolvers_lock:
+        resolver = _resolvers.get(caminho)
+        if resolver is None:
+            resolver = BiomaResolver(caminho)
+            _resolvers[caminho] = resolver
+        return resolver
@@ -0,0 +1,85 @@
+"""
+Cache (TTL + LRU) das áreas de vegetação por classe calculadas em torno de um ponto.
+
+A chave combina a coordenada arredondada, o raio, o conjunto de classes e a versão do
+conjunto de camadas. A versão é um hash dos nomes das camadas e do marcador de geração
+em disco. O marcador é regravado a cada upload/remoção de mapa (marcar_alteracao), o que
+invalida as entradas de todos os workers que compartilham o diretório de cache.
+"""
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class CacheAreas:
+    """Cache limitado de dicionários {classe: área_ha}, com expiração por TTL e descarte LRU."""
+
+    def __init__(self, arquivo_geracao: str, max_itens: int = 4096, ttl_s: float = 600.0, casas_decimais: int = 5):
+        self._arquivo_geracao = arquivo_geracao
+        self._max_itens = max_itens
+        self._ttl_s = ttl_s
+        # 5 casas decimais ≈ 1 m: tentativas repetidas na mesma coordenada reaproveitam o resultado
+        self._casas = casas_decimais
+        self._itens: "OrderedDict[Tuple, Tuple[float, Dict[str, float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+
+    def _geracao(self) -> int:
+        try:
+            return os.stat(self._arquivo_geracao).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def versao(self, camadas: Iterable[str]) -> str:
+        """Hash do conjunto de camadas e da geração atual."""
+        conteudo = '\n'.join(sorted(camadas)) + f'\n{self._geracao()}'
+        return hashlib.sha1(conteudo.encode('utf-8')).hexdigest()
+
+    def _chave(self, longitude: float, latitude: float, raio_km: float, classes: Iterable[str], versao: str) -> Tuple:
+        return (
+            round(float(longitude), self._casas), round(float(latitude), self._casas),
+            round(float(raio_km), 6), tuple(sorted(classes)), versao
+        )
+
+    def obter(self, longitude: float, latitude: float, raio_km: float, classes: Iterable[str], versao: str) -> Optional[Dict[str, float]]:
+        chave = self._chave(longitude, latitude, raio_km, classes, versao)
+        agora = time.monotonic()
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None or item[0] < agora:
+                if item is not None:
+                    del self._itens[chave]
+                self.faltas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return dict(item[1])
+
+    def guardar(self, longitude: float, latitude: float, raio_km: float, classes: Iterable[str], versao: str, areas: Dict[str, float]) -> None:
+        chave = self._chave(longitude, latitude, raio_km, classes, versao)
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + self._ttl_s, dict(areas))
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self._max_itens:
+                self._itens.popitem(last=False)
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._itens.clear()
+
+    def marcar_alteracao(self) -> None:
+        """Registra que o conjunto de camadas mudou: grava nova geração em disco e limpa o cache local."""
+        temporario = f'{self._arquivo_geracao}.{uuid.uuid4().hex}.tmp'
+        with open(temporario, 'w') as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(temporario, self._arquivo_geracao)
+        self.limpar()
+
+    def estatisticas(self) -> Dict[str, int]:
+        with self._lock:
+            return {'itens': len(self._itens), 'max_itens': self._max_itens, 'acertos': self.acertos, 'faltas': self.faltas}
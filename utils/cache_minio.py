@@ -0,0 +1,196 @@
+"""
+Cache em disco, versionado por ETag, dos objetos (camadas) do bucket MinIO.
+
+Cada objeto fica em `<diretorio>/<nome>/<etag><extensão>`, então uma nova versão
+nunca sobrescreve o arquivo que outro leitor está usando. O download é feito em
+blocos para um arquivo temporário no mesmo diretório e publicado com rename atômico.
+A versão local é revalidada (stat_object/ETag) no máximo a cada `intervalo_revalidacao_s`,
+ou na primeira leitura depois que o marcador de geração (`arquivo_geracao`, regravado a
+cada upload/remoção de mapa por qualquer processo) muda.
+O tamanho total é limitado a `max_bytes`, descartando as camadas usadas há mais tempo (LRU
+pelo mtime, atualizado a cada acesso).
+"""
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from minio import Minio
+from minio.error import S3Error
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_BLOCO = 1024 * 1024
+
+
+def _etag_seguro(etag: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_-]', '', etag or '') or 'sem-etag'
+
+
+class CacheCamadasMinio:
+    """Resolve o nome do objeto no bucket para o caminho local da versão atual."""
+
+    def __init__(self, client: Minio, bucket: Optional[str], diretorio: str,
+                 intervalo_revalidacao_s: float = 60.0, max_bytes: int = 2 * 1024 ** 3,
+                 arquivo_geracao: Optional[str] = None):
+        self._client = client
+        self._bucket = bucket
+        self._diretorio = diretorio
+        self._intervalo = intervalo_revalidacao_s
+        self._max_bytes = max_bytes
+        # nome -> (caminho local, instante da última validação)
+        self._validados: Dict[str, Tuple[str, float]] = {}
+        # nome -> instante em que o objeto foi visto ausente no bucket
+        self._ausentes: Dict[str, float] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._arquivo_geracao = arquivo_geracao
+        self._geracao_vista: Optional[int] = None
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _pasta(self, nome: str) -> str:
+        return os.path.join(self._diretorio, os.path.basename(nome))
+
+    def _lock_de(self, nome: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(nome, threading.Lock())
+
+    def _conferir_geracao(self) -> None:
+        """Descarta validações e ausências lembradas quando o conjunto de camadas mudou em outro processo."""
+        if self._arquivo_geracao is None:
+            return
+        try:
+            geracao = os.stat(self._arquivo_geracao).st_mtime_ns
+        except FileNotFoundError:
+            geracao = 0
+        with self._lock:
+            if geracao != self._geracao_vista:
+                self._validados.clear()
+                self._ausentes.clear()
+                self._geracao_vista = geracao
+
+    def _versao_local(self, nome: str) -> Optional[str]:
+        """Versão mais recente já presente em disco (usada quando o MinIO está inacessível)."""
+        pasta = self._pasta(nome)
+        if not os.path.isdir(pasta):
+            return None
+        arquivos = [os.path.join(pasta, a) for a in os.listdir(pasta) if not a.endswith('.tmp')]
+        return max(arquivos, key=os.path.getmtime, default=None)
+
+    def _baixar(self, nome: str, destino: str) -> None:
+        temporario = f'{destino}.{uuid.uuid4().hex}.tmp'
+        response = None
+        try:
+            response = self._client.get_object(self._bucket, nome)
+            with open(temporario, 'wb') as f:
+                for bloco in response.stream(TAMANHO_BLOCO):
+                    f.write(bloco)
+            os.replace(temporario, destino)
+        finally:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            try:
+                if response is not None:
+                    response.close()
+                    response.release_conn()
+            except Exception:
+                # Evita propagar erro de limpeza de recurso
+                pass
+
+    def _remover_outras_versoes(self, nome: str, atual: str) -> None:
+        pasta = self._pasta(nome)
+        for arquivo in os.listdir(pasta):
+            caminho = os.path.join(pasta, arquivo)
+            if caminho != atual and not arquivo.endswith('.tmp'):
+                try:
+                    os.remove(caminho)
+                except FileNotFoundError:
+                    pass
+
+    def _aplicar_limite(self, atual: str) -> None:
+        """Remove as camadas usadas há mais tempo até o total caber em max_bytes (nunca a atual)."""
+        arquivos = []
+        for raiz, _, nomes in os.walk(self._diretorio):
+            for arquivo in nomes:
+                if not arquivo.endswith('.tmp'):
+                    caminho = os.path.join(raiz, arquivo)
+                    estado = os.stat(caminho)
+                    arquivos.append((estado.st_mtime, estado.st_size, caminho))
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= self._max_bytes:
+                break
+            if caminho == atual:
+                continue
+            try:
+                os.remove(caminho)
+                total -= tamanho
+                logger.info(f"Cache de camadas: removido {caminho} (limite de {self._max_bytes} bytes)")
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._validados = {n: v for n, v in self._validados.items() if os.path.exists(v[0])}
+
+    def obter(self, nome: str) -> str:
+        """Caminho local da versão atual do objeto, baixando-o se necessário."""
+        self._conferir_geracao()
+        with self._lock_de(nome):
+            validado = self._validados.get(nome)
+            if validado is not None and time.monotonic() - validado[1] < self._intervalo and os.path.exists(validado[0]):
+                os.utime(validado[0])
+                return validado[0]
+            try:
+                estado = self._client.stat_object(self._bucket, nome)
+            except S3Error as e:
+                raise HTTPException(status_code=500, detail=f"MinIO error ao obter {nome}: {str(e)}")
+            except Exception as e:
+                # MinIO inacessível: segue com a última versão local, se houver
+                local = self._versao_local(nome)
+                if local is None:
+                    raise HTTPException(status_code=503, detail=f"MinIO indisponível ao obter {nome}: {str(e)}")
+                logger.warning(f"MinIO indisponível; usando cópia local de {nome}: {e}")
+                return local
+            _, extensao = os.path.splitext(nome)
+            caminho = os.path.join(self._pasta(nome), _etag_seguro(estado.etag) + extensao)
+            baixado = False
+            if not os.path.exists(caminho):
+                os.makedirs(self._pasta(nome), exist_ok=True)
+                try:
+                    self._baixar(nome, caminho)
+                except S3Error as e:
+                    raise HTTPException(status_code=500, detail=f"MinIO error ao obter {nome}: {str(e)}")
+                self._remover_outras_versoes(nome, caminho)
+                baixado = True
+            else:
+                os.utime(caminho)
+            self._validados[nome] = (caminho, time.monotonic())
+        if baixado:
+            self._aplicar_limite(caminho)
+        return caminho
+
+    def obter_opcional(self, nome: str) -> Optional[str]:
+        """Como obter, mas devolve None se o objeto não existe no bucket (resultado lembrado pelo intervalo de revalidação)."""
+        self._conferir_geracao()
+        ausente_desde = self._ausentes.get(nome)
+        if ausente_desde is not None and time.monotonic() - ausente_desde < self._intervalo:
+            return None
+        try:
+            caminho = self.obter(nome)
+        except HTTPException as e:
+            # 500 = erro do MinIO para o objeto (ausente); 503 = MinIO inacessível e sem cópia local
+            if e.status_code != 500:
+                raise
+            self._ausentes[nome] = time.monotonic()
+            return None
+        self._ausentes.pop(nome, None)
+        return caminho
+
+    def esquecer(self, nome: str) -> None:
+        """Força revalidação do objeto na próxima leitura."""
+        with self._lock:
+            self._validados.pop(nome, None)
+            self._ausentes.pop(nome, None)
@@ -0,0 +1,205 @@
+"""
+Avaliação de capacidade de suporte em lote, sem persistir nada.
+
+Usada por POST /apiaries/capacity:batch e /meliponary/capacity:batch para que uma
+cooperativa compare dezenas de locais candidatos numa só requisição. Os pontos são
+divididos em blocos (settings.CAPACITY_BATCH_BLOCK_SIZE); para cada bloco os vizinhos
+existentes são buscados uma única vez (círculo que envolve o bloco), as camadas vêm do
+catálogo pelo bbox do bloco e o cálculo roda como uma tarefa do pool de computação:
+biomas e buffers em lote, colmeias existentes por uma consulta STRtree de todos os
+pares e áreas de vegetação dos pontos fora do cache num só lote (uma consulta STRtree por
+camada e classe, cada tile ou janela FlatGeobuf lido uma vez). Com mode=approximate as
+áreas vêm do raster de utils.raster_vegetacao (custo constante por ponto, erro limitado
+conforme o docstring daquele módulo).
+
+No máximo settings.COMPUTE_WORKERS blocos de um lote ocupam o pool ao mesmo tempo; o
+próximo bloco só pede vaga quando um anterior termina, de modo que criações de apiário,
+tiles e consultas de outras requisições entram na fila entre os blocos em vez de esperar
+o lote inteiro. O resultado sai em NDJSON, uma linha por ponto, na ordem de entrada, à
+medida que cada bloco termina.
+"""
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, List, Optional, Sequence
+
+import numpy as np
+import shapely
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.configs import settings
+from utils import VEGETACAO_APICULTOR, VEGETACAO_MELIPONARIO, areas_vegetacao_no_raio_lote, \
+    calcular_capacidade_suporte_apicultura, calcular_capacidade_suporte_meliponicultura, catalogo_camadas, \
+    identificar_biomas_lote, obter_raster_vegetacao
+from utils.computacao import servico_computacao
+from utils.distancias import haversine_km
+from utils.geometria import buffers_metricos, construir_buffers_existentes, projetar_para_metrico, \
+    somar_colmeias_intersectando_lote
+from utils.proximidade import listar_no_raio, raio_voo_km
+
+logger = logging.getLogger(__name__)
+
+MSG_BIOMA_NAO_IDENTIFICADO = "coordenada nao mapeada no geojson ou bioma não identificado"
+
+# Cálculo das áreas de vegetação: geometrias das camadas ou raster de soma acumulada
+MODOS = ('exact', 'approximate')
+
+
+def validar_pontos(pontos: List[dict]) -> None:
+    """HTTP 400 se o lote estiver vazio, exceder settings.CAPACITY_BATCH_MAX_POINTS ou tiver coordenadas fora da faixa."""
+    if not pontos:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Informe ao menos um ponto.")
+    if len(pontos) > settings.CAPACITY_BATCH_MAX_POINTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo de {settings.CAPACITY_BATCH_MAX_POINTS} pontos por requisição."
+        )
+    for indice, ponto in enumerate(pontos):
+        if not (-90.0 <= ponto['latitude'] <= 90.0) or not (-180.0 <= ponto['longitude'] <= 180.0):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Ponto {indice}: latitude deve estar entre -90 e 90 e longitude entre -180 e 180."
+            )
+
+
+def validar_modo(modo: str) -> None:
+    """HTTP 400 para modo desconhecido; HTTP 503 em mode=approximate sem o raster gerado."""
+    if modo not in MODOS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"mode inválido: {modo}. Use {', '.join(MODOS)}."
+        )
+    if modo == 'approximate':
+        obter_raster_vegetacao()
+
+
+def avaliar_bloco(longitudes: Sequence[float], latitudes: Sequence[float], raios_km: Sequence[float],
+                  tipo_producao: str, buffers_existentes: List[dict], geojson_files: List[str],
+                  descontos: Optional[Sequence[int]] = None, modo: str = 'exact') -> List[dict]:
+    """
+    Capacidade de suporte de cada ponto do bloco (executada no pool de computação).
+    `descontos` são colmeias informadas pelo usuário a subtrair de cada ponto (questionário do apiário).
+    """
+    lon = np.asarray(longitudes, dtype=float)
+    lat = np.asarray(latitudes, dtype=float)
+    raios = np.asarray(raios_km, dtype=float)
+    classes = VEGETACAO_APICULTOR if tipo_producao == 'apicultura' else VEGETACAO_MELIPONARIO
+    biomas = identificar_biomas_lote(lon, lat)
+    buffers = buffers_metricos(lon, lat, raios)
+    colmeias = somar_colmeias_intersectando_lote(buffers_existentes, buffers)
+    avaliados = [i for i in range(len(lon)) if biomas[i]]
+    if modo == 'approximate':
+        raster = obter_raster_vegetacao()
+        xs, ys = projetar_para_metrico(lon[avaliados], lat[avaliados])
+        areas_avaliados = [
+            raster.areas_por_classe_metrico(float(x), float(y), float(raios[i]), classes)
+            for x, y, i in zip(xs, ys, avaliados)
+        ]
+    else:
+        areas_avaliados = areas_vegetacao_no_raio_lote(
+            lon[avaliados].tolist(), lat[avaliados].tolist(), raios[avaliados].tolist(), classes, geojson_files,
+            buffers[avaliados]
+        )
+    areas_por_ponto = dict(zip(avaliados, areas_avaliados))
+    resultados = []
+    for i in range(len(lon)):
+        if not biomas[i]:
+            resultados.append({"erro": MSG_BIOMA_NAO_IDENTIFICADO})
+            continue
+        areas = areas_por_ponto[i]
+        area_total = float(sum(areas.get(classe, 0.0) for classe in classes))
+        if tipo_producao == 'apicultura':
+            capacidade = calcular_capacidade_suporte_apicultura(area_total, biomas[i])
+        else:
+            capacidade = calcular_capacidade_suporte_meliponicultura(area_total)
+        desconto = int(descontos[i] or 0) if descontos is not None else 0
+        resultados.append({
+            "bioma": biomas[i],
+            "raio_buffer": float(raios[i]),
+            "area_total": round(area_total, 2),
+            "areas_por_vegetacao": {classe: round(float(areas.get(classe, 0.0)), 2) for classe in classes},
+            "capacidade_calculada": int(capacidade),
+            "colmeias_existentes": int(colmeias[i]),
+            "capacidade_final": max(int(capacidade) - int(colmeias[i]) - desconto, 0)
+        })
+    return resultados
+
+
+async def _preparar_bloco(session: AsyncSession, model, longitudes: np.ndarray, latitudes: np.ndarray,
+                          raios_km: np.ndarray, alcance_vizinhos_km: float) -> tuple:
+    """Buffers dos vizinhos existentes que podem cruzar o bloco e camadas do catálogo no bbox do bloco."""
+    centro_lon, centro_lat = float(longitudes.mean()), float(latitudes.mean())
+    raio_bloco_km = float(haversine_km(centro_lat, centro_lon, latitudes, longitudes).max())
+    vizinhos = await listar_no_raio(session, model, centro_lon, centro_lat, raio_bloco_km + alcance_vizinhos_km)
+    buffers_existentes = construir_buffers_existentes(
+        longitudes=[float(v.longitude) for v in vizinhos],
+        latitudes=[float(v.latitude) for v in vizinhos],
+        raios_km=[raio_voo_km(model, getattr(v, 'especieAbelha', None)) for v in vizinhos],
+        colmeias=[int(v.quantidadeColmeias) for v in vizinhos]
+    )
+    envelope = shapely.box(*shapely.total_bounds(buffers_metricos(longitudes, latitudes, raios_km)))
+    camadas = await catalogo_camadas.camadas_para(session, envelope)
+    return buffers_existentes, camadas
+
+
+async def _avaliar_com_vaga(vagas: asyncio.Semaphore, *args) -> List[dict]:
+    async with vagas:
+        return await servico_computacao.executar(avaliar_bloco, *args)
+
+
+async def iniciar_blocos(session: AsyncSession, model, pontos: List[dict], raios_km: Sequence[float],
+                        tipo_producao: str, alcance_vizinhos_km: float,
+                        descontos: Optional[Sequence[int]] = None, modo: str = 'exact') -> List[tuple]:
+    """
+    Prepara cada bloco com a sessão (ainda dentro do endpoint) e agenda o cálculo no pool, no máximo
+    settings.COMPUTE_WORKERS blocos por vez.
+    Retorna [(índice do primeiro ponto, tarefa)] para fluxo_ndjson.
+    """
+    longitudes = np.array([p['longitude'] for p in pontos], dtype=float)
+    latitudes = np.array([p['latitude'] for p in pontos], dtype=float)
+    raios = np.asarray(raios_km, dtype=float)
+    tamanho = max(settings.CAPACITY_BATCH_BLOCK_SIZE, 1)
+    blocos = []
+    vagas = asyncio.Semaphore(max(settings.COMPUTE_WORKERS, 1))
+    try:
+        # A sessão é usada em sequência; só o cálculo dos blocos corre em paralelo no pool
+        for inicio in range(0, len(pontos), tamanho):
+            fatia = slice(inicio, inicio + tamanho)
+            buffers_existentes, camadas = await _preparar_bloco(
+                session, model, longitudes[fatia], latitudes[fatia], raios[fatia], alcance_vizinhos_km
+            )
+            tarefa = asyncio.ensure_future(_avaliar_com_vaga(
+                vagas, longitudes[fatia].tolist(), latitudes[fatia].tolist(), raios[fatia].tolist(),
+                tipo_producao, buffers_existentes, camadas,
+                list(descontos[fatia]) if descontos is not None else None, modo
+            ))
+            blocos.append((inicio, tarefa))
+    except BaseException:
+        for _, tarefa in blocos:
+            tarefa.cancel()
+        raise
+    return blocos
+
+
+async def fluxo_ndjson(pontos: List[dict], blocos: List[tuple]) -> AsyncIterator[bytes]:
+    """
+    Linhas NDJSON ({"indice", "ref", ...resultado}) de cada ponto, na ordem de entrada.
+    Um bloco que falhar (tempo esgotado, erro no cálculo) gera linhas com "erro" para os seus pontos.
+    """
+    tamanho = max(settings.CAPACITY_BATCH_BLOCK_SIZE, 1)
+    try:
+        for inicio, tarefa in blocos:
+            try:
+                resultados = await tarefa
+            except Exception as e:
+                detalhe = e.detail if isinstance(e, HTTPException) else str(e)
+                logger.error(f"Falha no bloco de capacidade iniciado em {inicio}: {detalhe}")
+                resultados = [{"erro": detalhe}] * min(tamanho, len(pontos) - inicio)
+            for deslocamento, resultado in enumerate(resultados):
+                indice = inicio + deslocamento
+                linha = {"indice": indice, "ref": pontos[indice].get('ref'), **resultado}
+                yield (json.dumps(linha, ensure_ascii=False) + '\n').encode('utf-8')
+    finally:
+        # Cliente desconectado: blocos ainda na fila não precisam rodar
+        for _, tarefa in blocos:
+            tarefa.cancel()
@@ -0,0 +1,146 @@
+"""
+Catálogo das camadas de vegetação, apoiado na tabela geomaps.
+
+Substitui a listagem do bucket (list_objects recursivo no MinIO) a cada cálculo: as
+camadas ativas e seus metadados (tamanho, bbox, número de feições, CRS e checksum,
+gravados no upload) ficam em cache no processo. O cache é recarregado quando o
+marcador de geração das camadas muda (upload/remoção de mapa, em qualquer worker) ou
+após `ttl_s`. Camadas cujo bbox não cruza o buffer consultado são descartadas antes
+de qualquer leitura de geometria.
+
+Fora do event loop da API (processos do pool de computação, scripts), nomes_sincrono()
+lê a mesma consulta com uma engine própria e descartável.
+"""
+import asyncio
+import os
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import geopandas as gpd
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.future import select
+from sqlalchemy.pool import NullPool
+
+from core.configs import settings
+from models.maps import Maps
+from utils.flatgeobuf import bbox_geo
+
+
+class EntradaCatalogo(NamedTuple):
+    id: int
+    nome: str
+    tamanho_bytes: Optional[int]
+    bbox: Optional[Tuple[float, float, float, float]]
+    feicoes: Optional[int]
+    crs: Optional[str]
+    checksum: Optional[str]
+
+
+def nome_objeto(mapa: Maps) -> str:
+    """Nome do objeto no bucket (registros antigos só têm a URL em file_path)."""
+    if mapa.object_name:
+        return mapa.object_name
+    return mapa.file_path.split('/', 4)[-1] if mapa.file_path.startswith('http') else mapa.file_path
+
+
+def descrever_camada(gdf: gpd.GeoDataFrame) -> Dict:
+    """Metadados de catálogo (bbox em EPSG:4326, feições e CRS original) de uma camada lida."""
+    crs = gdf.crs.to_string() if gdf.crs is not None else None
+    geo = gdf if gdf.crs is None else gdf.to_crs('EPSG:4326')
+    min_lon, min_lat, max_lon, max_lat = (float(v) for v in geo.total_bounds) if not geo.empty else (None,) * 4
+    return {
+        'bbox_min_lon': min_lon, 'bbox_min_lat': min_lat, 'bbox_max_lon': max_lon, 'bbox_max_lat': max_lat,
+        'feature_count': int(len(gdf)), 'crs': crs
+    }
+
+
+def _bbox(mapa: Maps) -> Optional[Tuple[float, float, float, float]]:
+    valores = (mapa.bbox_min_lon, mapa.bbox_min_lat, mapa.bbox_max_lon, mapa.bbox_max_lat)
+    return None if any(v is None for v in valores) else tuple(float(v) for v in valores)
+
+
+class CatalogoCamadas:
+    """Cache em processo das camadas ativas de geomaps."""
+
+    def __init__(self, arquivo_geracao: str, ttl_s: float = 300.0):
+        self._arquivo_geracao = arquivo_geracao
+        self._ttl_s = ttl_s
+        self._entradas: Optional[List[EntradaCatalogo]] = None
+        self._carregado_em = 0.0
+        self._geracao: Optional[int] = None
+        self._lock = asyncio.Lock()
+
+    def _geracao_atual(self) -> int:
+        try:
+            return os.stat(self._arquivo_geracao).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _valido(self) -> bool:
+        return (
+            self._entradas is not None
+            and time.monotonic() - self._carregado_em < self._ttl_s
+            and self._geracao == self._geracao_atual()
+        )
+
+    async def recarregar(self, session: AsyncSession) -> List[EntradaCatalogo]:
+        geracao = self._geracao_atual()
+        result = await session.execute(select(Maps).order_by(Maps.id))
+        # Um mesmo objeto enviado mais de uma vez: vale o registro mais recente, qualquer que seja o status
+        ultimos: Dict[str, Maps] = {}
+        for mapa in result.scalars().all():
+            nome = nome_objeto(mapa)
+            if nome.endswith('.geojson'):
+                ultimos[nome] = mapa
+        # Só então o filtro: o objeto no bucket já é o do último envio, então um registro anterior 'concluido'
+        # não pode representá-lo; a camada some até a ingestão do último terminar. Registros anteriores à
+        # ingestão não têm status.
+        self._entradas = [
+            EntradaCatalogo(
+                id=mapa.id, nome=nome, tamanho_bytes=mapa.size_bytes, bbox=_bbox(mapa),
+                feicoes=mapa.feature_count, crs=mapa.crs, checksum=mapa.checksum
+            )
+            for nome, mapa in ultimos.items()
+            if mapa.active is not False and mapa.ingest_status in (None, 'concluido')
+        ]
+        self._carregado_em = time.monotonic()
+        self._geracao = geracao
+        return self._entradas
+
+    async def entradas(self, session: AsyncSession) -> List[EntradaCatalogo]:
+        if self._valido():
+            return self._entradas
+        async with self._lock:
+            if self._valido():
+                return self._entradas
+            return await self.recarregar(session)
+
+    async def camadas_para(self, session: AsyncSession, buffer_m) -> List[str]:
+        """Nomes das camadas ativas cujo bbox cruza o buffer (CRS métrico); camadas sem bbox são sempre incluídas."""
+        min_lon, min_lat, max_lon, max_lat = bbox_geo(buffer_m)
+        return [
+            e.nome for e in await self.entradas(session)
+            if e.bbox is None
+            or not (e.bbox[2] < min_lon or e.bbox[0] > max_lon or e.bbox[3] < min_lat or e.bbox[1] > max_lat)
+        ]
+
+    def nomes_sincrono(self) -> List[str]:
+        """
+        Nomes das camadas ativas e ingeridas, para código síncrono sem event loop próprio.
+        Usa o cache quando válido; senão lê geomaps numa engine sem pool (as conexões da engine
+        da API pertencem ao event loop dela).
+        """
+        if not self._valido():
+            async def _ler() -> None:
+                engine = create_async_engine(settings.DB_URL, poolclass=NullPool)
+                try:
+                    async with AsyncSession(engine) as session:
+                        await self.recarregar(session)
+                finally:
+                    await engine.dispose()
+
+            asyncio.run(_ler())
+        return [e.nome for e in self._entradas]
+
+    def invalidar(self) -> None:
+        self._entradas = None
@@ -0,0 +1,203 @@
+"""
+Serviço de computação geométrica fora do event loop.
+
+Os cálculos de capacidade (process_apicultor, process_meliponicultor) e a identificação
+de bioma são CPU-bound e, chamados direto de um endpoint `async def`, travam o event loop
+do worker (logins e dashboards ficam parados). Aqui eles rodam num ProcessPoolExecutor
+gerenciado, com processos iniciados por `spawn` e aquecidos no initializer: resolver de
+biomas e as camadas do catálogo que só podem ser servidas pelo store residente.
+
+Com settings.COMPUTE_WORKERS = 0 o pool não é criado e as tarefas rodam numa thread
+(run_in_threadpool), o que ainda libera o event loop, mas compartilha o GIL.
+
+Vagas: no máximo COMPUTE_WORKERS tarefas ficam no pool ao mesmo tempo; as demais esperam
+uma vaga em ordem de chegada (asyncio.Semaphore). Assim a tarefa enviada começa a rodar
+logo, e settings.COMPUTE_TIMEOUT_S mede a execução, não a espera por um processo livre.
+Ao estourar o timeout a requisição recebe 504. Uma tarefa já em execução num processo não
+pode ser interrompida e termina em segundo plano (o resultado é descartado); a vaga só é
+devolvida quando ela termina, para que a próxima tarefa não entre na fila atrás dela.
+
+Se um processo do pool morrer (OOM, segfault em GEOS/GDAL), o ProcessPoolExecutor fica
+quebrado para sempre: as tarefas pendentes recebem BrokenProcessPool. O serviço então
+recria o pool e responde 503 a essas tarefas; as próximas usam o pool novo.
+
+Só o processo da API recebe invalidar_camadas; os caches dos processos do pool (áreas,
+validação de camadas no MinIO, índices de tiles) conferem a cada uso o marcador de geração
+em disco (ARQUIVO_GERACAO_CAMADAS) ou o mtime dos arquivos que leem.
+
+Cada tarefa do pool devolve, junto com o resultado, as estatísticas do cache de áreas
+do processo que a executou; estatisticas_cache() soma a última leitura de cada worker.
+
+servico_variantes é um segundo pool (settings.VARIANT_WORKERS processos, sem aquecimento)
+para a geração das variantes simplificadas de /maps/content, que lê e simplifica a camada
+inteira e não deve disputar vaga com os cálculos das requisições.
+"""
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+
+from core.configs import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ErroComputacao(Exception):
+    """HTTPException serializável, usada para atravessar a fronteira entre processos."""
+
+    def __init__(self, status_code: int, detail: Any):
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _inicializar_worker() -> None:
+    """
+    Prepara o processo do pool antes da primeira tarefa: resolver de biomas e camadas ativas do
+    catálogo (ativas e ingeridas) que não têm tiles em disco nem FlatGeobuf no bucket. Essas duas
+    formas são lidas por janela a cada consulta e não precisam ficar residentes.
+    """
+    try:
+        from utils import cache_camadas, catalogo_camadas, obter_bioma_resolver, vegetacao_store, vegetacao_tiles
+        from utils.flatgeobuf import nome_fgb
+        obter_bioma_resolver().identificar(0.0, 0.0)
+        for nome in catalogo_camadas.nomes_sincrono():
+            if vegetacao_tiles.disponivel(nome) or cache_camadas.obter_opcional(nome_fgb(nome)) is not None:
+                continue
+            vegetacao_store.carregar(nome)
+    except Exception as e:
+        # Aquecimento é uma otimização: o worker segue e carrega sob demanda
+        logger.warning(f"Aquecimento do worker de computação incompleto: {e}")
+
+
+def _estatisticas_processo() -> Dict[str, int]:
+    from utils import cache_areas
+    return cache_areas.estatisticas()
+
+
+def _executar(func: Callable, args: tuple, kwargs: dict) -> tuple:
+    """Roda a tarefa no processo do pool e devolve (resultado, pid, estatísticas do cache de áreas)."""
+    try:
+        return func(*args, **kwargs), os.getpid(), _estatisticas_processo()
+    except HTTPException as e:
+        raise ErroComputacao(e.status_code, e.detail)
+
+
+class ServicoComputacao:
+    """Pool de processos para cálculos geométricos, com início/encerramento explícitos."""
+
+    def __init__(self, workers: int, timeout_s: float, nome: str = 'computação', aquecer: bool = True):
+        self._workers = workers
+        self._timeout_s = timeout_s
+        self._nome = nome
+        self._aquecer = aquecer
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._vagas = asyncio.Semaphore(max(workers, 1))
+        # pid -> estatísticas do cache de áreas lidas na última tarefa concluída pelo processo
+        self._estatisticas: Dict[int, Dict[str, int]] = {}
+
+    def iniciar(self) -> None:
+        if self._workers <= 0 or self._pool is not None:
+            return
+        self._pool = ProcessPoolExecutor(
+            max_workers=self._workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_inicializar_worker if self._aquecer else None
+        )
+        logger.info(f"Pool de {self._nome} iniciado com {self._workers} processos")
+
+    def encerrar(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self._estatisticas.clear()
+
+    def _recriar(self, pool: ProcessPoolExecutor) -> None:
+        """Troca o pool quebrado por um novo (só uma vez, mesmo com várias tarefas falhando juntas)."""
+        if self._pool is pool:
+            logger.error(f"Pool de {self._nome} quebrado (processo encerrado abruptamente); recriando")
+            self.encerrar()
+            self.iniciar()
+
+    def _devolver_vaga(self, loop: asyncio.AbstractEventLoop) -> Callable[[Future], None]:
+        def devolver(_: Future) -> None:
+            try:
+                loop.call_soon_threadsafe(self._vagas.release)
+            except RuntimeError:
+                pass  # event loop já encerrado
+        return devolver
+
+    async def _enviar(self, func: Callable, args: tuple, kwargs: dict) -> tuple:
+        """
+        Espera uma vaga e envia a tarefa ao pool; a vaga volta quando a tarefa sai do pool (callback do future).
+        Retorna (pool usado, future).
+        """
+        await self._vagas.acquire()
+        pool = self._pool
+        try:
+            futuro = pool.submit(_executar, func, args, kwargs)
+        except BaseException:
+            self._vagas.release()
+            raise
+        futuro.add_done_callback(self._devolver_vaga(asyncio.get_running_loop()))
+        return pool, futuro
+
+    async def executar(self, func: Callable, *args, timeout_s: Optional[float] = None, **kwargs) -> Any:
+        """
+        Executa func(*args, **kwargs) fora do event loop e aguarda o resultado. O timeout (HTTP 504)
+        conta a partir do envio ao pool, depois de obtida a vaga.
+        """
+        timeout_s = self._timeout_s if timeout_s is None else timeout_s
+        em_processo = self._pool is not None
+        pool = None
+        try:
+            if em_processo:
+                pool, futuro = await self._enviar(func, args, kwargs)
+                tarefa = asyncio.wrap_future(futuro)
+            else:
+                tarefa = run_in_threadpool(func, *args, **kwargs)
+            resultado = await asyncio.wait_for(tarefa, timeout=timeout_s)
+        except BrokenProcessPool:
+            self._recriar(pool or self._pool)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Serviço de cálculo geográfico reiniciado. Tente novamente em instantes.",
+                headers={"Retry-After": "1"}
+            )
+        except asyncio.TimeoutError:
+            logger.error(f"Tempo esgotado ({timeout_s}s) em {getattr(func, '__name__', func)}")
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="Tempo limite excedido no cálculo geográfico."
+            )
+        except ErroComputacao as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        if not em_processo:
+            return resultado
+        resultado, pid, estatisticas = resultado
+        self._estatisticas[pid] = estatisticas
+        return resultado
+
+    def estatisticas_cache(self) -> Dict[str, Any]:
+        """Cache de áreas somado entre os processos que fazem os cálculos, e a leitura de cada um (por pid)."""
+        workers = dict(self._estatisticas) if self._pool is not None else {os.getpid(): _estatisticas_processo()}
+        total: Dict[str, int] = {}
+        for estatisticas in workers.values():
+            for chave, valor in estatisticas.items():
+                total[chave] = total.get(chave, 0) + valor
+        return {'total': total, 'workers': {str(pid): estatisticas for pid, estatisticas in workers.items()}}
+
+
+servico_computacao = ServicoComputacao(settings.COMPUTE_WORKERS, settings.COMPUTE_TIMEOUT_S)
+# Trabalho pesado e raro (variantes simplificadas da camada inteira) em processos próprios, sem aquecimento,
+# para não ocupar os workers de que dependem criação de apiários, tiles e consultas
+servico_variantes = ServicoComputacao(
+    settings.VARIANT_WORKERS, settings.INGEST_TIMEOUT_S, nome='variantes', aquecer=False
+)
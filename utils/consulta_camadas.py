@@ -0,0 +1,143 @@
+"""
+Consultas leves às camadas vetoriais para /maps/content: recorte por bbox, filtro de
+classes e simplificação.
+
+A consulta lê só a janela do bbox no arquivo indexado da camada (FlatGeobuf de exibição,
+com todas as feições e atributos do original) e devolve as feições que o intersectam
+como GeoJSON (EPSG:4326). Com `zoom`, a tolerância de
+simplificação é a de um pixel naquele zoom e a camada simplificada inteira fica em
+cache em disco (`<diretorio>/<camada>/<versão>/z<zoom>.fgb`, também com índice
+espacial), de modo que as consultas seguintes no mesmo zoom só leem a janela pedida.
+Cada variante é gerada uma única vez por (camada, versão, zoom): requisições simultâneas
+aguardam a mesma geração, que roda no pool próprio de utils.computacao.servico_variantes.
+"""
+import asyncio
+import os
+import shutil
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from utils.flatgeobuf import gravar_fgb
+from utils.geometria import CRS_GEO
+from utils.http_objetos import comprimir
+from utils.tiles_mvt import ZOOM_MAXIMO
+
+# Largura do tile de referência em pixels usada para converter zoom em tolerância
+PIXELS_TILE = 256
+
+
+def tolerancia_zoom(zoom: int) -> float:
+    """Tolerância (graus) equivalente a um pixel no zoom informado."""
+    return 360.0 / (PIXELS_TILE * 2 ** zoom)
+
+
+def interpretar_bbox(texto: str) -> Tuple[float, float, float, float]:
+    """Converte 'min_lon,min_lat,max_lon,max_lat' em tupla; ValueError se o formato ou os limites forem inválidos."""
+    partes = [float(p) for p in texto.split(',')]
+    if len(partes) != 4:
+        raise ValueError('bbox deve ter 4 valores: min_lon,min_lat,max_lon,max_lat')
+    min_lon, min_lat, max_lon, max_lat = partes
+    if not (-180 <= min_lon < max_lon <= 180 and -90 <= min_lat < max_lat <= 90):
+        raise ValueError('bbox fora dos limites de EPSG:4326')
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def zoom_valido(zoom: int) -> bool:
+    return 0 <= zoom <= ZOOM_MAXIMO
+
+
+def _ler(caminho: str, bbox: Optional[Tuple[float, float, float, float]] = None) -> gpd.GeoDataFrame:
+    gdf = gpd.read_file(caminho, bbox=bbox)
+    if gdf.crs is None:
+        gdf = gdf.set_crs(CRS_GEO)
+    return gdf[~gdf.geometry.isna() & ~gdf.geometry.is_empty].to_crs(CRS_GEO)
+
+
+def gerar_variante(caminho: str, destino: str, tolerancia: float) -> None:
+    """Grava em `destino` a camada inteira simplificada (preservando a topologia de cada feição)."""
+    gdf = _ler(caminho)
+    geometrias = shapely.simplify(np.asarray(gdf.geometry.values), tolerancia, preserve_topology=True)
+    gdf = gdf.set_geometry(gpd.GeoSeries(geometrias, index=gdf.index, crs=CRS_GEO))
+    gravar_fgb(gdf, destino)
+
+
+def consultar(caminho: str, bbox: Optional[Tuple[float, float, float, float]] = None,
+              classes: Optional[List[str]] = None, tolerancia: Optional[float] = None) -> str:
+    """FeatureCollection (texto GeoJSON) das feições que intersectam o bbox, das classes pedidas."""
+    gdf = _ler(caminho, bbox)
+    if classes and 'CLASSE' in gdf.columns:
+        gdf = gdf[gdf['CLASSE'].isin(classes)]
+    if bbox is not None and not gdf.empty:
+        # O filtro do arquivo é pelo bbox de cada feição; aqui fica só quem de fato intersecta
+        gdf = gdf[shapely.intersects(np.asarray(gdf.geometry.values), shapely.box(*bbox))]
+    if tolerancia and not gdf.empty:
+        geometrias = shapely.simplify(np.asarray(gdf.geometry.values), tolerancia, preserve_topology=True)
+        gdf = gdf.set_geometry(gpd.GeoSeries(geometrias, index=gdf.index, crs=CRS_GEO))
+    return gdf.to_json(drop_id=True)
+
+
+def consultar_corpo(caminho: str, bbox: Optional[Tuple[float, float, float, float]] = None,
+                    classes: Optional[List[str]] = None, tolerancia: Optional[float] = None,
+                    gzip: bool = False) -> bytes:
+    """Resposta de consultar já codificada (e comprimida em gzip), para sair pronta do pool de computação."""
+    corpo = consultar(caminho, bbox, classes, tolerancia).encode('utf-8')
+    return b''.join(comprimir(iter([corpo]))) if gzip else corpo
+
+
+class CacheVariantes:
+    """Pastas das variantes simplificadas por (camada, zoom), separadas pela versão da origem."""
+
+    def __init__(self, diretorio: str):
+        self._diretorio = diretorio
+        self._versoes: Set[Tuple[str, str]] = set()
+        self._lock = threading.Lock()
+        # destino -> geração em andamento (usado só no event loop da API)
+        self._em_andamento: Dict[str, asyncio.Future] = {}
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _pasta(self, camada: str) -> str:
+        return os.path.join(self._diretorio, os.path.basename(camada))
+
+    def caminho(self, camada: str, versao: str, zoom: int) -> str:
+        """Caminho da variante; na primeira vez de uma versão, cria a pasta e descarta as versões antigas."""
+        pasta = self._pasta(camada)
+        with self._lock:
+            nova = (camada, versao) not in self._versoes
+            if nova:
+                self._versoes = {v for v in self._versoes if v[0] != camada}
+                self._versoes.add((camada, versao))
+        if nova:
+            for existente in os.listdir(pasta) if os.path.isdir(pasta) else []:
+                if existente != versao:
+                    shutil.rmtree(os.path.join(pasta, existente), ignore_errors=True)
+        os.makedirs(os.path.join(pasta, versao), exist_ok=True)
+        return os.path.join(pasta, versao, f'z{zoom}.fgb')
+
+    async def garantir(self, origem: str, destino: str, zoom: int) -> None:
+        """Gera a variante em `destino` se ela ainda não existir, compartilhando uma geração já em andamento."""
+        from utils.computacao import servico_variantes
+        if os.path.exists(destino):
+            return
+        tarefa = self._em_andamento.get(destino)
+        if tarefa is None:
+            tarefa = asyncio.ensure_future(
+                servico_variantes.executar(gerar_variante, origem, destino, tolerancia_zoom(zoom))
+            )
+            self._em_andamento[destino] = tarefa
+            tarefa.add_done_callback(lambda _: self._em_andamento.pop(destino, None))
+        # Cliente que desiste não cancela a geração que os demais aguardam
+        await asyncio.shield(tarefa)
+
+    def invalidar(self, camada: Optional[str] = None) -> None:
+        """Remove as variantes da camada informada (ou de todas)."""
+        with self._lock:
+            self._versoes = {v for v in self._versoes if camada is not None and v[0] != camada}
+        if camada is None:
+            for existente in os.listdir(self._diretorio):
+                shutil.rmtree(os.path.join(self._diretorio, existente), ignore_errors=True)
+            return
+        shutil.rmtree(self._pasta(camada), ignore_errors=True)
@@ -0,0 +1,157 @@
+"""
+Consultas dos dashboards (GET /dashboard e GET /users/dashboard).
+
+Nada é carregado como entidade ORM: as linhas são projetadas só nas colunas pedidas
+(`fields`) e paginadas por chave (id crescente, cursor opaco com o último id de cada
+tipo), então o custo de uma página não depende do tamanho da frota. Há três modos:
+    - page: uma página de apiários e meliponários e o `next_cursor`;
+    - summary: contagens, colmeias e capacidade por tipo, bioma (e usuário), lidas da tabela
+      de resumo mantida pelos cadastros (utils.resumo_dashboard);
+    - stream: todas as linhas em NDJSON, lidas em lotes por chave numa sessão própria.
+"""
+import base64
+import binascii
+import json
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from core.database import Session
+from models.apiary import Apiary
+from models.meliponary import Meliponary
+from schemas.apiary_schema import ApiarySchema
+from schemas.meliponary_schema import MeliponarySchema
+from utils import resumo_dashboard
+
+MODOS = ('page', 'summary', 'stream')
+LIMITE_PADRAO = 100
+LIMITE_MAXIMO = 1000
+# Linhas por consulta no modo stream
+LOTE_FLUXO = 500
+
+# Chave na resposta -> (modelo, schema de saída, chave no cursor, tipo na tabela de resumo)
+ENTIDADES = {
+    'apiarios': (Apiary, ApiarySchema, 'a', 'apiario'),
+    'meliponarios': (Meliponary, MeliponarySchema, 'm', 'meliponario'),
+}
+
+
+def _erro(detalhe: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detalhe)
+
+
+def interpretar_entidades(texto: Optional[str]) -> List[str]:
+    """'apiarios,meliponarios' (padrão: ambos) validado contra ENTIDADES."""
+    if not texto:
+        return list(ENTIDADES)
+    entidades = [e.strip() for e in texto.split(',') if e.strip()]
+    invalidas = [e for e in entidades if e not in ENTIDADES]
+    if invalidas or not entidades:
+        raise _erro(f"entity inválida: {', '.join(invalidas) or texto}. Use {', '.join(ENTIDADES)}.")
+    return entidades
+
+
+def interpretar_campos(texto: Optional[str], entidade: str) -> List[str]:
+    """Colunas pedidas em `fields` que existem na entidade (id sempre incluído, pois é a chave do cursor)."""
+    schema = ENTIDADES[entidade][1]
+    disponiveis = list(schema.model_fields)
+    if not texto:
+        return disponiveis
+    pedidos = [c.strip() for c in texto.split(',') if c.strip()]
+    desconhecidos = [c for c in pedidos if c not in ENTIDADES['apiarios'][1].model_fields
+                     and c not in ENTIDADES['meliponarios'][1].model_fields]
+    if desconhecidos:
+        raise _erro(f"fields desconhecidos: {', '.join(desconhecidos)}")
+    # Campos de um só tipo (ex.: especieAbelha) são ignorados no outro
+    return ['id'] + [c for c in pedidos if c in disponiveis and c != 'id']
+
+
+def decodificar_cursor(cursor: Optional[str]) -> Dict[str, int]:
+    if not cursor:
+        return {}
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return {chave: int(valor) for chave, valor in dados.items()}
+    except (binascii.Error, ValueError, TypeError, AttributeError):
+        raise _erro("cursor inválido")
+
+
+def codificar_cursor(posicoes: Dict[str, int]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(posicoes, separators=(',', ':')).encode()).decode()
+
+
+def _consulta(entidade: str, campos: Sequence[str], user_id: Optional[int], apos: Optional[int], limite: int):
+    model = ENTIDADES[entidade][0]
+    consulta = select(*[getattr(model, c) for c in campos])
+    if user_id is not None:
+        consulta = consulta.filter(model.userId == user_id)
+    if apos is not None:
+        consulta = consulta.filter(model.id > apos)
+    return consulta.order_by(model.id).limit(limite)
+
+
+async def pagina(session: AsyncSession, user_id: Optional[int], entidades: Sequence[str], campos: Optional[str],
+                 limite: int, cursor: Optional[str]) -> dict:
+    """Uma página por entidade a partir do cursor; next_cursor é None quando todas se esgotaram."""
+    posicoes = decodificar_cursor(cursor)
+    resposta, continua = {}, False
+    for entidade in entidades:
+        chave = ENTIDADES[entidade][2]
+        result = await session.execute(
+            _consulta(entidade, interpretar_campos(campos, entidade), user_id, posicoes.get(chave), limite)
+        )
+        linhas = [dict(linha._mapping) for linha in result.all()]
+        resposta[entidade] = linhas
+        if linhas:
+            posicoes[chave] = linhas[-1]['id']
+        continua = continua or len(linhas) == limite
+    resposta['next_cursor'] = codificar_cursor(posicoes) if continua else None
+    return resposta
+
+
+async def resumo(session: AsyncSession, user_id: Optional[int], entidades: Sequence[str]) -> dict:
+    """Registros, colmeias e capacidade por tipo e bioma (e por usuário no dashboard global), da tabela de resumo."""
+    tipos = {entidade: ENTIDADES[entidade][3] for entidade in entidades}
+    totais = await resumo_dashboard.ler(session, user_id, list(tipos.values()))
+    return {entidade: totais[tipo] for entidade, tipo in tipos.items()}
+
+
+async def fluxo(user_id: Optional[int], entidades: Sequence[str], campos: Optional[str]) -> AsyncIterator[bytes]:
+    """
+    Linhas NDJSON ({"tipo": entidade, ...colunas}) de todas as entidades, em lotes de LOTE_FLUXO por chave.
+    Usa sessão própria: a do endpoint é fechada antes de a resposta terminar de ser enviada.
+    """
+    colunas = {entidade: interpretar_campos(campos, entidade) for entidade in entidades}
+    async with Session() as session:
+        for entidade in entidades:
+            apos = None
+            while True:
+                result = await session.execute(_consulta(entidade, colunas[entidade], user_id, apos, LOTE_FLUXO))
+                linhas = result.all()
+                for linha in linhas:
+                    dados = {'tipo': entidade, **jsonable_encoder(dict(linha._mapping))}
+                    yield (json.dumps(dados, ensure_ascii=False) + '\n').encode('utf-8')
+                if len(linhas) < LOTE_FLUXO:
+                    break
+                apos = linhas[-1].id
+
+
+async def responder(session: AsyncSession, user_id: Optional[int], modo: str, entidade: Optional[str],
+                    campos: Optional[str], limite: int, cursor: Optional[str]):
+    """Valida os parâmetros (antes de qualquer envio) e atende o modo pedido."""
+    if modo not in MODOS:
+        raise _erro(f"mode inválido: {modo}. Use {', '.join(MODOS)}.")
+    if not 1 <= limite <= LIMITE_MAXIMO:
+        raise _erro(f"limit deve estar entre 1 e {LIMITE_MAXIMO}.")
+    entidades = interpretar_entidades(entidade)
+    for nome in entidades:
+        interpretar_campos(campos, nome)
+    if modo == 'summary':
+        return await resumo(session, user_id, entidades)
+    if modo == 'stream':
+        return StreamingResponse(fluxo(user_id, entidades, campos), media_type='application/x-ndjson')
+    return await pagina(session, user_id, entidades, campos, limite, cursor)
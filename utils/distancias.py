@@ -0,0 +1,29 @@
+"""
+Kernels vetorizados (NumPy) de distância geodésica e agregação de colmeias por raio.
+"""
+import numpy as np
+
+RAIO_TERRA_KM = 6371.0088  # Raio médio da Terra em km
+
+
+def haversine_km(latitude: float, longitude: float, latitudes, longitudes) -> np.ndarray:
+    """Distância (km) do ponto (latitude, longitude) até cada coordenada dos arrays."""
+    lat1 = np.radians(float(latitude))
+    lon1 = np.radians(float(longitude))
+    lat2 = np.radians(np.asarray(latitudes, dtype=float))
+    lon2 = np.radians(np.asarray(longitudes, dtype=float))
+    a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+    return 2.0 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def mascara_no_raio(latitude: float, longitude: float, latitudes, longitudes, raio_km: float) -> np.ndarray:
+    """Máscara booleana das coordenadas a até raio_km do ponto."""
+    return haversine_km(latitude, longitude, latitudes, longitudes) <= float(raio_km)
+
+
+def somar_colmeias_mascaradas(latitude: float, longitude: float, latitudes, longitudes, colmeias, raio_km: float) -> int:
+    """Soma das colmeias das coordenadas a até raio_km do ponto."""
+    colmeias = np.asarray(colmeias, dtype=np.int64)
+    if colmeias.size == 0:
+        return 0
+    return int(colmeias[mascara_no_raio(latitude, longitude, latitudes, longitudes, raio_km)].sum())
@@ -0,0 +1,104 @@
+"""
+Forma binária (FlatGeobuf) das camadas de vegetação.
+
+No upload, cada GeoJSON ganha no bucket um `.fgb` de mesmo nome, em EPSG:4326 e com o
+R-tree empacotado do formato. Os leitores abrem só a janela (bbox) em torno do buffer
+consultado, sem analisar o JSON inteiro nem manter a camada em memória.
+
+A ingestão publica duas formas: `<nome>.fgb`, só com CLASSE e as classes usadas nos
+cálculos, e `<nome>.exibicao.fgb`, com todas as feições e atributos do original, que
+alimenta os vector tiles e as consultas por bbox de /maps.
+"""
+import os
+import uuid
+from typing import Dict, Iterable, List
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from utils.geometria import CRS_GEO, CRS_METRICO, acumular_areas, areas_intersecao_lote, projetar_para_geo
+
+EXTENSAO_FGB = '.fgb'
+SUFIXO_EXIBICAO = '.exibicao'
+
+
+def nome_fgb(nome: str) -> str:
+    """Nome do objeto FlatGeobuf correspondente a uma camada GeoJSON."""
+    return os.path.splitext(nome)[0] + EXTENSAO_FGB
+
+
+def nome_fgb_exibicao(nome: str) -> str:
+    """Nome do objeto FlatGeobuf com todos os atributos da camada (tiles e consultas de /maps)."""
+    return os.path.splitext(nome)[0] + SUFIXO_EXIBICAO + EXTENSAO_FGB
+
+def gravar_fgb(gdf: gpd.GeoDataFrame, destino: str) -> None:
+    """Grava a camada em FlatGeobuf (EPSG:4326, com índice espacial) de forma atômica."""
+    if gdf.crs is None:
+        gdf = gdf.set_crs(CRS_GEO)
+    gdf = gdf[~gdf.geometry.isna() & ~gdf.geometry.is_empty].to_crs(CRS_GEO)
+    temporario = f'{destino}.{uuid.uuid4().hex}.tmp'
+    try:
+        gdf.to_file(temporario, driver='FlatGeobuf', SPATIAL_INDEX='YES')
+        os.replace(temporario, destino)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+def bbox_geo(geometria_metrica) -> tuple:
+    """Bbox (EPSG:4326) que contém a geometria (ou o array de geometrias) em CRS métrico."""
+    coordenadas = shapely.get_coordinates(geometria_metrica)
+    lons, lats = projetar_para_geo(coordenadas[:, 0], coordenadas[:, 1])
+    return float(np.min(lons)), float(np.min(lats)), float(np.max(lons)), float(np.max(lats))
+
+
+def ler_janela(caminho: str, geometria_metrica=None) -> gpd.GeoDataFrame:
+    """Lê o arquivo (restrito ao bbox da geometria, quando informada) e o devolve em CRS métrico."""
+    bbox = bbox_geo(geometria_metrica) if geometria_metrica is not None else None
+    gdf = gpd.read_file(caminho, bbox=bbox)
+    if gdf.crs is None:
+        gdf = gdf.set_crs(CRS_GEO)
+    return gdf.to_crs(CRS_METRICO)
+
+
+def areas_por_classe(caminhos: Iterable[str], classes: Iterable[str], buffer) -> Dict[str, float]:
+    """
+    Área (ha) de cada classe de vegetação dentro do buffer (CRS métrico), lendo só a janela do buffer em cada arquivo.
+    Só aparecem no resultado as classes com alguma interseção não vazia.
+    """
+    classes = list(classes)
+    shapely.prepare(buffer)
+    areas: Dict[str, float] = {}
+    for caminho in caminhos:
+        gdf = ler_janela(caminho, buffer)
+        if gdf.empty or 'CLASSE' not in gdf.columns:
+            continue
+        gdf = gdf[gdf['CLASSE'].isin(classes)]
+        recortes = shapely.intersection(np.asarray(gdf.geometry.values), buffer)
+        area_ha = shapely.area(recortes) / 10000.0
+        for classe, area in zip(gdf['CLASSE'], area_ha):
+            if area > 0:
+                areas[classe] = areas.get(classe, 0.0) + float(area)
+    return areas
+
+
+def areas_por_classe_lote(caminhos: Iterable[str], classes: Iterable[str], buffers) -> List[Dict[str, float]]:
+    """
+    areas_por_classe de vários buffers: cada arquivo é lido uma vez, na janela que contém todos eles,
+    e as interseções saem de uma consulta STRtree por classe.
+    """
+    classes = list(classes)
+    buffers = np.asarray(buffers, dtype=object)
+    areas: List[Dict[str, float]] = [{} for _ in range(len(buffers))]
+    if len(buffers) == 0:
+        return areas
+    for caminho in caminhos:
+        gdf = ler_janela(caminho, buffers)
+        if gdf.empty or 'CLASSE' not in gdf.columns:
+            continue
+        for classe in classes:
+            geoms = np.asarray(gdf.geometry.values[(gdf['CLASSE'] == classe).to_numpy()])
+            if len(geoms):
+                acumular_areas(areas, classe, areas_intersecao_lote(shapely.STRtree(geoms), buffers))
+    return areas
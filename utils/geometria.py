@@ -0,0 +1,106 @@
+"""
+Operações geométricas vetorizadas compartilhadas: reprojeção de coordenadas
+para o CRS métrico e construção de buffers circulares em lote.
+"""
+import threading
+from typing import Dict, List, Sequence, Union
+
+import numpy as np
+import shapely
+from pyproj import Transformer
+
+CRS_GEO = "EPSG:4326"
+CRS_METRICO = "EPSG:31983"
+
+# Transformer do pyproj não é thread-safe; mantém uma instância por thread
+_local = threading.local()
+
+
+def _transformador(inverso: bool = False) -> Transformer:
+    atributo = 'inverso' if inverso else 'direto'
+    transformador = getattr(_local, atributo, None)
+    if transformador is None:
+        origem, destino = (CRS_METRICO, CRS_GEO) if inverso else (CRS_GEO, CRS_METRICO)
+        transformador = Transformer.from_crs(origem, destino, always_xy=True)
+        setattr(_local, atributo, transformador)
+    return transformador
+
+
+def projetar_para_metrico(longitudes, latitudes):
+    """Reprojeta arrays de longitude/latitude (EPSG:4326) para x/y em metros (EPSG:31983) numa única chamada."""
+    lon = np.asarray(longitudes, dtype=float)
+    lat = np.asarray(latitudes, dtype=float)
+    return _transformador().transform(lon, lat)
+
+
+def projetar_para_geo(xs, ys):
+    """Reprojeta arrays x/y (EPSG:31983) de volta para longitude/latitude (EPSG:4326)."""
+    return _transformador(inverso=True).transform(np.asarray(xs, dtype=float), np.asarray(ys, dtype=float))
+
+
+def buffers_metricos(longitudes, latitudes, raios_km: Union[float, Sequence[float]]) -> np.ndarray:
+    """Buffers circulares (CRS métrico) em torno de cada ponto, com raio escalar ou por ponto (km)."""
+    x, y = projetar_para_metrico(longitudes, latitudes)
+    raios_m = np.broadcast_to(np.asarray(raios_km, dtype=float) * 1000.0, np.shape(x))
+    # quad_segs=16 reproduz o padrão de BaseGeometry.buffer usado anteriormente
+    return shapely.buffer(shapely.points(x, y), raios_m, quad_segs=16)
+
+
+def buffer_metrico(longitude: float, latitude: float, raio_km: float):
+    """Buffer circular (CRS métrico) em torno de um único ponto."""
+    return buffers_metricos([float(longitude)], [float(latitude)], raio_km)[0]
+
+
+def construir_buffers_existentes(longitudes, latitudes, raios_km, colmeias) -> List[dict]:
+    """
+    Monta a lista de buffers existentes no formato esperado por process_apicultor/process_meliponicultor
+    ({"buffer": geometria métrica, "colmeias": int}) com reprojeção e buffer em lote.
+    """
+    if len(longitudes) == 0:
+        return []
+    buffers = buffers_metricos(longitudes, latitudes, raios_km)
+    return [{"buffer": buffer, "colmeias": int(qtd)} for buffer, qtd in zip(buffers, colmeias)]
+
+
+def somar_colmeias_intersectando(buffers_existentes: List[dict], buffer) -> int:
+    """Soma as colmeias dos buffers existentes que intersectam o buffer informado (teste vetorizado)."""
+    if not buffers_existentes:
+        return 0
+    geometrias = np.array([b['buffer'] for b in buffers_existentes], dtype=object)
+    colmeias = np.array([int(b['colmeias']) for b in buffers_existentes], dtype=np.int64)
+    return int(colmeias[shapely.intersects(geometrias, buffer)].sum())
+
+
+def somar_colmeias_intersectando_lote(buffers_existentes: List[dict], buffers) -> np.ndarray:
+    """
+    Versão em lote de somar_colmeias_intersectando: para cada buffer informado, a soma das colmeias
+    dos buffers existentes que o intersectam (uma consulta STRtree para todos os pares).
+    """
+    buffers = np.asarray(buffers, dtype=object)
+    totais = np.zeros(len(buffers), dtype=np.int64)
+    if not buffers_existentes or len(buffers) == 0:
+        return totais
+    geometrias = np.array([b['buffer'] for b in buffers_existentes], dtype=object)
+    colmeias = np.array([int(b['colmeias']) for b in buffers_existentes], dtype=np.int64)
+    novos, existentes = shapely.STRtree(geometrias).query(buffers, predicate='intersects')
+    np.add.at(totais, novos, colmeias[existentes])
+    return totais
+
+
+def areas_intersecao_lote(arvore: shapely.STRtree, buffers) -> np.ndarray:
+    """Área (m²) de cada buffer coberta pelas geometrias da árvore (uma consulta STRtree para todos os pares)."""
+    buffers = np.asarray(buffers, dtype=object)
+    totais = np.zeros(len(buffers), dtype=float)
+    if len(buffers) == 0:
+        return totais
+    alvos, candidatos = arvore.query(buffers, predicate='intersects')
+    if len(alvos):
+        recortes = shapely.intersection(arvore.geometries.take(candidatos), buffers[alvos])
+        np.add.at(totais, alvos, shapely.area(recortes))
+    return totais
+
+
+def acumular_areas(areas: List[Dict[str, float]], classe: str, totais_m2: np.ndarray) -> None:
+    """Soma (em ha) as áreas positivas de `totais_m2` na classe do dicionário de cada buffer."""
+    for i in np.flatnonzero(totais_m2 > 0):
+        areas[i][classe] = areas[i].get(classe, 0.0) + float(totais_m2[i]) / 10000.0
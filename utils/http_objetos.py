@@ -0,0 +1,89 @@
+"""
+Entrega de objetos do MinIO por HTTP sem materializar o conteúdo em memória.
+
+Os bytes do objeto passam direto, em blocos, para um StreamingResponse. Há suporte a
+validação condicional (ETag / Last-Modified → 304), a um único intervalo de bytes
+(Range → 206 / 416) e a gzip. O gzip é servido a partir do objeto pré-comprimido
+`<nome>.gz` quando ele corresponde à versão atual, ou é comprimido em fluxo.
+"""
+import re
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Iterator, Optional, Tuple
+
+from minio import Minio
+
+TAMANHO_BLOCO = 64 * 1024
+EXTENSAO_GZIP = '.gz'
+# Metadado gravado no objeto .gz com o ETag do original que o gerou
+METADADO_ORIGEM = 'origem-etag'
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def nome_gzip(nome: str) -> str:
+    return nome + EXTENSAO_GZIP
+
+
+def http_date(instante) -> str:
+    return formatdate(instante.timestamp(), usegmt=True)
+
+
+def nao_modificado(headers, etag: str, ultima_modificacao) -> bool:
+    """Avalia If-None-Match (prioritário) e If-Modified-Since."""
+    if_none_match = headers.get('if-none-match')
+    if if_none_match is not None:
+        etiquetas = [t.strip().removeprefix('W/') for t in if_none_match.split(',')]
+        return '*' in etiquetas or etag in etiquetas
+    if_modified_since = headers.get('if-modified-since')
+    if if_modified_since and ultima_modificacao is not None:
+        try:
+            return int(ultima_modificacao.timestamp()) <= int(parsedate_to_datetime(if_modified_since).timestamp())
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def intervalo(cabecalho: Optional[str], tamanho: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta um Range de intervalo único. Devolve (início, fim) inclusivos, None quando o cabeçalho
+    não se aplica (ausente, múltiplos intervalos ou sintaxe não suportada) e levanta ValueError se insatisfazível.
+    """
+    if not cabecalho:
+        return None
+    encontrado = _RANGE.match(cabecalho.strip())
+    if not encontrado or (not encontrado.group(1) and not encontrado.group(2)):
+        return None
+    inicio, fim = encontrado.groups()
+    if not inicio:
+        # Sufixo: últimos N bytes
+        n = int(fim)
+        if n == 0:
+            raise ValueError('Range insatisfazível')
+        return max(tamanho - n, 0), tamanho - 1
+    inicio = int(inicio)
+    fim = min(int(fim), tamanho - 1) if fim else tamanho - 1
+    if inicio >= tamanho or fim < inicio:
+        raise ValueError('Range insatisfazível')
+    return inicio, fim
+
+
+def ler_objeto(client: Minio, bucket: str, nome: str, offset: int = 0, length: int = 0) -> Iterator[bytes]:
+    """Blocos do objeto (ou do trecho offset/length), liberando a conexão ao final."""
+    response = client.get_object(bucket, nome, offset=offset, length=length)
+    try:
+        for bloco in response.stream(TAMANHO_BLOCO):
+            yield bloco
+    finally:
+        response.close()
+        response.release_conn()
+
+
+def comprimir(blocos: Iterator[bytes]) -> Iterator[bytes]:
+    """Comprime em gzip, em fluxo, uma sequência de blocos."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for bloco in blocos:
+        saida = compressor.compress(bloco)
+        if saida:
+            yield saida
+    yield compressor.flush()
@@ -0,0 +1,138 @@
+"""
+Índice espacial em memória das localizações de apiários e meliponários.
+
+Usado em instalações sem PostGIS: as coordenadas são projetadas para o CRS métrico
+e distribuídas numa grade (grid hash) de células quadradas. Uma consulta por raio
+visita apenas as células que cobrem o círculo, com custo proporcional ao número de
+vizinhos e não ao total de registros.
+
+O índice é aquecido a partir do banco no startup e atualizado incrementalmente pelos
+endpoints de criação/atualização/exclusão. Ele é local ao processo: com mais de um
+worker/réplica escrevendo, habilite PostGIS (POSTGIS_ENABLED) em vez deste índice.
+"""
+import math
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from utils.distancias import mascara_no_raio
+from utils.geometria import projetar_para_metrico
+
+TAMANHO_CELULA_M = 5000.0
+
+
+class RegistroColmeia(NamedTuple):
+    id: int
+    latitude: str
+    longitude: str
+    quantidadeColmeias: str
+    especieAbelha: Optional[str]
+    raio_km: float
+    x: float
+    y: float
+
+
+class IndiceColmeias:
+    """Grid hash de registros (apiários ou meliponários) em coordenadas métricas."""
+
+    def __init__(self, tamanho_celula_m: float = TAMANHO_CELULA_M):
+        self._tamanho = float(tamanho_celula_m)
+        self._registros: Dict[int, RegistroColmeia] = {}
+        self._celulas: Dict[Tuple[int, int], Set[int]] = {}
+        self._lock = threading.RLock()
+        self.pronto = False
+
+    def _celula(self, x: float, y: float) -> Tuple[int, int]:
+        return int(math.floor(x / self._tamanho)), int(math.floor(y / self._tamanho))
+
+    def _inserir_registro(self, registro: RegistroColmeia) -> None:
+        self._registros[registro.id] = registro
+        self._celulas.setdefault(self._celula(registro.x, registro.y), set()).add(registro.id)
+
+    def _remover_registro(self, id: int) -> None:
+        registro = self._registros.pop(id, None)
+        if registro is None:
+            return
+        celula = self._celula(registro.x, registro.y)
+        ids = self._celulas.get(celula)
+        if ids is not None:
+            ids.discard(id)
+            if not ids:
+                del self._celulas[celula]
+
+    @staticmethod
+    def _criar_registros(linhas: List, raios_km: List[float]) -> List[RegistroColmeia]:
+        if not linhas:
+            return []
+        xs, ys = projetar_para_metrico([float(l.longitude) for l in linhas], [float(l.latitude) for l in linhas])
+        return [
+            RegistroColmeia(
+                id=l.id, latitude=l.latitude, longitude=l.longitude,
+                quantidadeColmeias=l.quantidadeColmeias, especieAbelha=getattr(l, 'especieAbelha', None),
+                raio_km=float(raio), x=float(x), y=float(y)
+            )
+            for l, raio, x, y in zip(linhas, raios_km, xs, ys)
+        ]
+
+    def carregar(self, linhas: Iterable, raios_km: Iterable[float]) -> None:
+        """Substitui todo o conteúdo do índice pelas linhas informadas (com o raio de voo de cada uma) e o marca como pronto."""
+        registros = self._criar_registros(list(linhas), list(raios_km))
+        with self._lock:
+            self._registros = {}
+            self._celulas = {}
+            for registro in registros:
+                self._inserir_registro(registro)
+            self.pronto = True
+
+    def inserir(self, linha, raio_km: float) -> None:
+        """Insere ou substitui um registro (objeto com id, latitude, longitude, quantidadeColmeias[, especieAbelha])."""
+        registros = self._criar_registros([linha], [raio_km])
+        with self._lock:
+            self._remover_registro(linha.id)
+            self._inserir_registro(registros[0])
+
+    def remover(self, id: int) -> None:
+        with self._lock:
+            self._remover_registro(id)
+
+    def consultar_raio(self, longitude: float, latitude: float, raio_km: float) -> List[RegistroColmeia]:
+        """Registros a até raio_km (distância geodésica) da coordenada."""
+        xs, ys = projetar_para_metrico([float(longitude)], [float(latitude)])
+        x, y = float(xs[0]), float(ys[0])
+        # Margem nas células para o fator de escala do EPSG:31983 longe do meridiano central (até ~1.13 no Brasil)
+        alcance_m = float(raio_km) * 1000.0 * 1.2
+        cx0, cy0 = self._celula(x - alcance_m, y - alcance_m)
+        cx1, cy1 = self._celula(x + alcance_m, y + alcance_m)
+        with self._lock:
+            candidatos = [
+                self._registros[id]
+                for cx in range(cx0, cx1 + 1)
+                for cy in range(cy0, cy1 + 1)
+                for id in self._celulas.get((cx, cy), ())
+            ]
+        if not candidatos:
+            return []
+        dentro = mascara_no_raio(
+            float(latitude), float(longitude),
+            [float(r.latitude) for r in candidatos], [float(r.longitude) for r in candidatos],
+            raio_km
+        )
+        return [r for r, ok in zip(candidatos, dentro) if ok]
+
+    def existe_no_ponto(self, longitude: float, latitude: float) -> bool:
+        """Verifica se há registro exatamente na coordenada (comparação dos valores informados)."""
+        return any(
+            float(r.longitude) == float(longitude) and float(r.latitude) == float(latitude)
+            for r in self.consultar_raio(longitude, latitude, 0.001)
+        )
+
+    def __len__(self) -> int:
+        return len(self._registros)
+
+
+indice_apiarios = IndiceColmeias()
+indice_meliponarios = IndiceColmeias()
+
+
+def indice_para(model) -> IndiceColmeias:
+    """Índice correspondente ao modelo (Apiary ou Meliponary)."""
+    return indice_meliponarios if hasattr(model, 'especieAbelha') else indice_apiarios
@@ -0,0 +1,195 @@
+"""
+Ingestão em segundo plano das camadas enviadas em /maps/upload/.
+
+Depois que o objeto chega ao MinIO, o registro em geomaps fica `pendente` e a ingestão
+roda fora da requisição (BackgroundTasks + pool de computação):
+
+    1. baixa a camada bruta (cache em disco do MinIO);
+    2. normaliza o CRS (sem CRS assume EPSG:4326) e descarta as classes nunca consultadas;
+    3. valida as geometrias e repara as inválidas uma única vez (make_valid, mantendo só as partes poligonais);
+    4. grava o FlatGeobuf limpo (EPSG:4326, com R-tree) no bucket e os tiles métricos em disco;
+       grava também `<nome>.exibicao.fgb` (todas as feições e atributos, para tiles e consultas
+       por bbox) e `<nome>.gz` (original comprimido) para /maps/content;
+    5. registra em geomaps os metadados de catálogo, o resultado e o status (`concluido` ou `erro`).
+
+O catálogo só entrega camadas `concluido` (ou registros anteriores à ingestão), e os
+leitores preferem tiles e FlatGeobuf, então os cálculos enxergam apenas dados já limpos.
+
+Uso (reprocessar registros existentes): python -m utils.ingestao [map_id ...]
+"""
+import gzip
+import logging
+import os
+import shutil
+import tempfile
+from typing import Dict, Iterable, Tuple
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from minio.error import S3Error
+
+from core.configs import settings
+from core.database import Session
+from models.maps import Maps
+from utils.catalogo import descrever_camada, nome_objeto
+from utils.computacao import servico_computacao
+from utils.flatgeobuf import gravar_fgb, nome_fgb, nome_fgb_exibicao
+from utils.geometria import CRS_GEO, CRS_METRICO
+from utils.http_objetos import METADADO_ORIGEM, nome_gzip
+from utils.tiles_vegetacao import gravar_tiles
+from utils.vegetacao_store import CamadaVegetacao
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDENTE = 'pendente'
+STATUS_PROCESSANDO = 'processando'
+STATUS_CONCLUIDO = 'concluido'
+STATUS_ERRO = 'erro'
+
+# Tipos GEOS poligonais: Polygon (3) e MultiPolygon (6)
+_TIPOS_POLIGONAIS = (3, 6)
+
+
+def _reparar(geometrias: np.ndarray) -> np.ndarray:
+    """make_valid nas geometrias inválidas, mantendo só as partes poligonais (o resto vira None)."""
+    reparadas = shapely.make_valid(geometrias)
+    resultado = []
+    for geom in reparadas:
+        if shapely.get_type_id(geom) in _TIPOS_POLIGONAIS:
+            resultado.append(geom)
+            continue
+        partes = [p for p in shapely.get_parts(geom) if shapely.get_type_id(p) in _TIPOS_POLIGONAIS]
+        resultado.append(shapely.multipolygons(partes) if partes else None)
+    return np.array(resultado, dtype=object)
+
+
+def limpar_camada(gdf: gpd.GeoDataFrame, classes: Iterable[str]) -> Tuple[gpd.GeoDataFrame, Dict]:
+    """Normaliza CRS, filtra classes, repara geometrias e devolve a camada limpa (EPSG:4326) com as estatísticas."""
+    if 'CLASSE' not in gdf.columns:
+        raise ValueError("Camada sem coluna CLASSE.")
+    total = len(gdf)
+    if gdf.crs is None:
+        gdf = gdf.set_crs(CRS_GEO)
+    gdf = gdf[gdf['CLASSE'].isin(list(classes))][['CLASSE', 'geometry']]
+    gdf = gdf[~gdf.geometry.isna() & ~gdf.geometry.is_empty].to_crs(CRS_GEO)
+    geometrias = np.asarray(gdf.geometry.values)
+    invalidas = ~shapely.is_valid(geometrias)
+    if invalidas.any():
+        geometrias = geometrias.copy()
+        geometrias[invalidas] = _reparar(geometrias[invalidas])
+        gdf = gdf.set_geometry(gpd.GeoSeries(geometrias, index=gdf.index, crs=CRS_GEO))
+        gdf = gdf[~gdf.geometry.isna() & ~gdf.geometry.is_empty]
+    estatisticas = {
+        'feicoes_originais': total,
+        'feicoes_mantidas': int(len(gdf)),
+        'feicoes_reparadas': int(invalidas.sum()),
+    }
+    return gdf.reset_index(drop=True), estatisticas
+
+
+def ingerir_camada(nome: str, classes: Iterable[str]) -> Dict:
+    """
+    Etapa CPU-bound da ingestão (roda no pool de computação). Gera FlatGeobuf e tiles da camada limpa
+    e devolve os metadados de catálogo e as estatísticas.
+    """
+    from utils import MINIO_BUCKET_NAME, TILES_VEGETACAO_DIR, cache_camadas, minio_client
+
+    # ETag lido antes do download: se o objeto mudar no meio, o .gz fica marcado com a versão antiga e não é servido
+    try:
+        etag_origem = minio_client.stat_object(MINIO_BUCKET_NAME, nome).etag
+    except S3Error as e:
+        raise RuntimeError(f"MinIO error ao obter {nome}: {str(e)}")
+    caminho = cache_camadas.obter(nome)
+    bruta = gpd.read_file(caminho)
+    metadados = descrever_camada(bruta)
+    metadados['size_bytes'] = os.path.getsize(caminho)
+    limpa, estatisticas = limpar_camada(bruta, classes)
+    # bbox do catálogo passa a ser o da camada limpa (só classes consultadas)
+    metadados.update({k: v for k, v in descrever_camada(limpa).items() if k.startswith('bbox_')})
+
+    destino = nome_fgb(nome)
+    destino_exibicao = nome_fgb_exibicao(nome)
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(TILES_VEGETACAO_DIR)) as pasta:
+        caminho_fgb = os.path.join(pasta, os.path.basename(destino))
+        gravar_fgb(limpa, caminho_fgb)
+        caminho_exibicao = os.path.join(pasta, os.path.basename(destino_exibicao))
+        gravar_fgb(bruta, caminho_exibicao)
+        del bruta
+        caminho_gzip = os.path.join(pasta, os.path.basename(nome_gzip(nome)))
+        with open(caminho, 'rb') as origem, gzip.open(caminho_gzip, 'wb', compresslevel=9) as comprimido:
+            shutil.copyfileobj(origem, comprimido, 1024 * 1024)
+        try:
+            minio_client.fput_object(MINIO_BUCKET_NAME, destino, caminho_fgb, content_type='application/octet-stream')
+            minio_client.fput_object(
+                MINIO_BUCKET_NAME, destino_exibicao, caminho_exibicao, content_type='application/octet-stream'
+            )
+            minio_client.fput_object(
+                MINIO_BUCKET_NAME, nome_gzip(nome), caminho_gzip, content_type='application/gzip',
+                metadata={METADADO_ORIGEM: etag_origem}
+            )
+        except S3Error as e:
+            raise RuntimeError(f"MinIO error ao gravar derivados de {nome}: {str(e)}")
+
+    metrica = limpa.to_crs(CRS_METRICO)
+    camada = CamadaVegetacao(nome, {
+        classe: grupo.geometry.reset_index(drop=True) for classe, grupo in metrica.groupby('CLASSE')
+    })
+    estatisticas['tiles'] = gravar_tiles(camada, nome, TILES_VEGETACAO_DIR)
+    return {'metadados': metadados, 'estatisticas': estatisticas}
+
+
+async def _atualizar(session, mapa: Maps, **valores) -> None:
+    for campo, valor in valores.items():
+        setattr(mapa, campo, valor)
+    await session.commit()
+
+
+async def processar_mapa(map_id: int) -> None:
+    """Executa a ingestão do registro de geomaps, registrando o andamento no próprio registro."""
+    from utils import VEGETACAO_APICULTOR, VEGETACAO_MELIPONARIO, invalidar_camadas
+
+    classes = sorted(set(VEGETACAO_APICULTOR) | set(VEGETACAO_MELIPONARIO))
+    async with Session() as session:
+        mapa = await session.get(Maps, map_id)
+        if mapa is None:
+            return
+        nome = nome_objeto(mapa)
+        await _atualizar(session, mapa, ingest_status=STATUS_PROCESSANDO, ingest_progress=10, ingest_message=None)
+        try:
+            resultado = await servico_computacao.executar(
+                ingerir_camada, nome, classes, timeout_s=settings.INGEST_TIMEOUT_S
+            )
+        except Exception as e:
+            detalhe = getattr(e, 'detail', None) or str(e)
+            logger.error(f"Falha na ingestão da camada {nome}: {detalhe}")
+            await _atualizar(session, mapa, ingest_status=STATUS_ERRO, ingest_message=str(detalhe)[:500])
+            return
+        est = resultado['estatisticas']
+        await _atualizar(
+            session, mapa, **resultado['metadados'],
+            ingest_status=STATUS_CONCLUIDO, ingest_progress=100,
+            ingest_message=(
+                f"{est['feicoes_mantidas']} de {est['feicoes_originais']} feições mantidas, "
+                f"{est['feicoes_reparadas']} reparadas, {est['tiles']} tiles"
+            )
+        )
+    invalidar_camadas(nome)
+    logger.info(f"Camada {nome} ingerida: {est}")
+
+
+if __name__ == '__main__':
+    import asyncio
+    import sys
+    from sqlalchemy.future import select
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    async def _reprocessar(ids):
+        if not ids:
+            async with Session() as session:
+                ids = (await session.execute(select(Maps.id).order_by(Maps.id))).scalars().all()
+        for map_id in ids:
+            await processar_mapa(int(map_id))
+
+    asyncio.run(_reprocessar(sys.argv[1:]))
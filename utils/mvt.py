@@ -0,0 +1,173 @@
+"""
+Codificação de Mapbox Vector Tiles (especificação 2.1) sem dependências externas.
+
+Recebe geometrias shapely já em coordenadas de tile (0..extent, eixo y para baixo) e
+gera o protobuf do tile. Os anéis são reorientados (exterior com área positiva no
+sistema do tile) e as coordenadas arredondadas para inteiros, descartando os anéis
+que degeneram no arredondamento.
+"""
+import math
+import struct
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import shapely
+from shapely.geometry.polygon import orient
+
+EXTENT_PADRAO = 4096
+
+_PONTO, _LINHA, _POLIGONO = 1, 2, 3
+_MOVE_TO, _LINE_TO, _CLOSE_PATH = 1, 2, 7
+
+
+def _varint(valor: int) -> bytes:
+    saida = bytearray()
+    while True:
+        bits = valor & 0x7F
+        valor >>= 7
+        if valor:
+            saida.append(bits | 0x80)
+        else:
+            saida.append(bits)
+            return bytes(saida)
+
+
+def _zigzag(valor: int) -> int:
+    return (valor << 1) ^ (valor >> 63)
+
+
+def _campo(numero: int, tipo: int) -> bytes:
+    return _varint((numero << 3) | tipo)
+
+
+def _campo_varint(numero: int, valor: int) -> bytes:
+    return _campo(numero, 0) + _varint(valor)
+
+
+def _campo_bytes(numero: int, dados: bytes) -> bytes:
+    return _campo(numero, 2) + _varint(len(dados)) + dados
+
+
+def _campo_empacotado(numero: int, valores: Sequence[int]) -> bytes:
+    return _campo_bytes(numero, b''.join(_varint(v) for v in valores))
+
+
+def _comando(identificador: int, quantidade: int) -> int:
+    return (identificador & 0x7) | (quantidade << 3)
+
+
+def _valor(valor) -> Optional[bytes]:
+    """Mensagem Value do protobuf; None para valores vazios ou de tipo não suportado."""
+    if valor is None:
+        return None
+    if isinstance(valor, (bool, np.bool_)):
+        return _campo_varint(7, int(bool(valor)))
+    if isinstance(valor, (int, np.integer)):
+        return _campo_varint(6, _zigzag(int(valor)))
+    if isinstance(valor, (float, np.floating)):
+        if math.isnan(valor):
+            return None
+        return _campo(3, 1) + struct.pack('<d', float(valor))
+    return _campo_bytes(1, str(valor).encode('utf-8'))
+
+
+class _Cursor:
+    """Posição corrente do cursor de desenho (os comandos usam deslocamentos relativos)."""
+
+    def __init__(self):
+        self.x = 0
+        self.y = 0
+
+    def deslocamentos(self, pontos: np.ndarray) -> List[int]:
+        saida = []
+        for px, py in pontos:
+            saida.append(_zigzag(int(px) - self.x))
+            saida.append(_zigzag(int(py) - self.y))
+            self.x, self.y = int(px), int(py)
+        return saida
+
+
+def _pontos_inteiros(coordenadas: np.ndarray) -> np.ndarray:
+    pontos = np.rint(coordenadas).astype(np.int64)
+    if len(pontos) > 1:
+        # Remove repetições consecutivas criadas pelo arredondamento
+        pontos = pontos[np.concatenate([[True], (np.diff(pontos, axis=0) != 0).any(axis=1)])]
+    return pontos
+
+
+def _anel(cursor: _Cursor, coordenadas: np.ndarray, exterior: bool) -> List[int]:
+    pontos = _pontos_inteiros(coordenadas)
+    if len(pontos) > 1 and (pontos[0] == pontos[-1]).all():
+        pontos = pontos[:-1]
+    if len(pontos) < 3:
+        return []
+    x, y = pontos[:, 0], pontos[:, 1]
+    area = float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+    if area == 0 or (area > 0) != exterior:
+        return []
+    return ([_comando(_MOVE_TO, 1)] + cursor.deslocamentos(pontos[:1])
+            + [_comando(_LINE_TO, len(pontos) - 1)] + cursor.deslocamentos(pontos[1:])
+            + [_comando(_CLOSE_PATH, 1)])
+
+
+def _geometria(geom) -> Tuple[int, List[int]]:
+    """Tipo MVT e comandos de desenho da geometria (lista vazia se nada sobrar após o arredondamento)."""
+    cursor = _Cursor()
+    tipo = shapely.get_type_id(geom)
+    if tipo in (3, 6):  # Polygon, MultiPolygon
+        comandos = []
+        for poligono in shapely.get_parts(geom):
+            poligono = orient(poligono, sign=1.0)
+            exterior = _anel(cursor, shapely.get_coordinates(poligono.exterior), True)
+            if not exterior:
+                continue
+            comandos.extend(exterior)
+            for interior in poligono.interiors:
+                comandos.extend(_anel(cursor, shapely.get_coordinates(interior), False))
+        return _POLIGONO, comandos
+    if tipo in (0, 4):  # Point, MultiPoint
+        pontos = _pontos_inteiros(shapely.get_coordinates(geom))
+        if len(pontos) == 0:
+            return _PONTO, []
+        return _PONTO, [_comando(_MOVE_TO, len(pontos))] + cursor.deslocamentos(pontos)
+    if tipo in (1, 2, 5):  # LineString, LinearRing, MultiLineString
+        comandos = []
+        for linha in shapely.get_parts(geom):
+            pontos = _pontos_inteiros(shapely.get_coordinates(linha))
+            if len(pontos) < 2:
+                continue
+            comandos.extend([_comando(_MOVE_TO, 1)] + cursor.deslocamentos(pontos[:1])
+                            + [_comando(_LINE_TO, len(pontos) - 1)] + cursor.deslocamentos(pontos[1:]))
+        return _LINHA, comandos
+    return 0, []
+
+
+def codificar_camada(nome: str, geometrias: Iterable, propriedades: Iterable[Dict],
+                     extent: int = EXTENT_PADRAO) -> bytes:
+    """Mensagem Layer com as feições informadas; vazia (b'') quando nenhuma feição sobrevive."""
+    chaves: Dict[str, int] = {}
+    valores: Dict[bytes, int] = {}
+    feicoes = []
+    for geom, props in zip(geometrias, propriedades):
+        if geom is None or shapely.is_empty(geom):
+            continue
+        tipo, comandos = _geometria(geom)
+        if not comandos:
+            continue
+        tags = []
+        for chave, valor in props.items():
+            codificado = _valor(valor)
+            if codificado is None:
+                continue
+            tags.append(chaves.setdefault(chave, len(chaves)))
+            tags.append(valores.setdefault(codificado, len(valores)))
+        feicao = _campo_empacotado(2, tags) if tags else b''
+        feicao += _campo_varint(3, tipo) + _campo_empacotado(4, comandos)
+        feicoes.append(_campo_bytes(2, feicao))
+    if not feicoes:
+        return b''
+    camada = _campo_varint(15, 2) + _campo_bytes(1, nome.encode('utf-8')) + b''.join(feicoes)
+    camada += b''.join(_campo_bytes(3, chave.encode('utf-8')) for chave in chaves)
+    camada += b''.join(_campo_bytes(4, valor) for valor in valores)
+    camada += _campo_varint(5, extent)
+    return _campo_bytes(3, camada)
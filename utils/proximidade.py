@@ -0,0 +1,122 @@
+"""
+Consultas de proximidade de apiários e meliponários.
+
+Com PostGIS habilitado (settings.POSTGIS_ENABLED) as consultas são feitas no banco
+com ST_DWithin sobre a coluna geom (mantida por trigger a partir de latitude/longitude,
+ver migração 3c1f6a9d2b47). Sem PostGIS, usa o índice em memória de utils.indice_colmeias
+quando aquecido; caso contrário, apenas as colunas necessárias são carregadas e o filtro
+fica a cargo do chamador.
+"""
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from core.configs import settings
+from utils.indice_colmeias import indice_para
+
+_PONTO = "ST_SetSRID(ST_MakePoint(:lon, :lat), 4326)"
+
+
+def _colunas_sql(model) -> str:
+    colunas = ['id', 'latitude', 'longitude', '"quantidadeColmeias"']
+    if hasattr(model, 'especieAbelha'):
+        colunas.append('"especieAbelha"')
+    return ', '.join(colunas)
+
+
+def _colunas_orm(model) -> list:
+    colunas = [model.id, model.latitude, model.longitude, model.quantidadeColmeias]
+    if hasattr(model, 'especieAbelha'):
+        colunas.append(model.especieAbelha)
+    return colunas
+
+
+async def existe_no_ponto(session: AsyncSession, model, longitude: float, latitude: float) -> bool:
+    """Verifica se já existe registro do modelo (Apiary/Meliponary) exatamente na coordenada."""
+    if settings.POSTGIS_ENABLED:
+        result = await session.execute(
+            text(f"SELECT EXISTS (SELECT 1 FROM {model.__tablename__} WHERE geom ~= {_PONTO})"),
+            {"lon": float(longitude), "lat": float(latitude)}
+        )
+        return bool(result.scalar())
+    indice = indice_para(model)
+    if indice.pronto:
+        return indice.existe_no_ponto(longitude, latitude)
+    result = await session.execute(select(model.latitude, model.longitude))
+    return any(
+        float(lat) == float(latitude) and float(lon) == float(longitude)
+        for lat, lon in result.all()
+    )
+
+
+async def existe_no_raio(session: AsyncSession, model, longitude: float, latitude: float, raio_km: float) -> bool:
+    """Verifica no banco (PostGIS) se há registro a até raio_km da coordenada."""
+    result = await session.execute(
+        text(
+            f"SELECT EXISTS (SELECT 1 FROM {model.__tablename__} "
+            f"WHERE ST_DWithin(geom::geography, {_PONTO}::geography, :raio_m))"
+        ),
+        {"lon": float(longitude), "lat": float(latitude), "raio_m": float(raio_km) * 1000.0}
+    )
+    return bool(result.scalar())
+
+
+async def listar_no_raio(session: AsyncSession, model, longitude: float, latitude: float, raio_km: float) -> List:
+    """
+    Lista (id, latitude, longitude, quantidadeColmeias[, especieAbelha]) dos registros a até raio_km da coordenada.
+    Sem PostGIS e sem índice em memória retorna todos os registros, projetados apenas nessas colunas.
+    """
+    if settings.POSTGIS_ENABLED:
+        result = await session.execute(
+            text(
+                f"SELECT {_colunas_sql(model)} FROM {model.__tablename__} "
+                f"WHERE ST_DWithin(geom::geography, {_PONTO}::geography, :raio_m)"
+            ),
+            {"lon": float(longitude), "lat": float(latitude), "raio_m": float(raio_km) * 1000.0}
+        )
+        return result.all()
+    indice = indice_para(model)
+    if indice.pronto:
+        return indice.consultar_raio(longitude, latitude, raio_km)
+    result = await session.execute(select(*_colunas_orm(model)))
+    return result.all()
+
+
+async def somar_colmeias_no_raio(session: AsyncSession, model, longitude: float, latitude: float, raio_km: float) -> int:
+    """Soma no banco (PostGIS) as colmeias dos registros a até raio_km da coordenada."""
+    result = await session.execute(
+        text(
+            f'SELECT COALESCE(SUM(CAST("quantidadeColmeias" AS INTEGER)), 0) FROM {model.__tablename__} '
+            f"WHERE ST_DWithin(geom::geography, {_PONTO}::geography, :raio_m)"
+        ),
+        {"lon": float(longitude), "lat": float(latitude), "raio_m": float(raio_km) * 1000.0}
+    )
+    return int(result.scalar() or 0)
+
+
+def raio_voo_km(model, especie: Optional[str] = None) -> float:
+    """Raio de voo (km) usado para o buffer de um registro do modelo."""
+    from utils import calcular_raio_voo_apiario, calcular_raio_voo_meliponario
+    if hasattr(model, 'especieAbelha'):
+        return calcular_raio_voo_meliponario(especie)
+    return calcular_raio_voo_apiario()
+
+
+def indexar(model, registro) -> None:
+    """Insere/atualiza o registro (objeto ORM já persistido) no índice em memória do modelo."""
+    indice_para(model).inserir(registro, raio_voo_km(model, getattr(registro, 'especieAbelha', None)))
+
+
+def desindexar(model, id: int) -> None:
+    indice_para(model).remover(id)
+
+
+async def aquecer_indices(session: AsyncSession, models: List) -> None:
+    """Carrega no índice em memória todas as localizações dos modelos informados (uma consulta por modelo)."""
+    for model in models:
+        result = await session.execute(select(*_colunas_orm(model)))
+        linhas = result.all()
+        raios = [raio_voo_km(model, getattr(linha, 'especieAbelha', None)) for linha in linhas]
+        indice_para(model).carregar(linhas, raios)
@@ -0,0 +1,235 @@
+"""
+Raster de cobertura de vegetação com tabelas de soma acumulada (summed-area tables).
+
+Job offline: as camadas de vegetação são rasterizadas por CLASSE numa grade métrica
+(EPSG:31983, célula padrão de 30 m, amostragem pelo centro da célula) e, para cada
+classe, é gravada a tabela de soma acumulada em `.npy`, aberta depois com memory-map.
+
+Consulta: a área aproximada dentro de um círculo é a soma, linha a linha da grade,
+de diferenças da tabela acumulada. São no máximo 2r/c + 1 leituras vetorizadas,
+independentes do número e da complexidade dos polígonos. Para o maior raio usado
+(2,5 km) e c = 30 m isso dá no máximo 168 leituras, ou seja, custo constante.
+
+Limite de erro: uma célula é contada quando o seu centro está dentro da vegetação e do
+círculo, então a diferença para a área exata fica contida nos pontos a até c/√2 da
+borda de (vegetação ∩ círculo). Com c = tamanho da célula, r = raio, P = perímetro
+da vegetação dentro do círculo e k = número de contornos dessa interseção:
+
+    |área aproximada − área exata| ≤ √2·c·(2πr + P) + (π/2)·c²·k   (m²)
+
+Exemplo: c = 30 m, r = 1,5 km e círculo todo coberto (P = 0, k = 1) dão no máximo 40,1 ha,
+5,7% dos 706,9 ha do círculo. Polígonos sobrepostos da mesma classe contam uma única vez
+(o cálculo exato por polígono soma a sobreposição), diferença que fica fora desse limite.
+
+Uso: python -m utils.raster_vegetacao [tamanho_celula_m]
+"""
+import json
+import logging
+import math
+import os
+import threading
+import uuid
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import shapely
+
+from utils.geometria import CRS_METRICO, projetar_para_metrico
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_CELULA_PADRAO_M = 30.0
+ARQUIVO_METADADOS = 'raster_vegetacao.json'
+
+
+def _arquivo_sat(diretorio: str, classe: str, geracao: Optional[str] = None) -> str:
+    # Cada geração grava arquivos próprios: quem ainda lê a anterior não vê tabelas de outra grade
+    sufixo = f'_{geracao}' if geracao else ''
+    return os.path.join(diretorio, f'sat_{classe}{sufixo}.npy')
+
+
+def _rasterizar_poligono(cobertura: np.ndarray, poligono, x0: float, y0: float, c: float) -> None:
+    """Marca na grade as células cujo centro está dentro do polígono (varredura por linhas de centro)."""
+    nlinhas, ncolunas = cobertura.shape
+    minx, miny, maxx, maxy = shapely.bounds(poligono)
+    i0 = max(int(math.ceil((miny - y0) / c - 0.5)), 0)
+    i1 = min(int(math.floor((maxy - y0) / c - 0.5)), nlinhas - 1)
+    if i1 < i0:
+        return
+    yc = y0 + (np.arange(i0, i1 + 1) + 0.5) * c
+    linhas = shapely.linestrings(
+        np.stack([np.full_like(yc, minx - c), yc, np.full_like(yc, maxx + c), yc], axis=1).reshape(-1, 2, 2)
+    )
+    recortes = shapely.intersection(poligono, linhas)
+    partes, indices = shapely.get_parts(recortes, return_index=True)
+    if len(partes) == 0:
+        return
+    segmentos = shapely.get_type_id(partes) == 1  # LineString
+    partes, indices = partes[segmentos], indices[segmentos]
+    limites = shapely.bounds(partes)
+    j0 = np.maximum(np.ceil((limites[:, 0] - x0) / c - 0.5).astype(np.int64), 0)
+    j1 = np.minimum(np.floor((limites[:, 2] - x0) / c - 0.5).astype(np.int64), ncolunas - 1)
+    for i, a, b in zip(indices + i0, j0, j1):
+        if b >= a:
+            cobertura[i, a:b + 1] = 1
+
+
+def _gravar_sat(cobertura: np.ndarray, caminho: str) -> None:
+    """Grava a tabela de soma acumulada (com linha/coluna zero à esquerda) linha a linha, via memory-map."""
+    nlinhas, ncolunas = cobertura.shape
+    sat = np.lib.format.open_memmap(caminho, mode='w+', dtype=np.uint32, shape=(nlinhas + 1, ncolunas + 1))
+    sat[0, :] = 0
+    acumulado = np.zeros(ncolunas + 1, dtype=np.uint32)
+    for i in range(nlinhas):
+        acumulado[1:] += np.cumsum(cobertura[i], dtype=np.uint32)
+        sat[i + 1, :] = acumulado
+    sat.flush()
+    del sat
+
+
+def gerar_rasters(store, nomes: Iterable[str], classes: Iterable[str], diretorio: str,
+                  tamanho_celula_m: float = TAMANHO_CELULA_PADRAO_M) -> Dict:
+    """
+    Rasteriza as classes das camadas informadas (via VegetacaoStore) e grava as tabelas acumuladas em `diretorio`.
+    Retorna os metadados gravados.
+    """
+    nomes = list(nomes)
+    classes = list(classes)
+    c = float(tamanho_celula_m)
+    geracao = uuid.uuid4().hex[:12]
+    os.makedirs(diretorio, exist_ok=True)
+    camadas = [store.carregar(nome) for nome in nomes]
+    limites = [
+        shapely.total_bounds(geoms.values)
+        for camada in camadas for classe, geoms in camada.classes.items() if classe in classes and not geoms.empty
+    ]
+    if not limites:
+        raise ValueError("Nenhuma geometria de vegetação para rasterizar.")
+    limites = np.array(limites)
+    x0 = math.floor(limites[:, 0].min() / c) * c
+    y0 = math.floor(limites[:, 1].min() / c) * c
+    ncolunas = int(math.ceil((limites[:, 2].max() - x0) / c))
+    nlinhas = int(math.ceil((limites[:, 3].max() - y0) / c))
+    logger.info(f"Grade de vegetação: {nlinhas} x {ncolunas} células de {c} m")
+    caminho_cobertura = os.path.join(diretorio, 'cobertura.tmp.npy')
+    for classe in classes:
+        cobertura = np.lib.format.open_memmap(caminho_cobertura, mode='w+', dtype=np.uint8, shape=(nlinhas, ncolunas))
+        for camada in camadas:
+            geoms = camada.classes.get(classe)
+            if geoms is None:
+                continue
+            for poligono in geoms.values:
+                shapely.prepare(poligono)
+                _rasterizar_poligono(cobertura, poligono, x0, y0, c)
+        _gravar_sat(cobertura, _arquivo_sat(diretorio, classe, geracao) + '.tmp')
+        del cobertura
+        os.replace(_arquivo_sat(diretorio, classe, geracao) + '.tmp', _arquivo_sat(diretorio, classe, geracao))
+        logger.info(f"Tabela acumulada gravada para a classe {classe}")
+    os.remove(caminho_cobertura)
+    metadados = {
+        'crs': CRS_METRICO, 'x0': x0, 'y0': y0, 'tamanho_celula_m': c,
+        'linhas': nlinhas, 'colunas': ncolunas, 'classes': classes, 'camadas': nomes, 'geracao': geracao
+    }
+    # Os metadados são publicados por último e de forma atômica: o mtime deles marca a nova geração
+    caminho_metadados = os.path.join(diretorio, ARQUIVO_METADADOS)
+    with open(caminho_metadados + '.tmp', 'w') as f:
+        json.dump(metadados, f)
+    os.replace(caminho_metadados + '.tmp', caminho_metadados)
+    atuais = {os.path.basename(_arquivo_sat(diretorio, classe, geracao)) for classe in classes}
+    for arquivo in os.listdir(diretorio):
+        # Processos com a geração anterior aberta seguem com o memory-map; o arquivo só some do diretório
+        if arquivo.startswith('sat_') and arquivo.endswith('.npy') and arquivo not in atuais:
+            os.remove(os.path.join(diretorio, arquivo))
+    return metadados
+
+
+class RasterVegetacao:
+    """Consulta de área aproximada de vegetação em círculos a partir das tabelas acumuladas (memory-mapped)."""
+
+    def __init__(self, diretorio: str):
+        with open(os.path.join(diretorio, ARQUIVO_METADADOS)) as f:
+            self.metadados = json.load(f)
+        self.x0 = float(self.metadados['x0'])
+        self.y0 = float(self.metadados['y0'])
+        self.c = float(self.metadados['tamanho_celula_m'])
+        self.linhas = int(self.metadados['linhas'])
+        self.colunas = int(self.metadados['colunas'])
+        self.sats = {
+            classe: np.load(_arquivo_sat(diretorio, classe, self.metadados.get('geracao')), mmap_mode='r')
+            for classe in self.metadados['classes']
+        }
+
+    def _celulas_no_circulo(self, sat: np.ndarray, x: float, y: float, raio_m: float) -> int:
+        c = self.c
+        i0 = max(int(math.ceil((y - raio_m - self.y0) / c - 0.5)), 0)
+        i1 = min(int(math.floor((y + raio_m - self.y0) / c - 0.5)), self.linhas - 1)
+        if i1 < i0:
+            return 0
+        linhas = np.arange(i0, i1 + 1)
+        dy = self.y0 + (linhas + 0.5) * c - y
+        meia_largura = np.sqrt(np.maximum(raio_m * raio_m - dy * dy, 0.0))
+        j0 = np.maximum(np.ceil((x - meia_largura - self.x0) / c - 0.5).astype(np.int64), 0)
+        j1 = np.minimum(np.floor((x + meia_largura - self.x0) / c - 0.5).astype(np.int64), self.colunas - 1)
+        validas = j1 >= j0
+        linhas, j0, j1 = linhas[validas], j0[validas], j1[validas]
+        if len(linhas) == 0:
+            return 0
+        soma = (sat[linhas + 1, j1 + 1].astype(np.int64) - sat[linhas, j1 + 1]
+                - sat[linhas + 1, j0] + sat[linhas, j0])
+        return int(soma.sum())
+
+    def areas_por_classe_metrico(self, x: float, y: float, raio_km: float, classes: Iterable[str]) -> Dict[str, float]:
+        """Área aproximada (ha) de cada classe dentro do círculo de raio_km em torno de (x, y) no CRS métrico."""
+        raio_m = float(raio_km) * 1000.0
+        areas = {}
+        for classe in classes:
+            sat = self.sats.get(classe)
+            if sat is None:
+                continue
+            celulas = self._celulas_no_circulo(sat, float(x), float(y), raio_m)
+            if celulas:
+                areas[classe] = celulas * self.c * self.c / 10000.0
+        return areas
+
+    def areas_por_classe(self, longitude: float, latitude: float, raio_km: float, classes: Iterable[str]) -> Dict[str, float]:
+        """Área aproximada (ha) de cada classe dentro do círculo de raio_km em torno da coordenada."""
+        xs, ys = projetar_para_metrico([float(longitude)], [float(latitude)])
+        return self.areas_por_classe_metrico(float(xs[0]), float(ys[0]), raio_km, classes)
+
+
+# Diretório -> (mtime de raster_vegetacao.json, raster aberto)
+_rasters: Dict[str, Tuple[int, RasterVegetacao]] = {}
+_lock_rasters = threading.Lock()
+
+
+def obter_raster(diretorio: str) -> RasterVegetacao:
+    """
+    Raster do diretório compartilhado no processo, reaberto quando gerar_rasters publica uma nova geração
+    (mtime de raster_vegetacao.json). FileNotFoundError se o raster ainda não foi gerado.
+    """
+    for tentativa in range(2):
+        gerado = os.stat(os.path.join(diretorio, ARQUIVO_METADADOS)).st_mtime_ns
+        with _lock_rasters:
+            atual = _rasters.get(diretorio)
+            if atual is not None and atual[0] == gerado:
+                return atual[1]
+            try:
+                raster = RasterVegetacao(diretorio)
+            except FileNotFoundError:
+                # Metadados lidos entre a publicação de uma geração e a remoção das tabelas da anterior
+                if tentativa:
+                    raise
+                continue
+            _rasters[diretorio] = (gerado, raster)
+            return raster
+
+
+if __name__ == '__main__':
+    import sys
+    from utils import (VEGETACAO_APICULTOR, VEGETACAO_MELIPONARIO, RASTER_VEGETACAO_DIR,
+                       catalogo_camadas, vegetacao_store)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    tamanho = float(sys.argv[1]) if len(sys.argv) > 1 else TAMANHO_CELULA_PADRAO_M
+    classes_raster = sorted(set(VEGETACAO_APICULTOR) | set(VEGETACAO_MELIPONARIO))
+    gerar_rasters(vegetacao_store, catalogo_camadas.nomes_sincrono(), classes_raster, RASTER_VEGETACAO_DIR, tamanho)
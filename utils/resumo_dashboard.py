@@ -0,0 +1,181 @@
+"""
+Tabela de resumo do dashboard (dashboard_summary).
+
+Uma linha por (usuário, tipo, bioma) com número de registros, colmeias e capacidade de
+suporte somadas. Os endpoints de criação/edição/exclusão de apiários e meliponários
+ajustam a linha afetada com um upsert incremental na mesma transação do cadastro, de
+modo que o modo `summary` dos dashboards lê só esta tabela, sem varrer os cadastros.
+
+Reconciliação: reconstrói a tabela do zero a partir dos cadastros (e preenche o bioma
+dos registros que ainda não o têm), sob lock exclusivo da tabela para não perder
+ajustes concorrentes.
+
+Uso: python -m utils.resumo_dashboard
+"""
+import logging
+from typing import NamedTuple, Optional, Sequence
+
+from sqlalchemy import text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from models.apiary import Apiary
+from models.meliponary import Meliponary
+from models.resumo_dashboard import BIOMA_DESCONHECIDO, ResumoDashboard
+
+logger = logging.getLogger(__name__)
+
+# Tipo gravado na tabela -> modelo
+TIPOS = {'apiario': Apiary, 'meliponario': Meliponary}
+# Lote de registros sem bioma identificados por vez na reconciliação
+LOTE_BIOMAS = 1000
+
+
+class Contribuicao(NamedTuple):
+    user_id: int
+    tipo: str
+    bioma: str
+    colmeias: int
+    capacidade: int
+
+
+def _inteiro(valor) -> int:
+    """Mesmo critério da reconciliação em SQL ('^[0-9]+$'): qualquer outro valor conta como zero."""
+    texto = '' if valor is None else str(valor)
+    return int(texto) if texto.isascii() and texto.isdigit() else 0
+
+
+def tipo_do_modelo(model) -> str:
+    return 'meliponario' if hasattr(model, 'especieAbelha') else 'apiario'
+
+
+def contribuicao(model, registro) -> Contribuicao:
+    """Parcela de um apiário/meliponário na tabela de resumo (valores não numéricos contam como zero)."""
+    return Contribuicao(
+        user_id=registro.userId,
+        tipo=tipo_do_modelo(model),
+        bioma=registro.bioma or BIOMA_DESCONHECIDO,
+        colmeias=_inteiro(registro.quantidadeColmeias),
+        capacidade=_inteiro(registro.capacidadeDeSuporte)
+    )
+
+
+async def _somar(session: AsyncSession, parcela: Contribuicao, sinal: int) -> None:
+    valores = {
+        'registros': sinal, 'colmeias': sinal * parcela.colmeias, 'capacidade': sinal * parcela.capacidade
+    }
+    tabela = ResumoDashboard.__table__
+    comando = insert(tabela).values(user_id=parcela.user_id, tipo=parcela.tipo, bioma=parcela.bioma, **valores)
+    await session.execute(comando.on_conflict_do_update(
+        index_elements=[tabela.c.user_id, tabela.c.tipo, tabela.c.bioma],
+        set_={coluna: tabela.c[coluna] + comando.excluded[coluna] for coluna in valores}
+    ))
+
+
+async def ajustar(session: AsyncSession, removida: Optional[Contribuicao] = None,
+                  adicionada: Optional[Contribuicao] = None) -> None:
+    """Aplica a troca de parcelas na sessão do endpoint; o commit do cadastro confirma os dois juntos."""
+    if removida == adicionada:
+        return
+    if removida is not None:
+        await _somar(session, removida, -1)
+    if adicionada is not None:
+        await _somar(session, adicionada, 1)
+
+
+async def ler(session: AsyncSession, user_id: Optional[int], tipos: Sequence[str]) -> dict:
+    """Totais e grupos (bioma, e usuário no dashboard global) de cada tipo, lidos só da tabela de resumo."""
+    consulta = select(ResumoDashboard).filter(ResumoDashboard.tipo.in_(tipos), ResumoDashboard.registros > 0)
+    if user_id is not None:
+        consulta = consulta.filter(ResumoDashboard.user_id == user_id)
+    result = await session.execute(
+        consulta.order_by(ResumoDashboard.tipo, ResumoDashboard.user_id, ResumoDashboard.bioma)
+    )
+    resposta = {tipo: {'registros': 0, 'colmeias': 0, 'capacidade': 0, 'grupos': []} for tipo in tipos}
+    for linha in result.scalars().all():
+        totais = resposta[linha.tipo]
+        grupo = {
+            'bioma': linha.bioma or None,
+            'registros': linha.registros, 'colmeias': linha.colmeias, 'capacidade': linha.capacidade
+        }
+        if user_id is None:
+            grupo = {'userId': linha.user_id, **grupo}
+        totais['grupos'].append(grupo)
+        for campo in ('registros', 'colmeias', 'capacidade'):
+            totais[campo] += getattr(linha, campo)
+    return resposta
+
+
+async def _preencher_biomas(session: AsyncSession) -> int:
+    """Identifica e grava o bioma dos registros cadastrados antes da coluna existir."""
+    from utils import identificar_biomas_lote
+    from utils.computacao import servico_computacao
+    total = 0
+    for model in TIPOS.values():
+        apos = 0
+        while True:
+            result = await session.execute(
+                select(model.id, model.longitude, model.latitude)
+                .filter(model.bioma.is_(None), model.id > apos).order_by(model.id).limit(LOTE_BIOMAS)
+            )
+            linhas = result.all()
+            if not linhas:
+                break
+            apos = linhas[-1].id
+            validas = []
+            for linha in linhas:
+                try:
+                    validas.append((linha.id, float(linha.longitude), float(linha.latitude)))
+                except (TypeError, ValueError):
+                    continue
+            if validas:
+                biomas = await servico_computacao.executar(
+                    identificar_biomas_lote, [v[1] for v in validas], [v[2] for v in validas]
+                )
+                alteracoes = [{'id': v[0], 'bioma': b} for v, b in zip(validas, biomas) if b]
+                if alteracoes:
+                    await session.execute(update(model), alteracoes)
+                    total += len(alteracoes)
+    return total
+
+
+async def reconciliar(session: AsyncSession, preencher_biomas: bool = True) -> dict:
+    """Reconstrói dashboard_summary a partir dos cadastros. Retorna quantos biomas foram preenchidos e linhas gravadas."""
+    preenchidos = 0
+    if preencher_biomas:
+        preenchidos = await _preencher_biomas(session)
+    await session.commit()
+    async with session.begin():
+        # Ajustes concorrentes esperam a reconstrução terminar em vez de se perderem
+        await session.execute(text("LOCK TABLE dashboard_summary IN EXCLUSIVE MODE"))
+        await session.execute(text("DELETE FROM dashboard_summary"))
+        for tipo, model in TIPOS.items():
+            await session.execute(text(
+                f"""
+                INSERT INTO dashboard_summary (user_id, tipo, bioma, registros, colmeias, capacidade)
+                SELECT "userId", :tipo, COALESCE(bioma, :desconhecido), COUNT(*),
+                       COALESCE(SUM(CASE WHEN "quantidadeColmeias" ~ '^[0-9]+$'
+                                         THEN CAST("quantidadeColmeias" AS INTEGER) END), 0),
+                       COALESCE(SUM(CASE WHEN "capacidadeDeSuporte" ~ '^[0-9]+$'
+                                         THEN CAST("capacidadeDeSuporte" AS INTEGER) END), 0)
+                FROM {model.__tablename__}
+                GROUP BY "userId", 3
+                """
+            ), {'tipo': tipo, 'desconhecido': BIOMA_DESCONHECIDO})
+        linhas = (await session.execute(text("SELECT COUNT(*) FROM dashboard_summary"))).scalar()
+    logger.info(f"Resumo do dashboard reconstruído: {linhas} linhas, {preenchidos} biomas preenchidos")
+    return {'biomas_preenchidos': preenchidos, 'linhas': int(linhas or 0)}
+
+
+if __name__ == '__main__':
+    import asyncio
+    from core.database import Session
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    async def _executar():
+        async with Session() as session:
+            print(await reconciliar(session))
+
+    asyncio.run(_executar())
@@ -0,0 +1,294 @@
+"""
+Superfície de capacidade de suporte remanescente, pré-calculada numa grade regular.
+
+Job offline: sobre a extensão do raster de vegetação (utils.raster_vegetacao) é montada
+uma grade métrica (EPSG:31983, célula padrão de 250 m). Para o centro de cada célula
+aplicam-se as mesmas regras de calcular_capacidade_suporte_apicultura /
+calcular_capacidade_suporte_meliponicultura: área de vegetação no raio de voo (pelas
+tabelas acumuladas do raster), bioma pelo índice de biomas e fator do bioma. Cada tipo
+de produção fica em `<diretorio>/<tipo>/` com:
+    - potencial.npy: capacidade bruta (float32; NaN fora dos biomas mapeados);
+    - ocupacao.npy: colmeias existentes cujo buffer cruza o buffer da célula (int32);
+    - superficie.json: origem, tamanho da célula, raio e escala de cores.
+
+Atualização incremental: criar, editar ou excluir um apiário/meliponário só altera a
+ocupação das células a até (raio da célula + raio do registro) dele, em memória
+compartilhada (memory-map) e sob lock de arquivo, visível a todos os workers. A
+capacidade remanescente é max(potencial - ocupacao, 0).
+
+Os tiles (PNG, Web Mercator z/x/y) são amostrados da grade sob demanda.
+
+Uso: python -m utils.superficie_capacidade [apicultura|meliponicultura] [tamanho_celula_m]
+"""
+import fcntl
+import json
+import logging
+import math
+import os
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Callable, Iterable, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from utils.geometria import CRS_METRICO, projetar_para_geo, projetar_para_metrico
+from utils.tiles_mvt import ORIGEM_M, RAIO_TERRA_M, limites_mercator
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_CELULA_PADRAO_M = 250.0
+ARQUIVO_METADADOS = 'superficie.json'
+ARQUIVO_POTENCIAL = 'potencial.npy'
+ARQUIVO_OCUPACAO = 'ocupacao.npy'
+ARQUIVO_VERSAO = '.versao'
+PIXELS_TILE = 256
+
+
+class Localizacao(NamedTuple):
+    longitude: float
+    latitude: float
+    colmeias: int
+    raio_km: float
+
+
+def _pontos_no_alcance(x0: float, y0: float, c: float, linhas: int, colunas: int, x: float, y: float,
+                       alcance_m: float):
+    """Índices (i, j) das células cujo centro está a até alcance_m de (x, y)."""
+    i0 = max(int(math.ceil((y - alcance_m - y0) / c - 0.5)), 0)
+    i1 = min(int(math.floor((y + alcance_m - y0) / c - 0.5)), linhas - 1)
+    j0 = max(int(math.ceil((x - alcance_m - x0) / c - 0.5)), 0)
+    j1 = min(int(math.floor((x + alcance_m - x0) / c - 0.5)), colunas - 1)
+    if i1 < i0 or j1 < j0:
+        return None
+    ii, jj = np.meshgrid(np.arange(i0, i1 + 1), np.arange(j0, j1 + 1), indexing='ij')
+    dentro = (y0 + (ii + 0.5) * c - y) ** 2 + (x0 + (jj + 0.5) * c - x) ** 2 <= alcance_m * alcance_m
+    return ii[dentro], jj[dentro]
+
+
+def _somar_ocupacao(ocupacao: np.ndarray, metadados: dict, registros: Iterable[Localizacao], sinal: int = 1) -> None:
+    x0, y0, c = metadados['x0'], metadados['y0'], metadados['tamanho_celula_m']
+    linhas, colunas = ocupacao.shape
+    registros = list(registros)
+    if not registros:
+        return
+    xs, ys = projetar_para_metrico([r.longitude for r in registros], [r.latitude for r in registros])
+    for registro, x, y in zip(registros, xs, ys):
+        # Dois buffers circulares se cruzam quando a distância entre os centros é no máximo a soma dos raios
+        alcance_m = (metadados['raio_km'] + registro.raio_km) * 1000.0
+        celulas = _pontos_no_alcance(x0, y0, c, linhas, colunas, float(x), float(y), alcance_m)
+        if celulas is not None:
+            ocupacao[celulas] += sinal * int(registro.colmeias)
+
+
+def gerar_superficie(raster, identificar_biomas: Callable, capacidade: Callable, classes: Sequence[str],
+                     raio_km: float, registros: Iterable[Localizacao], diretorio: str,
+                     tamanho_celula_m: float = TAMANHO_CELULA_PADRAO_M) -> dict:
+    """
+    Calcula e grava a superfície de um tipo de produção.
+    `identificar_biomas(lons, lats)` devolve o bioma de cada ponto (None fora dos biomas) e
+    `capacidade(areas_ha, biomas)` a capacidade bruta de cada célula a partir da área de vegetação no raio.
+    """
+    c = float(tamanho_celula_m)
+    origem = raster.metadados
+    x0, y0 = float(origem['x0']), float(origem['y0'])
+    colunas = int(math.ceil(origem['colunas'] * origem['tamanho_celula_m'] / c))
+    linhas = int(math.ceil(origem['linhas'] * origem['tamanho_celula_m'] / c))
+    logger.info(f"Superfície de capacidade: {linhas} x {colunas} células de {c} m, raio {raio_km} km")
+    os.makedirs(diretorio, exist_ok=True)
+
+    caminho_potencial = os.path.join(diretorio, ARQUIVO_POTENCIAL)
+    potencial = np.lib.format.open_memmap(caminho_potencial + '.tmp', mode='w+', dtype=np.float32, shape=(linhas, colunas))
+    xs = x0 + (np.arange(colunas) + 0.5) * c
+    for i in range(linhas):
+        y = y0 + (i + 0.5) * c
+        lons, lats = projetar_para_geo(xs, np.full(colunas, y))
+        biomas = np.asarray(identificar_biomas(lons, lats), dtype=object)
+        mapeadas = np.flatnonzero(biomas != None)  # noqa: E711 (comparação elemento a elemento)
+        linha = np.full(colunas, np.nan, dtype=np.float32)
+        if len(mapeadas):
+            areas = np.array([
+                sum(raster.areas_por_classe_metrico(xs[j], y, raio_km, classes).values()) for j in mapeadas
+            ])
+            linha[mapeadas] = capacidade(areas, biomas[mapeadas])
+        potencial[i] = linha
+    escala = float(np.nanpercentile(potencial, 99)) if np.isfinite(potencial).any() else 0.0
+    potencial.flush()
+    del potencial
+
+    metadados = {
+        'crs': CRS_METRICO, 'x0': x0, 'y0': y0, 'tamanho_celula_m': c, 'linhas': linhas, 'colunas': colunas,
+        'raio_km': float(raio_km), 'classes': list(classes), 'escala': max(escala, 1.0)
+    }
+    caminho_ocupacao = os.path.join(diretorio, ARQUIVO_OCUPACAO)
+    ocupacao = np.lib.format.open_memmap(caminho_ocupacao + '.tmp', mode='w+', dtype=np.int32, shape=(linhas, colunas))
+    ocupacao[:] = 0
+    _somar_ocupacao(ocupacao, metadados, registros)
+    ocupacao.flush()
+    del ocupacao
+
+    with _lock_arquivo(diretorio):
+        os.replace(caminho_potencial + '.tmp', caminho_potencial)
+        os.replace(caminho_ocupacao + '.tmp', caminho_ocupacao)
+        with open(os.path.join(diretorio, ARQUIVO_METADADOS), 'w') as f:
+            json.dump(metadados, f)
+        _marcar_versao(diretorio)
+    return metadados
+
+
+@contextmanager
+def _lock_arquivo(diretorio: str):
+    """Lock exclusivo entre processos (workers) para alterar a ocupação."""
+    with open(os.path.join(diretorio, '.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _marcar_versao(diretorio: str) -> None:
+    with open(os.path.join(diretorio, ARQUIVO_VERSAO), 'a'):
+        pass
+    os.utime(os.path.join(diretorio, ARQUIVO_VERSAO))
+
+
+def _mercator_para_geo(mx: np.ndarray, my: np.ndarray):
+    return np.degrees(mx / RAIO_TERRA_M), np.degrees(2 * np.arctan(np.exp(my / RAIO_TERRA_M)) - np.pi / 2)
+
+
+# Rampa vermelho → amarelo → verde sobre capacidade/escala
+PARADAS_COR = (0.0, 0.5, 1.0)
+CORES_RAMPA = ((215, 254, 26), (48, 224, 150), (39, 139, 65))
+
+
+def _cor(valores: np.ndarray, escala: float) -> np.ndarray:
+    """Cores RGBA da capacidade remanescente; NaN (fora dos biomas ou da grade) fica transparente."""
+    t = np.clip(np.nan_to_num(valores, nan=0.0) / escala, 0.0, 1.0)
+    rgba = np.zeros(valores.shape + (4,), dtype=np.uint8)
+    for canal, cores in enumerate(CORES_RAMPA):
+        rgba[..., canal] = np.round(np.interp(t, PARADAS_COR, cores)).astype(np.uint8)
+    rgba[..., 3] = np.where(np.isnan(valores), 0, 200).astype(np.uint8)
+    return rgba
+
+
+def _png(rgba: np.ndarray) -> bytes:
+    """Codifica uma imagem RGBA (altura x largura x 4, uint8) em PNG."""
+    altura, largura, _ = rgba.shape
+
+    def bloco(tipo: bytes, dados: bytes) -> bytes:
+        return struct.pack('>I', len(dados)) + tipo + dados + struct.pack('>I', zlib.crc32(tipo + dados) & 0xffffffff)
+
+    linhas = np.concatenate([np.zeros((altura, 1), dtype=np.uint8), rgba.reshape(altura, largura * 4)], axis=1)
+    return (b'\x89PNG\r\n\x1a\n'
+            + bloco(b'IHDR', struct.pack('>IIBBBBB', largura, altura, 8, 6, 0, 0, 0))
+            + bloco(b'IDAT', zlib.compress(linhas.tobytes(), 6))
+            + bloco(b'IEND', b''))
+
+
+class SuperficieCapacidade:
+    """Grade de capacidade de um tipo de produção (memory-map), recarregada quando o job a regrava."""
+
+    def __init__(self, diretorio: str):
+        self.diretorio = diretorio
+        self._metadados: Optional[dict] = None
+        self._potencial: Optional[np.ndarray] = None
+        self._ocupacao: Optional[np.ndarray] = None
+        self._carregado: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _mtime(self, nome: str) -> Optional[int]:
+        try:
+            return os.stat(os.path.join(self.diretorio, nome)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _carregar(self) -> bool:
+        gerada = self._mtime(ARQUIVO_METADADOS)
+        if gerada is None:
+            return False
+        with self._lock:
+            if self._carregado != gerada:
+                with open(os.path.join(self.diretorio, ARQUIVO_METADADOS)) as f:
+                    self._metadados = json.load(f)
+                self._potencial = np.load(os.path.join(self.diretorio, ARQUIVO_POTENCIAL), mmap_mode='r')
+                self._ocupacao = np.load(os.path.join(self.diretorio, ARQUIVO_OCUPACAO), mmap_mode='r+')
+                self._carregado = gerada
+        return True
+
+    def disponivel(self) -> bool:
+        return self._carregar()
+
+    def versao(self) -> Optional[str]:
+        """Muda a cada geração e a cada alteração de ocupação (ETag dos tiles)."""
+        marcador = self._mtime(ARQUIVO_VERSAO)
+        return None if marcador is None else str(marcador)
+
+    def aplicar(self, removidos: Iterable[Localizacao] = (), adicionados: Iterable[Localizacao] = ()) -> None:
+        """Atualiza só as células alcançadas pelos registros removidos/adicionados."""
+        if not self._carregar():
+            return
+        with _lock_arquivo(self.diretorio):
+            # O job pode ter regravado a grade enquanto o lock era aguardado
+            self._carregar()
+            _somar_ocupacao(self._ocupacao, self._metadados, removidos, sinal=-1)
+            _somar_ocupacao(self._ocupacao, self._metadados, adicionados)
+            self._ocupacao.flush()
+            _marcar_versao(self.diretorio)
+
+    def tile_png(self, z: int, x: int, y: int) -> Optional[bytes]:
+        """Tile PNG z/x/y da capacidade remanescente; b'' se o tile não cruza a grade, None sem superfície gerada."""
+        if not self._carregar():
+            return None
+        m = self._metadados
+        minx, miny, maxx, maxy = limites_mercator(z, x, y)
+        passo = (maxx - minx) / PIXELS_TILE
+        mx = minx + (np.arange(PIXELS_TILE) + 0.5) * passo
+        my = maxy - (np.arange(PIXELS_TILE) + 0.5) * passo
+        mx, my = np.meshgrid(mx, np.clip(my, -ORIGEM_M, ORIGEM_M))
+        lons, lats = _mercator_para_geo(mx.ravel(), my.ravel())
+        px, py = projetar_para_metrico(lons, lats)
+        i = np.floor((np.asarray(py) - m['y0']) / m['tamanho_celula_m']).astype(np.int64)
+        j = np.floor((np.asarray(px) - m['x0']) / m['tamanho_celula_m']).astype(np.int64)
+        dentro = np.isfinite(px) & np.isfinite(py) & (i >= 0) & (i < m['linhas']) & (j >= 0) & (j < m['colunas'])
+        if not dentro.any():
+            return b''
+        valores = np.full(i.shape, np.nan, dtype=np.float32)
+        potencial = self._potencial[i[dentro], j[dentro]]
+        valores[dentro] = np.where(
+            np.isnan(potencial), np.nan, np.maximum(potencial - self._ocupacao[i[dentro], j[dentro]], 0)
+        )
+        if np.isnan(valores).all():
+            return b''
+        return _png(_cor(valores.reshape(PIXELS_TILE, PIXELS_TILE), m['escala']))
+
+
+if __name__ == '__main__':
+    import asyncio
+    import sys
+    from sqlalchemy.future import select
+    from core.database import Session
+    from models import Apiary, Meliponary
+    from utils import (RASTER_VEGETACAO_DIR, TIPOS_SUPERFICIE, identificar_biomas_lote, localizacao_colmeias,
+                       superficies_capacidade)
+    from utils.raster_vegetacao import obter_raster
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    tipos = [sys.argv[1]] if len(sys.argv) > 1 else list(TIPOS_SUPERFICIE)
+    tamanho = float(sys.argv[2]) if len(sys.argv) > 2 else TAMANHO_CELULA_PADRAO_M
+    modelos = {'apicultura': Apiary, 'meliponicultura': Meliponary}
+
+    async def _registros(model):
+        async with Session() as session:
+            result = await session.execute(select(model))
+            localizacoes = (localizacao_colmeias(model, registro) for registro in result.scalars().all())
+            return [localizacao for localizacao in localizacoes if localizacao is not None]
+
+    raster_vegetacao = obter_raster(RASTER_VEGETACAO_DIR)
+    for tipo in tipos:
+        classes_tipo, raio_tipo, fatores_tipo = TIPOS_SUPERFICIE[tipo]
+        gerar_superficie(
+            raster_vegetacao, identificar_biomas_lote, fatores_tipo, classes_tipo, raio_tipo,
+            asyncio.run(_registros(modelos[tipo])), superficies_capacidade[tipo].diretorio, tamanho
+        )
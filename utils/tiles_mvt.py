@@ -0,0 +1,145 @@
+"""
+Vector tiles (MVT, Web Mercator z/x/y) das camadas de vegetação e de biomas.
+
+Cada tile é gerado a partir do arquivo indexado da camada (o FlatGeobuf de exibição
+publicado na ingestão, com todos os atributos, lido só na janela do tile; o GeoJSON
+original enquanto ele não existir):
+as feições são recortadas no tile com uma pequena margem, simplificadas com tolerância
+de um pixel do zoom pedido e codificadas em coordenadas de tile.
+
+Os tiles gerados ficam em disco em `<diretorio>/<camada>/<versão>/<z>/<x>/<y>.mvt`. A
+versão é a do arquivo de origem (ETag do objeto no MinIO), então um novo upload da
+camada passa a gerar tiles em outra pasta e a versão antiga é descartada.
+"""
+import math
+import os
+import shutil
+import threading
+import uuid
+from typing import Optional, Set, Tuple
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from utils.geometria import CRS_GEO
+from utils.mvt import EXTENT_PADRAO, codificar_camada
+
+CRS_WEB_MERCATOR = 'EPSG:3857'
+RAIO_TERRA_M = 6378137.0
+ORIGEM_M = math.pi * RAIO_TERRA_M
+ZOOM_MAXIMO = 22
+# Margem (em pixels do tile) para o recorte, evitando traços nas bordas entre tiles vizinhos
+MARGEM_PIXELS = 64
+TOLERANCIA_PIXELS = 1.0
+
+
+def tile_valido(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= ZOOM_MAXIMO and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def limites_mercator(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """Limites (minx, miny, maxx, maxy) do tile em EPSG:3857."""
+    tamanho = 2 * ORIGEM_M / 2 ** z
+    minx = -ORIGEM_M + x * tamanho
+    maxy = ORIGEM_M - y * tamanho
+    return minx, maxy - tamanho, minx + tamanho, maxy
+
+
+def _mercator_para_geo(mx: float, my: float) -> Tuple[float, float]:
+    lon = math.degrees(mx / RAIO_TERRA_M)
+    lat = math.degrees(2 * math.atan(math.exp(my / RAIO_TERRA_M)) - math.pi / 2)
+    return lon, lat
+
+
+def nome_camada_mvt(camada: str) -> str:
+    """Nome da camada dentro do tile (nome do objeto sem extensão)."""
+    return os.path.splitext(os.path.basename(camada))[0]
+
+
+def gerar_tile(caminho: str, camada: str, z: int, x: int, y: int, extent: int = EXTENT_PADRAO) -> bytes:
+    """
+    Gera o tile z/x/y da camada a partir do arquivo vetorial em `caminho`.
+    Devolve b'' quando nenhuma feição cai no tile. Função pura (pode rodar no pool de computação).
+    """
+    minx, miny, maxx, maxy = limites_mercator(z, x, y)
+    escala = extent / (maxx - minx)
+    folga = MARGEM_PIXELS / escala
+    lon0, lat0 = _mercator_para_geo(minx - folga, miny - folga)
+    lon1, lat1 = _mercator_para_geo(maxx + folga, maxy + folga)
+    gdf = gpd.read_file(caminho, bbox=(lon0, lat0, lon1, lat1))
+    if gdf.empty:
+        return b''
+    if gdf.crs is None:
+        gdf = gdf.set_crs(CRS_GEO)
+    gdf = gdf[~gdf.geometry.isna()].to_crs(CRS_WEB_MERCATOR)
+
+    geometrias = shapely.clip_by_rect(np.asarray(gdf.geometry.values), minx - folga, miny - folga,
+                                      maxx + folga, maxy + folga)
+    geometrias = shapely.simplify(geometrias, TOLERANCIA_PIXELS / escala, preserve_topology=True)
+    mantidas = ~shapely.is_empty(geometrias)
+    if not mantidas.any():
+        return b''
+    geometrias = shapely.transform(
+        geometrias[mantidas],
+        lambda c: np.column_stack([(c[:, 0] - minx) * escala, (maxy - c[:, 1]) * escala])
+    )
+    atributos = gdf.drop(columns=gdf.geometry.name)[mantidas]
+    propriedades = (
+        {k: v for k, v in linha.items() if v is not None} for linha in atributos.to_dict('records')
+    )
+    return codificar_camada(nome_camada_mvt(camada), geometrias, propriedades, extent)
+
+
+class CacheTilesMVT:
+    """Cache em disco dos tiles MVT gerados, separado por camada e versão da origem."""
+
+    def __init__(self, diretorio: str):
+        self._diretorio = diretorio
+        self._versoes: Set[Tuple[str, str]] = set()
+        self._lock = threading.Lock()
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _pasta(self, camada: str) -> str:
+        return os.path.join(self._diretorio, os.path.basename(camada))
+
+    def _caminho(self, camada: str, versao: str, z: int, x: int, y: int) -> str:
+        return os.path.join(self._pasta(camada), versao, str(z), str(x), f'{y}.mvt')
+
+    def ler(self, camada: str, versao: str, z: int, x: int, y: int) -> Optional[bytes]:
+        try:
+            with open(self._caminho(camada, versao, z, x, y), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _descartar_outras_versoes(self, camada: str, versao: str) -> None:
+        with self._lock:
+            if (camada, versao) in self._versoes:
+                return
+            self._versoes = {v for v in self._versoes if v[0] != camada}
+            self._versoes.add((camada, versao))
+        pasta = self._pasta(camada)
+        for existente in os.listdir(pasta) if os.path.isdir(pasta) else []:
+            if existente != versao:
+                shutil.rmtree(os.path.join(pasta, existente), ignore_errors=True)
+
+    def gravar(self, camada: str, versao: str, z: int, x: int, y: int, dados: bytes) -> None:
+        """Grava o tile (tiles vazios também, para não regerá-los) de forma atômica."""
+        self._descartar_outras_versoes(camada, versao)
+        destino = self._caminho(camada, versao, z, x, y)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        temporario = f'{destino}.{uuid.uuid4().hex}.tmp'
+        with open(temporario, 'wb') as f:
+            f.write(dados)
+        os.replace(temporario, destino)
+
+    def invalidar(self, camada: Optional[str] = None) -> None:
+        """Remove os tiles da camada informada (ou de todas)."""
+        with self._lock:
+            self._versoes = {v for v in self._versoes if camada is not None and v[0] != camada}
+        if camada is None:
+            for existente in os.listdir(self._diretorio):
+                shutil.rmtree(os.path.join(self._diretorio, existente), ignore_errors=True)
+            return
+        shutil.rmtree(self._pasta(camada), ignore_errors=True)
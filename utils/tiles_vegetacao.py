@@ -0,0 +1,301 @@
+"""
+Pirâmide em disco das camadas de vegetação, cortada em tiles métricos fixos.
+
+Ingestão (offline): cada camada do bucket é lida uma vez, reprojetada para o CRS
+métrico (EPSG:31983) e recortada em tiles quadrados de TAMANHO_TILE_M. Cada tile é
+gravado em `<diretorio>/<camada>/<tx>_<ty>.npz` com as geometrias em WKB e o código
+da CLASSE; `indice.json` lista os tiles existentes. Os recortes são exatos, então a
+soma das áreas dos tiles é igual à área da camada original.
+
+Consulta: só os tiles que intersectam o buffer são lidos do disco, e os mais usados
+ficam num LRU em memória (com STRtree por classe). O worker não precisa manter as
+camadas inteiras em RAM. O índice em memória é conferido a cada consulta contra o
+inode/mtime/tamanho de `indice.json`: quando outro processo recorta a camada de novo,
+o índice e os tiles da versão anterior são descartados.
+
+Uso: python -m utils.tiles_vegetacao [nome_camada ...]
+"""
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import shapely
+
+from utils.geometria import CRS_METRICO, acumular_areas, areas_intersecao_lote
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_TILE_M = 10000.0
+ARQUIVO_INDICE = 'indice.json'
+
+
+def _pasta_camada(diretorio: str, nome: str) -> str:
+    return os.path.join(diretorio, os.path.basename(nome))
+
+
+def _intervalo_tiles(minx: float, miny: float, maxx: float, maxy: float, tamanho: float) -> Tuple[int, int, int, int]:
+    return (int(math.floor(minx / tamanho)), int(math.floor(miny / tamanho)),
+            int(math.floor(maxx / tamanho)), int(math.floor(maxy / tamanho)))
+
+
+def cortar_camada(store, nome: str, diretorio: str, tamanho_tile_m: float = TAMANHO_TILE_M) -> int:
+    """
+    Corta a camada (lida via VegetacaoStore) em tiles e os grava em disco.
+    A pasta da camada é substituída atomicamente. Retorna o número de tiles gravados.
+    """
+    ja_carregada = nome in store.carregadas()
+    camada = store.carregar(nome)
+    if not ja_carregada:
+        store.descarregar(nome)
+    return gravar_tiles(camada, nome, diretorio, tamanho_tile_m)
+
+
+def gravar_tiles(camada, nome: str, diretorio: str, tamanho_tile_m: float = TAMANHO_TILE_M) -> int:
+    """Corta uma CamadaVegetacao já em memória (CRS métrico) em tiles e substitui a pasta da camada em disco."""
+    classes = sorted(camada.classes)
+    tiles: Dict[Tuple[int, int], List[Tuple[int, np.ndarray]]] = {}
+    for codigo, classe in enumerate(classes):
+        geoms = camada.classes[classe].values
+        if len(geoms) == 0:
+            continue
+        limites = shapely.bounds(geoms)
+        tx0 = np.floor(limites[:, 0] / tamanho_tile_m).astype(np.int64)
+        ty0 = np.floor(limites[:, 1] / tamanho_tile_m).astype(np.int64)
+        tx1 = np.floor(limites[:, 2] / tamanho_tile_m).astype(np.int64)
+        ty1 = np.floor(limites[:, 3] / tamanho_tile_m).astype(np.int64)
+        # Pares (geometria, tile) para todos os tiles cobertos pelo bbox de cada geometria
+        indices, txs, tys = [], [], []
+        for i in range(len(geoms)):
+            gx, gy = np.meshgrid(np.arange(tx0[i], tx1[i] + 1), np.arange(ty0[i], ty1[i] + 1))
+            indices.append(np.full(gx.size, i))
+            txs.append(gx.ravel())
+            tys.append(gy.ravel())
+        indices, txs, tys = np.concatenate(indices), np.concatenate(txs), np.concatenate(tys)
+        caixas = shapely.box(txs * tamanho_tile_m, tys * tamanho_tile_m,
+                             (txs + 1) * tamanho_tile_m, (tys + 1) * tamanho_tile_m)
+        recortes = shapely.intersection(geoms[indices], caixas)
+        validos = ~shapely.is_empty(recortes) & (shapely.area(recortes) > 0)
+        txs, tys, recortes = txs[validos], tys[validos], recortes[validos]
+        if len(recortes) == 0:
+            continue
+        # Agrupa os recortes por tile
+        ordem = np.lexsort((tys, txs))
+        chaves = np.stack([txs[ordem], tys[ordem]], axis=1)
+        quebras = np.flatnonzero((np.diff(chaves, axis=0) != 0).any(axis=1)) + 1
+        for grupo in np.split(ordem, quebras):
+            chave = (int(txs[grupo[0]]), int(tys[grupo[0]]))
+            tiles.setdefault(chave, []).append((codigo, recortes[grupo]))
+
+    destino = _pasta_camada(diretorio, nome)
+    temporaria = destino + '.tmp'
+    shutil.rmtree(temporaria, ignore_errors=True)
+    os.makedirs(temporaria)
+    for (tx, ty), partes in tiles.items():
+        codigos = np.concatenate([np.full(len(g), codigo, dtype=np.int16) for codigo, g in partes])
+        wkbs = shapely.to_wkb(np.concatenate([g for _, g in partes]))
+        tamanhos = np.fromiter((len(w) for w in wkbs), dtype=np.int64, count=len(wkbs))
+        np.savez(
+            os.path.join(temporaria, f'{tx}_{ty}.npz'),
+            classe=codigos,
+            offsets=np.concatenate([[0], np.cumsum(tamanhos)]),
+            wkb=np.frombuffer(b''.join(wkbs), dtype=np.uint8)
+        )
+    with open(os.path.join(temporaria, ARQUIVO_INDICE), 'w') as f:
+        json.dump({
+            'crs': CRS_METRICO, 'tamanho_tile_m': tamanho_tile_m, 'classes': classes,
+            'tiles': sorted([tx, ty] for tx, ty in tiles)
+        }, f)
+    antiga = destino + '.old'
+    shutil.rmtree(antiga, ignore_errors=True)
+    if os.path.isdir(destino):
+        os.replace(destino, antiga)
+    os.replace(temporaria, destino)
+    shutil.rmtree(antiga, ignore_errors=True)
+    logger.info(f"Camada {nome} cortada em {len(tiles)} tiles de {tamanho_tile_m} m")
+    return len(tiles)
+
+
+class VegetacaoTiles:
+    """
+    Leitura sob demanda dos tiles de vegetação, com LRU dos tiles mais usados.
+    Tem a mesma interface de consulta de VegetacaoStore.areas_por_classe.
+    """
+
+    def __init__(self, diretorio: str, max_tiles: int = 256):
+        self._diretorio = diretorio
+        self._max_tiles = max_tiles
+        self._indices: Dict[str, dict] = {}
+        # (camada, versão do índice, tx, ty) -> STRtree por classe
+        self._tiles: "OrderedDict[Tuple[str, tuple, int, int], Dict[str, shapely.STRtree]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.acertos = 0
+        self.faltas = 0
+
+    def _indice(self, nome: str) -> Optional[dict]:
+        """Índice da camada, relido quando indice.json muda; None (sem guardar) se a camada não tem tiles."""
+        caminho = os.path.join(_pasta_camada(self._diretorio, nome), ARQUIVO_INDICE)
+        with self._lock:
+            try:
+                info = os.stat(caminho)
+            except FileNotFoundError:
+                self._descartar(nome)
+                return None
+            versao = (info.st_ino, info.st_mtime_ns, info.st_size)
+            indice = self._indices.get(nome)
+            if indice is not None and indice['versao'] == versao:
+                return indice
+            self._descartar(nome)
+            try:
+                with open(caminho) as f:
+                    indice = json.load(f)
+            except FileNotFoundError:
+                return None
+            indice['existentes'] = {tuple(t) for t in indice['tiles']}
+            indice['versao'] = versao
+            self._indices[nome] = indice
+            return indice
+
+    def _descartar(self, nome: str) -> None:
+        self._indices.pop(nome, None)
+        for chave in [c for c in self._tiles if c[0] == nome]:
+            del self._tiles[chave]
+
+    def disponivel(self, nome: str) -> bool:
+        """Indica se a camada já foi cortada em tiles."""
+        return self._indice(nome) is not None
+
+    def _ler_tile(self, nome: str, classes: List[str], tx: int, ty: int) -> Dict[str, shapely.STRtree]:
+        dados = np.load(os.path.join(_pasta_camada(self._diretorio, nome), f'{tx}_{ty}.npz'))
+        offsets, wkb = dados['offsets'], dados['wkb'].tobytes()
+        geoms = shapely.from_wkb([wkb[a:b] for a, b in zip(offsets[:-1], offsets[1:])])
+        codigos = dados['classe']
+        return {
+            classe: shapely.STRtree(geoms[codigos == codigo])
+            for codigo, classe in enumerate(classes) if (codigos == codigo).any()
+        }
+
+    def _tile(self, nome: str, indice: dict, tx: int, ty: int) -> Dict[str, shapely.STRtree]:
+        chave = (nome, indice['versao'], tx, ty)
+        with self._lock:
+            tile = self._tiles.get(chave)
+            if tile is not None:
+                self._tiles.move_to_end(chave)
+                self.acertos += 1
+                return tile
+        tile = self._ler_tile(nome, indice['classes'], tx, ty)
+        with self._lock:
+            self.faltas += 1
+            if self._indices.get(nome) is not indice:
+                # O índice foi trocado durante a leitura: o tile serve a esta consulta, mas não fica no LRU
+                return tile
+            self._tiles[chave] = tile
+            while len(self._tiles) > self._max_tiles:
+                self._tiles.popitem(last=False)
+        return tile
+
+    def areas_por_classe(self, nomes: Iterable[str], classes: Iterable[str], buffer) -> Dict[str, float]:
+        """
+        Área (ha) de cada classe de vegetação dentro do buffer (CRS métrico), lendo só os tiles que o intersectam.
+        Só aparecem no resultado as classes com alguma interseção não vazia.
+        """
+        classes = list(classes)
+        shapely.prepare(buffer)
+        areas: Dict[str, float] = {}
+        for nome in nomes:
+            try:
+                parciais = self._areas_camada(nome, classes, buffer)
+            except FileNotFoundError:
+                # Pasta da camada substituída entre a leitura do índice e a dos tiles: relê com o índice novo
+                parciais = self._areas_camada(nome, classes, buffer)
+            for classe, area in parciais.items():
+                areas[classe] = areas.get(classe, 0.0) + area
+        return areas
+
+    def _areas_camada(self, nome: str, classes: List[str], buffer) -> Dict[str, float]:
+        areas: Dict[str, float] = {}
+        indice = self._indice(nome)
+        if indice is None:
+            return areas
+        tx0, ty0, tx1, ty1 = _intervalo_tiles(*shapely.bounds(buffer), indice['tamanho_tile_m'])
+        for tx in range(tx0, tx1 + 1):
+            for ty in range(ty0, ty1 + 1):
+                if (tx, ty) not in indice['existentes']:
+                    continue
+                arvores = self._tile(nome, indice, tx, ty)
+                for classe in classes:
+                    arvore = arvores.get(classe)
+                    if arvore is None:
+                        continue
+                    candidatos = arvore.query(buffer, predicate='intersects')
+                    if len(candidatos) == 0:
+                        continue
+                    recortes = shapely.intersection(arvore.geometries.take(candidatos), buffer)
+                    area = float(shapely.area(recortes).sum())
+                    if area > 0:
+                        areas[classe] = areas.get(classe, 0.0) + area / 10000.0
+        return areas
+
+    def areas_por_classe_lote(self, nomes: Iterable[str], classes: Iterable[str], buffers) -> List[Dict[str, float]]:
+        """
+        areas_por_classe de vários buffers: cada tile que toca o bbox do conjunto é lido uma vez e
+        consultado com uma chamada STRtree por classe para todos os buffers.
+        """
+        classes = list(classes)
+        buffers = np.asarray(buffers, dtype=object)
+        areas: List[Dict[str, float]] = [{} for _ in range(len(buffers))]
+        if len(buffers) == 0:
+            return areas
+        for nome in nomes:
+            try:
+                parciais = self._areas_camada_lote(nome, classes, buffers)
+            except FileNotFoundError:
+                parciais = self._areas_camada_lote(nome, classes, buffers)
+            for destino, parcial in zip(areas, parciais):
+                for classe, area in parcial.items():
+                    destino[classe] = destino.get(classe, 0.0) + area
+        return areas
+
+    def _areas_camada_lote(self, nome: str, classes: List[str], buffers: np.ndarray) -> List[Dict[str, float]]:
+        areas: List[Dict[str, float]] = [{} for _ in range(len(buffers))]
+        indice = self._indice(nome)
+        if indice is None:
+            return areas
+        tx0, ty0, tx1, ty1 = _intervalo_tiles(*shapely.total_bounds(buffers), indice['tamanho_tile_m'])
+        for tx, ty in indice['existentes']:
+            if not (tx0 <= tx <= tx1 and ty0 <= ty <= ty1):
+                continue
+            arvores = self._tile(nome, indice, tx, ty)
+            for classe in classes:
+                arvore = arvores.get(classe)
+                if arvore is not None:
+                    acumular_areas(areas, classe, areas_intersecao_lote(arvore, buffers))
+        return areas
+
+    def invalidar(self, nome: Optional[str] = None) -> None:
+        """Descarta índice e tiles em memória da camada informada (ou de todas)."""
+        with self._lock:
+            if nome is None:
+                self._indices.clear()
+                self._tiles.clear()
+                return
+            self._descartar(nome)
+
+    def estatisticas(self) -> Dict[str, int]:
+        with self._lock:
+            return {'tiles_em_memoria': len(self._tiles), 'acertos': self.acertos, 'faltas': self.faltas}
+
+
+if __name__ == '__main__':
+    import sys
+    from utils import TILES_VEGETACAO_DIR, catalogo_camadas, vegetacao_store, vegetacao_tiles
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    for camada in sys.argv[1:] or catalogo_camadas.nomes_sincrono():
+        cortar_camada(vegetacao_store, camada, TILES_VEGETACAO_DIR)
+        vegetacao_tiles.invalidar(camada)
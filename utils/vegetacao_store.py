@@ -0,0 +1,160 @@
+"""
+Armazenamento residente das camadas de vegetação.
+
+Cada camada é lida uma única vez por worker, reprojetada para o CRS métrico
+(EPSG:31983), filtrada às classes de interesse e particionada por CLASSE.
+As funções de cálculo de área consultam este store em vez de reler e
+reprojetar os GeoJSONs a cada requisição.
+"""
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from utils.geometria import CRS_GEO, CRS_METRICO, acumular_areas, areas_intersecao_lote
+
+logger = logging.getLogger(__name__)
+
+# Estimativa de overhead por geometria GEOS (cabeçalho + ponteiros), em bytes
+_OVERHEAD_GEOMETRIA = 96
+
+
+class CamadaVegetacao:
+    """
+    Camada de vegetação carregada em memória, já em CRS métrico e particionada por CLASSE.
+    """
+
+    def __init__(self, nome: str, classes: Dict[str, gpd.GeoSeries]):
+        self.nome = nome
+        self.classes = classes
+        # Índice espacial por classe: a consulta por bbox fica no STRtree e a interseção exata só nos candidatos
+        self.arvores: Dict[str, shapely.STRtree] = {
+            classe: shapely.STRtree(geoms.values) for classe, geoms in classes.items() if not geoms.empty
+        }
+        self.memoria_bytes = sum(self._estimar_memoria(geoms) for geoms in classes.values())
+
+    @staticmethod
+    def _estimar_memoria(geoms: gpd.GeoSeries) -> int:
+        if geoms.empty:
+            return 0
+        coordenadas = int(shapely.get_num_coordinates(geoms.values).sum())
+        return coordenadas * 16 + len(geoms) * _OVERHEAD_GEOMETRIA
+
+    @property
+    def total_feicoes(self) -> int:
+        return sum(len(geoms) for geoms in self.classes.values())
+
+    def intersecoes(self, classe: str, buffer) -> np.ndarray:
+        """Recortes (CRS métrico) das feições da classe que intersectam o buffer."""
+        arvore = self.arvores.get(classe)
+        if arvore is None:
+            return np.empty(0, dtype=object)
+        candidatos = arvore.query(buffer, predicate='intersects')
+        if len(candidatos) == 0:
+            return np.empty(0, dtype=object)
+        recortes = shapely.intersection(arvore.geometries.take(candidatos), buffer)
+        return recortes[~shapely.is_empty(recortes)]
+
+
+class VegetacaoStore:
+    """
+    Store em memória das camadas de vegetação, com carga explícita, descarga e recarga.
+
+    `resolver` converte o nome do objeto no MinIO para o caminho local do arquivo
+    (tipicamente `get_geojson_file_cached`). `classes` limita as classes mantidas em memória.
+    Quando o resolver passa a devolver outro caminho (nova versão da camada), ela é relida.
+    """
+
+    def __init__(self, resolver: Callable[[str], str], classes: Iterable[str]):
+        self._resolver = resolver
+        self._classes = set(classes)
+        self._camadas: Dict[str, CamadaVegetacao] = {}
+        self._caminhos: Dict[str, str] = {}
+        self._lock = threading.RLock()
+
+    def _ler_camada(self, nome: str, caminho: Optional[str] = None) -> CamadaVegetacao:
+        caminho = caminho or self._resolver(nome)
+        self._caminhos[nome] = caminho
+        gdf = gpd.read_file(caminho)
+        # Garante que o CRS está correto antes de reprojetar
+        if gdf.crs is None:
+            gdf = gdf.set_crs(CRS_GEO)
+        if 'CLASSE' not in gdf.columns:
+            logger.warning(f"Camada {nome} sem coluna CLASSE; nenhuma vegetação será considerada.")
+            return CamadaVegetacao(nome, {})
+        gdf = gdf[gdf['CLASSE'].isin(self._classes)]
+        gdf = gdf[~gdf.geometry.isna() & ~gdf.geometry.is_empty]
+        gdf = gdf[['CLASSE', 'geometry']].to_crs(CRS_METRICO)
+        classes = {
+            classe: grupo.geometry.reset_index(drop=True)
+            for classe, grupo in gdf.groupby('CLASSE')
+        }
+        camada = CamadaVegetacao(nome, classes)
+        logger.info(
+            f"Camada {nome} carregada: {camada.total_feicoes} feições, "
+            f"~{camada.memoria_bytes / (1024 * 1024):.1f} MB"
+        )
+        return camada
+
+    def carregar(self, nome: str) -> CamadaVegetacao:
+        """Carrega a camada (se ainda não estiver em memória) e a retorna."""
+        with self._lock:
+            caminho = self._resolver(nome)
+            camada = self._camadas.get(nome)
+            if camada is None or self._caminhos.get(nome) != caminho:
+                camada = self._ler_camada(nome, caminho)
+                self._camadas[nome] = camada
+            return camada
+
+    def descarregar(self, nome: str) -> bool:
+        """Remove a camada da memória. Retorna True se ela estava carregada."""
+        with self._lock:
+            self._caminhos.pop(nome, None)
+            return self._camadas.pop(nome, None) is not None
+
+    def recarregar(self, nome: Optional[str] = None) -> None:
+        """Relê a camada informada, ou todas as camadas carregadas quando `nome` é None."""
+        with self._lock:
+            nomes = [nome] if nome is not None else list(self._camadas)
+            for n in nomes:
+                self._camadas[n] = self._ler_camada(n)
+
+    def carregadas(self) -> List[str]:
+        with self._lock:
+            return list(self._camadas)
+
+    def uso_memoria(self) -> Dict[str, int]:
+        """Memória estimada (bytes) ocupada por cada camada carregada."""
+        with self._lock:
+            return {nome: camada.memoria_bytes for nome, camada in self._camadas.items()}
+
+    def areas_por_classe(self, nomes: Iterable[str], classes: Iterable[str], buffer) -> Dict[str, float]:
+        """
+        Área (ha) de cada classe de vegetação dentro do buffer (CRS métrico), somando todas as camadas.
+        Só aparecem no resultado as classes com alguma interseção não vazia.
+        """
+        classes = list(classes)
+        shapely.prepare(buffer)
+        areas: Dict[str, float] = {}
+        for nome in nomes:
+            camada = self.carregar(nome)
+            for classe in classes:
+                recortes = camada.intersecoes(classe, buffer)
+                if len(recortes):
+                    areas[classe] = areas.get(classe, 0.0) + float(shapely.area(recortes).sum()) / 10000.0
+        return areas
+
+    def areas_por_classe_lote(self, nomes: Iterable[str], classes: Iterable[str], buffers) -> List[Dict[str, float]]:
+        """areas_por_classe de vários buffers, com uma consulta STRtree por camada e classe para todos eles."""
+        classes = list(classes)
+        areas: List[Dict[str, float]] = [{} for _ in range(len(buffers))]
+        for nome in nomes:
+            camada = self.carregar(nome)
+            for classe in classes:
+                arvore = camada.arvores.get(classe)
+                if arvore is not None:
+                    acumular_areas(areas, classe, areas_intersecao_lote(arvore, buffers))
+        return areas